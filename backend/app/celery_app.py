@@ -1,11 +1,18 @@
 from celery import Celery
 from app.config import settings
 
+# Lookups run on a worker of their own, sized to the scheduler's slots;
+# everything else (retries, watchlist refreshes, reports, maintenance) runs
+# on a background worker so it never takes a slot a lookup was promised
+LOOKUP_QUEUE = "lookups"
+BACKGROUND_QUEUE = "background"
+
 celery_app = Celery(
     "osint_workers",
     broker=settings.redis_url,
     backend=settings.redis_url,
-    include=["app.workers.enrichment"]
+    include=["app.workers.enrichment", "app.workers.maintenance", "app.workers.reports",
+             "app.workers.watchlists"]
 )
 
 celery_app.conf.update(
@@ -17,4 +24,19 @@ celery_app.conf.update(
     task_track_started=True,
     task_time_limit=300,
     task_soft_time_limit=240,
+    task_default_queue=BACKGROUND_QUEUE,
+    task_routes={"enrich_entity": {"queue": LOOKUP_QUEUE}},
+    # One process per scheduler slot, so every slot handed out can run; the
+    # background worker sets its own concurrency (see start.sh)
+    worker_concurrency=settings.lookup_worker_slots,
+    beat_schedule={
+        "dispatch-jobs": {
+            "task": "dispatch_jobs",
+            "schedule": settings.scheduler_tick_seconds,
+        },
+        "dispatch-watchlists": {
+            "task": "dispatch_watchlists",
+            "schedule": settings.watchlist_tick_seconds,
+        },
+    },
 )
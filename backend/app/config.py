@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Optional, Dict, List
 
 
 class Settings(BaseSettings):
@@ -19,12 +19,87 @@ class Settings(BaseSettings):
     urlscan_api_key: Optional[str] = None
     alienvault_api_key: Optional[str] = None
     leakcheck_api_key: Optional[str] = None
+    # Extra keys per provider name, e.g. {"virustotal": ["key1", "key2"]}
+    provider_api_keys: Dict[str, List[str]] = {}
+    provider_key_daily_quota: Dict[str, int] = {"virustotal": 500}
+    key_cooldown_seconds: int = 60
     
     # Security
     secret_key: str = "dev-secret-key-change-in-production"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
     
+    # Enrichment
+    enrichment_max_age_hours: float = 24
+    lookup_dedup_ttl_seconds: int = 600
+    enrichment_max_attempts: int = 3
+    enrichment_resume_delay_seconds: int = 5
+    job_cancel_ttl_seconds: int = 3600
+    job_cancel_poll_seconds: float = 1
+    provider_max_retries: int = 3
+    provider_retry_base_seconds: float = 10
+    provider_retry_max_seconds: float = 600
+    
+    # Provider planning
+    # Budget per lookup profile: total quota cost and total expected seconds
+    # of its provider calls; a missing limit is unbounded
+    provider_profiles: Dict[str, Dict[str, float]] = {
+        "triage": {"max_cost": 0, "max_latency_seconds": 10},
+        "standard": {"max_cost": 2, "max_latency_seconds": 30},
+        "deep": {}
+    }
+    
+    # Provider timeouts
+    # Per-request timeouts follow each provider's observed request latency
+    # percentile plus headroom; provider_timeouts fixes them per provider name
+    provider_timeouts: Dict[str, float] = {}
+    provider_timeout_percentile: float = 0.95
+    provider_timeout_headroom: float = 1.5
+    provider_timeout_min_seconds: float = 2
+    provider_timeout_max_seconds: float = 30
+    provider_timeout_default_seconds: float = 30  # until min_samples requests are observed
+    provider_timeout_min_samples: int = 20
+    provider_latency_window_hours: int = 24
+    
+    # Admission control
+    lookup_rate_per_minute: float = 30
+    lookup_burst: int = 60
+    lookup_max_queue_depth: int = 5000
+    lookup_worker_slots: int = 4  # concurrent enrichment tasks; also the worker's process count
+    lookup_default_duration_seconds: float = 30
+    
+    # Scheduling
+    tenant_max_concurrency: int = 2
+    # Tenants accepted from X-Tenant-ID -> share of worker slots; others are
+    # scheduled by client address with weight 1
+    tenant_weights: Dict[str, float] = {}
+    scheduler_tick_seconds: int = 5
+    
+    # Pivots
+    pivot_max_depth: int = 3
+    pivot_row_budget: int = 5000
+    pivot_time_budget_ms: int = 5000
+    pivot_cursor_ttl_seconds: int = 600
+    pivot_hub_scan_min_members: int = 1000  # page big hubs by walking the key index instead
+    cooccurrence_top_k: int = 20
+    
+    # Risk scoring
+    risk_rules_path: str = "app/risk_rules.json"
+    risk_rules_reload_seconds: int = 5
+    rescore_batch_size: int = 5000
+    risk_propagation_max_rounds: int = 4
+    risk_propagation_max_nodes: int = 2000
+    risk_history_max_points: int = 64
+    
+    # Watchlists
+    watchlist_tick_seconds: int = 60
+    watchlist_max_refreshes_per_tick: int = 30
+    watchlist_event_retention_days: int = 30
+    
+    # Reports
+    reports_dir: str = "reports"
+    report_wait_seconds: int = 30
+    
     # App
     environment: str = "development"
     debug: bool = True
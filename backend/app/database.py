@@ -1,11 +1,78 @@
 from neo4j import GraphDatabase
 from app.config import settings
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import dns.resolver
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
 
+# Entity type -> node label, and label -> identifying property
+ENTITY_LABELS = {
+    "email": "Email",
+    "domain": "Domain",
+    "ip": "IP",
+    "breach": "Breach",
+    "organization": "Organization"
+}
+ENTITY_ID_FIELDS = {
+    "Email": "address",
+    "Domain": "name",
+    "IP": "address",
+    "Breach": "name",
+    "Organization": "name"
+}
+
+# Relationships written by enrichment between entities
+ENRICHMENT_RELATIONSHIPS = [
+    "RESOLVES_TO",
+    "HOSTED_BY",
+    "HOSTS",
+    "HAS_EMAIL",
+    "REGISTERED_WITH",
+    "EXPOSED_IN",
+]
+
+# Infrastructure kinds tracked by co-occurrence hubs
+COOCCURRENCE_KINDS = ["ip", "registrar", "asn", "nameserver"]
+
+# Adds member `m` to the hub for (`kind`, `value`), keeping its counters in step
+MERGE_MEMBERSHIP = """
+    MERGE (h:InfraHub {key: kind + ':' + value})
+    ON CREATE SET h.kind = kind, h.value = value, h.member_count = 0, h.top_members = []
+    MERGE (m)-[r:MEMBER_OF]->(h)
+    ON CREATE SET r.first_seen = timestamp(), r.last_seen = timestamp(),
+        h.member_count = h.member_count + 1,
+        h.top_members = ([m.key] + [k IN h.top_members WHERE k <> m.key])[..$top_k]
+"""
+
+# Full-text indexes backing /api/search: one over every entity label, and
+# one per label so a search filtered by type is answered by its index alone
+SEARCH_INDEX = "entity_search"
+SEARCH_FIELDS = ["address", "name", "org", "tags_text"]
+
+# Neo4j 5 element ids look like "4:<database uuid>:<node id>"
+ELEMENT_ID_PATTERN = re.compile(r"^\d+:[0-9a-f-]{36}:\d+$")
+
+
+def search_index(label: Optional[str] = None) -> str:
+    """Full-text index to search, for one entity label or all of them"""
+    return f"{SEARCH_INDEX}_{label.lower()}" if label else SEARCH_INDEX
+
+
+def entity_key(label: str, value: str) -> str:
+    """Canonical key for an entity, e.g. domain:example.com"""
+    return f"{label.lower()}:{value}"
+
+
+def primary_label(node) -> str:
+    """Type label of a node, ignoring the shared Entity label"""
+    labels = [label for label in node.labels if label != "Entity"]
+    return labels[0] if labels else "Entity"
+
+
 class Neo4jDatabase:
     def __init__(self):
         self.driver = None
@@ -37,7 +104,20 @@ class Neo4jDatabase:
             "CREATE CONSTRAINT ip_unique IF NOT EXISTS FOR (i:IP) REQUIRE i.address IS UNIQUE",
             "CREATE CONSTRAINT breach_unique IF NOT EXISTS FOR (b:Breach) REQUIRE b.name IS UNIQUE",
             "CREATE CONSTRAINT job_unique IF NOT EXISTS FOR (j:ScanJob) REQUIRE j.id IS UNIQUE",
+            "CREATE INDEX job_created_at IF NOT EXISTS FOR (j:ScanJob) ON (j.created_at)",
+            "CREATE INDEX job_status_created_at IF NOT EXISTS FOR (j:ScanJob) ON (j.status, j.created_at)",
+            "CREATE CONSTRAINT entity_key_unique IF NOT EXISTS FOR (e:Entity) REQUIRE e.key IS UNIQUE",
+            "CREATE INDEX organization_name IF NOT EXISTS FOR (o:Organization) ON (o.name)",
+            "CREATE CONSTRAINT infra_hub_unique IF NOT EXISTS FOR (h:InfraHub) REQUIRE h.key IS UNIQUE",
         ]
+        for labels in [list(ENTITY_LABELS.values())] + [[label] for label in ENTITY_LABELS.values()]:
+            index = search_index(labels[0] if len(labels) == 1 else None)
+            constraints.append(
+                f"""CREATE FULLTEXT INDEX {index} IF NOT EXISTS
+                    FOR (n:{'|'.join(labels)})
+                    ON EACH [{', '.join('n.' + field for field in SEARCH_FIELDS)}]
+                    OPTIONS {{indexConfig: {{`fulltext.analyzer`: 'standard-no-stop-words'}}}}"""
+            )
         
         with self.driver.session() as session:
             for constraint in constraints:
@@ -52,11 +132,11 @@ class Neo4jDatabase:
         MERGE (e:Email {address: $email})
         ON CREATE SET e.first_seen = timestamp(), e.sources = []
         ON MATCH SET e.last_updated = timestamp()
-        SET e += $properties
+        SET e += $properties, e:Entity, e.key = $key
         RETURN e.address as address
         """
         with self.driver.session() as session:
-            result = session.run(query, email=email, properties=properties)
+            result = session.run(query, email=email, properties=properties, key=entity_key("Email", email))
             return result.single()["address"]
     
     def merge_domain_node(self, domain: str, properties: Dict[str, Any]) -> str:
@@ -65,11 +145,11 @@ class Neo4jDatabase:
         MERGE (d:Domain {name: $domain})
         ON CREATE SET d.first_seen = timestamp(), d.sources = []
         ON MATCH SET d.last_updated = timestamp()
-        SET d += $properties
+        SET d += $properties, d:Entity, d.key = $key
         RETURN d.name as name
         """
         with self.driver.session() as session:
-            result = session.run(query, domain=domain, properties=properties)
+            result = session.run(query, domain=domain, properties=properties, key=entity_key("Domain", domain))
             return result.single()["name"]
     
     def merge_ip_node(self, ip: str, properties: Dict[str, Any]) -> str:
@@ -78,21 +158,80 @@ class Neo4jDatabase:
         MERGE (i:IP {address: $ip})
         ON CREATE SET i.first_seen = timestamp(), i.sources = []
         ON MATCH SET i.last_updated = timestamp()
-        SET i += $properties
+        SET i += $properties, i:Entity, i.key = $key
         RETURN i.address as address
         """
         with self.driver.session() as session:
-            result = session.run(query, ip=ip, properties=properties)
+            result = session.run(query, ip=ip, properties=properties, key=entity_key("IP", ip))
             return result.single()["address"]
     
+    def entity_match(self, var: str, entity_id: str,
+                     entity_type: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
+        """
+        Build a MATCH clause that resolves an entity reference
+
+        References may be a canonical key (domain:example.com), a Neo4j
+        element id, or a bare address/name. Bare values are resolved through
+        the Entity key constraint; without an entity type every entity label
+        (the same ones the search index covers) is tried, which is still only
+        a few index seeks.
+
+        Returns:
+            (cypher clause binding `var`, query parameters)
+        """
+        if ELEMENT_ID_PATTERN.match(entity_id):
+            clause = f"MATCH ({var}:Entity) WHERE elementId({var}) = $entity_ref"
+            return clause, {"entity_ref": entity_id}
+        
+        prefix = entity_id.split(":", 1)[0]
+        if prefix in ENTITY_LABELS and (entity_type is None or prefix == entity_type):
+            keys = [entity_id]
+        elif entity_type:
+            keys = [entity_key(ENTITY_LABELS[entity_type], entity_id)]
+        else:
+            keys = [entity_key(label, entity_id) for label in ENTITY_LABELS.values()]
+        
+        clause = f"MATCH ({var}:Entity) WHERE {var}.key IN $entity_keys"
+        return clause, {"entity_keys": keys}
+    
+    def backfill_entity_keys(self, batch_size: int = 10000) -> Dict[str, int]:
+        """Assign the Entity label and canonical key to nodes created before keys existed"""
+        updated = {}
+        with self.driver.session() as session:
+            for label, field in ENTITY_ID_FIELDS.items():
+                query = f"""
+                    MATCH (n:{label})
+                    WHERE n.key IS NULL AND n.{field} IS NOT NULL
+                    CALL {{
+                        WITH n
+                        SET n:Entity, n.key = $prefix + n.{field}
+                    }} IN TRANSACTIONS OF $batch_size ROWS
+                    RETURN count(n) as updated
+                """
+                result = session.run(query, prefix=entity_key(label, ""), batch_size=batch_size)
+                updated[label] = result.single()["updated"]
+                logger.info(f"Backfilled {updated[label]} {label} entity keys")
+        return updated
+    
     def create_relationship(self, from_label: str, from_key: str, from_value: str,
                           to_label: str, to_key: str, to_value: str,
                           rel_type: str, properties: Dict[str, Any] = None):
         """Create relationship between nodes"""
         properties = properties or {}
+        # Entities are matched through their canonical key so every label
+        # (including Organization, which has no property constraint) is indexed
+        if ENTITY_ID_FIELDS.get(from_label) == from_key:
+            from_pattern, from_value = "(a:Entity {key: $from_value})", entity_key(from_label, from_value)
+        else:
+            from_pattern = f"(a:{from_label} {{{from_key}: $from_value}})"
+        if ENTITY_ID_FIELDS.get(to_label) == to_key:
+            to_pattern, to_value = "(b:Entity {key: $to_value})", entity_key(to_label, to_value)
+        else:
+            to_pattern = f"(b:{to_label} {{{to_key}: $to_value}})"
+        
         query = f"""
-        MATCH (a:{from_label} {{{from_key}: $from_value}})
-        MATCH (b:{to_label} {{{to_key}: $to_value}})
+        MATCH {from_pattern}
+        MATCH {to_pattern}
         MERGE (a)-[r:{rel_type}]->(b)
         SET r += $properties
         RETURN r
@@ -100,6 +239,135 @@ class Neo4jDatabase:
         with self.driver.session() as session:
             session.run(query, from_value=from_value, to_value=to_value, properties=properties)
     
+    def record_cooccurrence(self, kind: str, values: List[Any], member_label: str, member_value: str):
+        """
+        Set the hubs of one kind an entity is a member of to `values`
+
+        Hubs (one per IP, registrar, ASN or name server) keep a running
+        member count and the most recently observed members, so pivots can
+        show counts without expanding through popular infrastructure. The
+        entity leaves hubs of this kind whose value the provider no longer
+        reports (e.g. a domain moved to new name servers), in the same
+        statement that joins the current ones, so counts stay exact. An
+        empty `values` is no answer rather than "no infrastructure"
+        (providers report failed lookups as empty lists) and changes nothing.
+        """
+        values = list(dict.fromkeys(values))
+        if not values:
+            return
+        
+        query = """
+        MATCH (m:Entity {key: $member_key})
+        CALL {
+            WITH m
+            OPTIONAL MATCH (m)-[old:MEMBER_OF]->(h:InfraHub {kind: $kind})
+            WHERE NOT h.value IN $values
+            SET h.member_count = h.member_count - 1,
+                h.top_members = [k IN h.top_members WHERE k <> m.key]
+            DELETE old
+            RETURN count(old) as left_hubs
+        }
+        UNWIND $hubs AS hub
+        MERGE (h:InfraHub {key: hub.key})
+        ON CREATE SET h.kind = $kind, h.value = hub.value, h.member_count = 0, h.top_members = []
+        MERGE (m)-[r:MEMBER_OF]->(h)
+        ON CREATE SET r.first_seen = timestamp(), h.member_count = h.member_count + 1
+        SET r.last_seen = timestamp(),
+            h.top_members = ([m.key] + [k IN h.top_members WHERE k <> m.key])[..$top_k]
+        """
+        with self.driver.session() as session:
+            session.run(
+                query,
+                member_key=entity_key(member_label, member_value),
+                kind=kind,
+                values=values,
+                hubs=[{"key": f"{kind}:{value}", "value": value} for value in values],
+                top_k=settings.cooccurrence_top_k
+            )
+    
+    def backfill_cooccurrence(self, batch_size: int = 10000) -> Dict[str, int]:
+        """Build co-occurrence hubs from relationships that predate them"""
+        sources = {
+            "ip": "MATCH (m:Domain)-[:RESOLVES_TO]->(i:IP) WITH m, i.address as value",
+            "registrar": "MATCH (m:Domain)-[:REGISTERED_WITH]->(o:Organization) WITH m, o.name as value",
+            "asn": "MATCH (m:IP) WITH m, m.asn as value",
+        }
+        updated = {}
+        with self.driver.session() as session:
+            for kind, source in sources.items():
+                query = f"""
+                    {source}
+                    WHERE m.key IS NOT NULL AND value IS NOT NULL
+                    CALL {{
+                        WITH m, value
+                        WITH m, value, $kind as kind
+                        {MERGE_MEMBERSHIP}
+                    }} IN TRANSACTIONS OF $batch_size ROWS
+                    RETURN count(*) as updated
+                """
+                result = session.run(
+                    query, kind=kind, top_k=settings.cooccurrence_top_k, batch_size=batch_size
+                )
+                updated[kind] = result.single()["updated"]
+                logger.info(f"Backfilled {updated[kind]} {kind} co-occurrence memberships")
+        
+        updated["nameserver"] = self.backfill_nameservers()
+        return updated
+    
+    def backfill_nameservers(self, batch_size: int = 500, workers: int = 16) -> int:
+        """
+        Build name server hubs for domains that have none
+        
+        Name servers are not kept in the graph, so each domain's NS records
+        are resolved again (concurrently, a batch at a time, in key order).
+        Domains that do not resolve are skipped; running it again retries them.
+        """
+        fetch_query = """
+            MATCH (m:Entity)
+            WHERE m.key STARTS WITH 'domain:' AND m.key > $after_key
+              AND NOT EXISTS { (m)-[:MEMBER_OF]->(:InfraHub {kind: 'nameserver'}) }
+            RETURN m.key as key, m.name as name
+            ORDER BY m.key
+            LIMIT $limit
+        """
+        write_query = f"""
+            UNWIND $rows AS row
+            MATCH (m:Entity {{key: row.key}})
+            UNWIND row.nameservers AS value
+            WITH m, value, 'nameserver' as kind
+            {MERGE_MEMBERSHIP}
+            RETURN count(*) as updated
+        """
+        resolver = dns.resolver.Resolver()
+        resolver.lifetime = 5
+        
+        def nameservers(name: str) -> List[str]:
+            try:
+                return sorted({str(r).rstrip(".").lower() for r in resolver.resolve(name, "NS")})
+            except Exception:
+                return []
+        
+        updated, after_key = 0, ""
+        with self.driver.session() as session, ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                records = session.run(fetch_query, after_key=after_key, limit=batch_size).data()
+                if not records:
+                    break
+                after_key = records[-1]["key"]
+                
+                resolved = pool.map(nameservers, [record["name"] for record in records])
+                rows = [
+                    {"key": record["key"], "nameservers": servers}
+                    for record, servers in zip(records, resolved) if servers
+                ]
+                if rows:
+                    updated += session.run(
+                        write_query, rows=rows, top_k=settings.cooccurrence_top_k
+                    ).single()["updated"]
+        
+        logger.info(f"Backfilled {updated} nameserver co-occurrence memberships")
+        return updated
+    
     def get_graph_data(self, job_id: str) -> Dict[str, Any]:
         """Get all nodes and relationships for a job"""
         query = """
@@ -116,7 +384,7 @@ class Neo4jDatabase:
                 node = record["n"]
                 nodes.append({
                     "id": node.element_id,
-                    "label": list(node.labels)[0],
+                    "label": primary_label(node),
                     "properties": dict(node)
                 })
                 
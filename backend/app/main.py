@@ -1,19 +1,38 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, Response
-from app.models import LookupRequest, ScanJob, JobStatus, GraphData, EntityType
+from fastapi.responses import StreamingResponse, FileResponse, JSONResponse
+from app.models import LookupRequest, ScanJob, JobStatus, GraphData, EntityType, LookupProfile
 from app.models_extended import NoteCreate, Note, TagCreate, TagRemove, EntityTags, PREDEFINED_TAGS
-from app.database import db
-from app.workers.enrichment import enrich_entity
+from app.database import db, entity_key, ENTITY_LABELS, ENTITY_ID_FIELDS
+from app.workers.maintenance import collect_garbage, rescore_entities
+from app.workers.reports import generate_report
+from app.celery_app import celery_app
 from app.config import settings
-from app.services.report_generator import report_generator
-from typing import Optional
+from app.services.report_cache import report_cache
+from app.services.search import entity_search
+from app.services.pivot_engine import pivot_engine
+from app.services.pagination import encode_cursor, decode_cursor
+from app.services.garbage_collector import garbage_collector
+from app.services.case_stats import case_stats, membership_update, version_bump
+from app.services.exporter import exporter, EXPORT_FORMATS
+from app.services.risk_engine import risk_engine
+from app.services.risk_history import risk_history
+from app.services.inflight import inflight_index
+from app.services.admission import admission_controller
+from app.services.scheduler import job_scheduler
+from app.services.cancellation import cancellation
+from app.services.key_pool import key_pool
+from app.services.provider_planner import provider_planner
+from app.services.provider_latency import provider_latency
+from typing import Optional, List
 import uuid
 import json
 import asyncio
 from datetime import datetime
 import logging
 import io
+import zlib
+import redis
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -58,10 +77,56 @@ async def root():
     }
 
 
+def _scan_job(job, attached: bool = False) -> ScanJob:
+    """ScanJob response for a ScanJob node"""
+    return ScanJob(
+        id=job["id"],
+        query=job["query"],
+        entity_type=job["entity_type"],
+        status=job.get("status", "pending"),
+        created_at=datetime.fromtimestamp(job["created_at"] / 1000),
+        completed_at=datetime.fromtimestamp(job["completed_at"] / 1000) if job.get("completed_at") else None,
+        profile=job.get("profile") or LookupProfile.DEEP.value,
+        planned_providers=job.get("planned_providers"),
+        reused_providers=job.get("reused_providers") or [],
+        completed_providers=job.get("completed_providers") or [],
+        attempts=job.get("attempts") or 0,
+        retries=[json.loads(entry) for entry in job.get("retry_history") or []],
+        next_retry_at=datetime.fromtimestamp(job["next_retry_at"] / 1000) if job.get("next_retry_at") else None,
+        errors=job.get("errors") or [],
+        attached=attached,
+        attached_requests=job.get("attached_requests") or 0,
+        # Estimated at submission; only meaningful until the job starts
+        estimated_wait_seconds=job.get("estimated_wait_seconds") if job.get("status") == JobStatus.PENDING.value else None
+    )
+
+
+def _client_address(http_request: Request) -> str:
+    return http_request.client.host if http_request.client else "unknown"
+
+
+def _tenant_id(http_request: Request) -> str:
+    """
+    Tenant a request is scheduled as: X-Tenant-ID if it names a configured
+    tenant (a key of `tenant_weights`), else the client address
+    
+    The header is unauthenticated, so unknown values are ignored rather than
+    letting a client claim a fresh fair share with every request.
+    """
+    tenant = http_request.headers.get("X-Tenant-ID", "").strip()
+    if tenant in settings.tenant_weights:
+        return tenant
+    return _client_address(http_request)
+
+
 @app.post("/api/lookup", response_model=ScanJob)
-async def create_lookup(request: LookupRequest, background_tasks: BackgroundTasks):
+async def create_lookup(request: LookupRequest, background_tasks: BackgroundTasks, http_request: Request):
     """
     Start a new OSINT lookup job
+    
+    Joining an in-flight job is always allowed; a new job is admitted only
+    if the client has tokens left and the enrichment queue is not full,
+    otherwise 429 with Retry-After.
     """
     job_id = str(uuid.uuid4())
     
@@ -92,6 +157,62 @@ async def create_lookup(request: LookupRequest, background_tasks: BackgroundTask
         if not query.startswith('['):
             query = query.split(':')[0]
     
+    # Providers to run within the request's budget, from the observed latencies
+    planned = provider_planner.plan(
+        request.entity_type.value,
+        request.profile.value,
+        sources=request.sources,
+        api_keys=request.api_keys,
+        max_cost=request.max_cost,
+        max_latency_seconds=request.max_latency_seconds
+    )
+    
+    # Attach to a job already enriching the same entity instead of running
+    # every provider again; a stale claim (job gone or finished) is taken over.
+    # A job planned with fewer providers keeps its claim and this lookup runs
+    # on its own (jobs from before planning ran every provider)
+    holder = inflight_index.claim(request.entity_type.value, query, job_id)
+    if holder:
+        with db.driver.session() as session:
+            cypher_query = """
+                MATCH (j:ScanJob {id: $job_id})
+                WHERE j.status IN $active
+                WITH j, all(provider IN $planned WHERE provider IN coalesce(j.planned_providers, $planned)) as covers
+                FOREACH (_ IN CASE WHEN covers THEN [1] ELSE [] END |
+                    SET j.attached_requests = coalesce(j.attached_requests, 0) + 1)
+                RETURN j, covers
+            """
+            record = session.run(
+                cypher_query,
+                job_id=holder,
+                active=[JobStatus.PENDING.value, JobStatus.RUNNING.value],
+                planned=planned
+            ).single()
+        
+        if record and record["covers"]:
+            logger.info(f"Lookup for {query} attached to in-flight job {holder}")
+            return _scan_job(record["j"], attached=True)
+        if not record:
+            inflight_index.replace(request.entity_type.value, query, job_id)
+    
+    # Rate limiting stays per client address whatever tenant is claimed
+    tenant = _tenant_id(http_request)
+    admission = admission_controller.admit(_client_address(http_request))
+    if not admission["admitted"]:
+        inflight_index.release(request.entity_type.value, query, job_id)
+        if admission["reason"] == "queue_full":
+            detail = f"Lookup queue is full ({admission['queue_depth']} jobs waiting)"
+        else:
+            detail = "Too many lookups, slow down"
+        raise HTTPException(
+            status_code=429,
+            detail=detail,
+            headers={"Retry-After": str(admission["retry_after"])}
+        )
+    
+    # The claim has to outlast the job's wait in the queue
+    inflight_index.refresh(request.entity_type.value, query, job_id, admission["estimated_wait_seconds"])
+    
     # Create job in database
     with db.driver.session() as session:
         cypher_query = """
@@ -100,7 +221,12 @@ async def create_lookup(request: LookupRequest, background_tasks: BackgroundTask
                 query: $search_query,
                 entity_type: $entity_type,
                 status: $status,
-                created_at: timestamp()
+                created_at: timestamp(),
+                estimated_wait_seconds: $estimated_wait_seconds,
+                tenant: $tenant,
+                lane: $lane,
+                profile: $profile,
+                planned_providers: $planned
             })
         """
         session.run(
@@ -108,21 +234,47 @@ async def create_lookup(request: LookupRequest, background_tasks: BackgroundTask
             job_id=job_id,
             search_query=query,
             entity_type=request.entity_type.value,
-            status=JobStatus.PENDING.value
+            status=JobStatus.PENDING.value,
+            estimated_wait_seconds=admission["estimated_wait_seconds"],
+            tenant=tenant,
+            lane=request.lane.value,
+            profile=request.profile.value,
+            planned=planned
         )
     
-    # Queue enrichment task with sanitized query and API keys
-    enrich_entity.delay(job_id, query, request.entity_type.value, request.api_keys or {})
+    # Hand the enrichment task, with sanitized query and API keys, to the
+    # fair-share scheduler; it reaches a worker once the tenant's turn comes
+    job_scheduler.submit(
+        {
+            "job_id": job_id,
+            "query": query,
+            "entity_type": request.entity_type.value,
+            "api_keys": request.api_keys or {},
+            "max_age_hours": request.max_age_hours,
+            "providers": planned
+        },
+        tenant,
+        request.lane.value
+    )
     
     return ScanJob(
         id=job_id,
         query=query,
         entity_type=request.entity_type,
         status=JobStatus.PENDING,
-        created_at=datetime.now()
+        created_at=datetime.now(),
+        profile=request.profile,
+        planned_providers=planned,
+        estimated_wait_seconds=admission["estimated_wait_seconds"]
     )
 
 
+@app.get("/api/providers")
+async def get_providers():
+    """Registered providers with their cost and expected latency, and the budget of each lookup profile"""
+    return provider_planner.stats()
+
+
 @app.get("/api/job/{job_id}", response_model=ScanJob)
 async def get_job(job_id: str):
     """
@@ -139,15 +291,7 @@ async def get_job(job_id: str):
         if not record:
             raise HTTPException(status_code=404, detail="Job not found")
         
-        job = record["j"]
-        return ScanJob(
-            id=job["id"],
-            query=job["query"],
-            entity_type=job["entity_type"],
-            status=job.get("status", "pending"),
-            created_at=datetime.fromtimestamp(job["created_at"] / 1000),
-            completed_at=datetime.fromtimestamp(job["completed_at"] / 1000) if job.get("completed_at") else None
-        )
+        return _scan_job(record["j"])
 
 
 @app.get("/api/graph/{job_id}", response_model=GraphData)
@@ -163,32 +307,118 @@ async def get_graph(job_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Upper bound for ScanJob.created_at, so the range index can serve ORDER BY
+MAX_TIMESTAMP = 2 ** 62
+
+JOBS_QUERY = """
+    MATCH (j:ScanJob)
+    WHERE j.created_at < $before_ts
+      AND ($status IS NULL OR j.status = $status)
+      AND ($entity_type IS NULL OR j.entity_type = $entity_type)
+      AND ($after_id IS NULL OR j.created_at < $after_ts
+           OR (j.created_at = $after_ts AND j.id < $after_id))
+    RETURN j
+    ORDER BY j.created_at DESC, j.id DESC
+"""
+
+
+def _job_summary(job) -> dict:
+    """Serialize a ScanJob node for job listings"""
+    return {
+        "id": job["id"],
+        "query": job["query"],
+        "entity_type": job["entity_type"],
+        "status": job.get("status", "pending"),
+        "created_at": datetime.fromtimestamp(job["created_at"] / 1000).isoformat()
+    }
+
+
+def _jobs_filter(status: Optional[JobStatus], entity_type: Optional[EntityType]) -> dict:
+    return {
+        "status": status.value if status else None,
+        "entity_type": entity_type.value if entity_type else None
+    }
+
+
 @app.get("/api/jobs")
-async def list_jobs(limit: int = 20):
+async def list_jobs(limit: int = 20, status: Optional[JobStatus] = None,
+                    entity_type: Optional[EntityType] = None, cursor: Optional[str] = None):
     """
-    List recent scan jobs
+    List recent scan jobs, newest first
+    
+    Pass the returned `next_cursor` as `cursor` to fetch the next page.
     """
+    limit = max(1, min(limit, 200))
+    params = _jobs_filter(status, entity_type)
+    params.update(before_ts=MAX_TIMESTAMP, after_ts=None, after_id=None)
+    
+    if cursor:
+        try:
+            position = decode_cursor(cursor)
+            params.update(after_ts=position["t"], after_id=position["id"])
+        except (ValueError, KeyError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    
     with db.driver.session() as session:
-        cypher_query = """
-            MATCH (j:ScanJob)
-            RETURN j
-            ORDER BY j.created_at DESC
-            LIMIT $limit
-        """
-        result = session.run(cypher_query, limit=limit)
-        
-        jobs = []
-        for record in result:
-            job = record["j"]
-            jobs.append({
-                "id": job["id"],
-                "query": job["query"],
-                "entity_type": job["entity_type"],
-                "status": job.get("status", "pending"),
-                "created_at": datetime.fromtimestamp(job["created_at"] / 1000).isoformat()
-            })
-        
-        return {"jobs": jobs}
+        result = session.run(JOBS_QUERY + "LIMIT $limit", limit=limit + 1, **params)
+        records = [record["j"] for record in result]
+    
+    jobs = [_job_summary(job) for job in records[:limit]]
+    next_cursor = None
+    if len(records) > limit:
+        last = records[limit - 1]
+        next_cursor = encode_cursor({"t": last["created_at"], "id": last["id"]})
+    
+    return {"jobs": jobs, "next_cursor": next_cursor}
+
+
+@app.get("/api/jobs/export")
+async def export_jobs(status: Optional[JobStatus] = None, entity_type: Optional[EntityType] = None):
+    """
+    Stream the full job history as NDJSON (one job per line)
+    """
+    params = _jobs_filter(status, entity_type)
+    params.update(before_ts=MAX_TIMESTAMP, after_ts=None, after_id=None)
+    
+    def generate():
+        # Records are pulled from Neo4j in driver-sized batches as the client reads
+        with db.driver.session(fetch_size=1000) as session:
+            for record in session.run(JOBS_QUERY, **params):
+                yield json.dumps(_job_summary(record["j"])) + "\n"
+    
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=jobs.ndjson"}
+    )
+
+
+def _export_response(scope: str, scope_id: str, format: str) -> StreamingResponse:
+    """Streaming download of a case or job in one of EXPORT_FORMATS"""
+    extension = "json" if format == "stix" else format
+    return StreamingResponse(
+        exporter.stream(db.driver, scope, scope_id, format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f"attachment; filename={scope}-{scope_id}.{extension}"}
+    )
+
+
+@app.get("/api/job/{job_id}/export")
+async def export_job(job_id: str, format: str = "ndjson"):
+    """
+    Stream a job's scanned entities and their enrichment neighbours
+    
+    Formats: ndjson (entities then relationships), csv (entities only),
+    stix (STIX 2.1 bundle)
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of: {', '.join(EXPORT_FORMATS)}")
+    
+    with db.driver.session() as session:
+        if not session.run("MATCH (j:ScanJob {id: $job_id}) RETURN j.id", job_id=job_id).single():
+            raise HTTPException(status_code=404, detail="Job not found")
+    
+    return _export_response("job", job_id, format)
 
 
 @app.get("/api/entity/{entity_type}/{entity_id}")
@@ -196,39 +426,21 @@ async def get_entity(entity_type: str, entity_id: str):
     """
     Get detailed entity information
     """
-    label_map = {
-        "email": "Email",
-        "domain": "Domain",
-        "ip": "IP",
-        "breach": "Breach",
-        "organization": "Organization"
-    }
-    
-    label = label_map.get(entity_type.lower())
+    label = ENTITY_LABELS.get(entity_type.lower())
     if not label:
         raise HTTPException(status_code=400, detail="Invalid entity type")
     
-    key_map = {
-        "Email": "address",
-        "Domain": "name",
-        "IP": "address",
-        "Breach": "name",
-        "Organization": "name"
-    }
-    
-    key = key_map[label]
-    
     with db.driver.session() as session:
-        cypher_query = f"""
-            MATCH (e:{label} {{{key}: $entity_id}})
+        cypher_query = """
+            MATCH (e:Entity {key: $key})
             OPTIONAL MATCH (e)-[r]-(connected)
-            RETURN e, collect({{
+            RETURN e, collect({
                 type: type(r),
                 direction: CASE WHEN startNode(r) = e THEN 'outgoing' ELSE 'incoming' END,
                 node: connected
-            }}) as relationships
+            }) as relationships
         """
-        result = session.run(cypher_query, entity_id=entity_id)
+        result = session.run(cypher_query, key=entity_key(label, entity_id))
         
         record = result.single()
         if not record:
@@ -245,53 +457,168 @@ async def get_entity(entity_type: str, entity_id: str):
         }
 
 
+@app.get("/api/entity/{entity_type}/{entity_id}/risk-history")
+async def get_entity_risk_history(entity_type: str, entity_id: str,
+                                  since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """
+    Get an entity's risk score history, oldest first
+    
+    A point is recorded whenever the score, level or reasons change. Points
+    older than a week are thinned to the daily peak, and older than 90 days
+    to the weekly peak.
+    """
+    label = ENTITY_LABELS.get(entity_type.lower())
+    if not label:
+        raise HTTPException(status_code=400, detail="Invalid entity type")
+    
+    with db.driver.session() as session:
+        cypher_query = """
+            MATCH (e:Entity {key: $key})
+            RETURN e.risk_history as history
+        """
+        record = session.run(cypher_query, key=entity_key(label, entity_id)).single()
+    
+    if not record:
+        raise HTTPException(status_code=404, detail="Entity not found")
+    
+    rule_set = risk_engine.rule_set()
+    points = []
+    for point in risk_history.decode(record["history"]):
+        if since and point["timestamp"] < since.timestamp():
+            continue
+        if until and point["timestamp"] > until.timestamp():
+            continue
+        points.append({
+            "timestamp": datetime.fromtimestamp(point["timestamp"]).isoformat(),
+            "score": point["score"],
+            "level": point["level"],
+            "linked": point["linked"],
+            "reasons": rule_set.reason_ids(entity_type.lower(), point["reason_mask"])
+        })
+    
+    return {"id": entity_id, "type": label, "points": points}
+
+
 @app.get("/api/search")
-async def search_entities(q: str, entity_type: str = None):
+async def search_entities(q: str, entity_type: str = None, mode: str = "fulltext",
+                          limit: int = 20, offset: int = 0):
     """
     Search for entities in the graph
+
+    Modes:
+    - fulltext: all terms must match (ranked by relevance)
+    - prefix: last term is matched as a prefix, for autocomplete
     """
+    if mode not in ("fulltext", "prefix"):
+        raise HTTPException(status_code=400, detail="Invalid search mode")
+    
+    label = None
     if entity_type:
-        label_map = {"email": "Email", "domain": "Domain", "ip": "IP"}
-        label = label_map.get(entity_type.lower(), "Email")
-        cypher_query = f"""
-            MATCH (e:{label})
-            WHERE toLower(toString(e)) CONTAINS toLower($q)
-            RETURN e
-            LIMIT 50
+        label = ENTITY_LABELS.get(entity_type.lower())
+        if not label:
+            raise HTTPException(status_code=400, detail="Invalid entity type")
+    
+    with db.driver.session() as session:
+        return entity_search.search(session, q, label=label, mode=mode, limit=limit, offset=offset)
+
+
+ACTIVE_JOB_STATUSES = [JobStatus.PENDING.value, JobStatus.RUNNING.value]
+
+
+def _cancel_job(session, job_id: str) -> Optional[str]:
+    """
+    Stop a job wherever it is: withdraw it from the scheduler, revoke its
+    queued task, and flag it so a worker running it stops before writing
+    further results
+    
+    Returns:
+        The job's status before cancelling, or None if there is no such job
+    """
+    record = session.run(
         """
-    else:
-        cypher_query = """
-            MATCH (e)
-            WHERE toLower(toString(e)) CONTAINS toLower($q)
-            RETURN e, labels(e) as labels
-            LIMIT 50
+        MATCH (j:ScanJob {id: $job_id})
+        RETURN j.status as status, j.query as query, j.entity_type as entity_type,
+               j.tenant as tenant, coalesce(j.lane, 'interactive') as lane
+        """,
+        job_id=job_id
+    ).single()
+    if not record or record["status"] not in ACTIVE_JOB_STATUSES:
+        return record["status"] if record else None
+    
+    cancellation.request(job_id)
+    if record["status"] == JobStatus.PENDING.value:
+        # A job that never reached a worker leaves nothing to release its
+        # in-flight claim or scheduler slot
+        if not (record["tenant"] and job_scheduler.cancel(job_id, record["tenant"], record["lane"])):
+            celery_app.control.revoke(job_id)
+            job_scheduler.finish(job_id, record["tenant"])
+        inflight_index.release(record["entity_type"], record["query"], job_id)
+    
+    session.run(
         """
+        MATCH (j:ScanJob {id: $job_id})
+        WHERE j.status IN $active
+        SET j.status = $cancelled, j.completed_at = timestamp()
+        """,
+        job_id=job_id,
+        active=ACTIVE_JOB_STATUSES,
+        cancelled=JobStatus.CANCELLED.value
+    )
+    return record["status"]
+
+
+@app.post("/api/job/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """
+    Cancel a pending or running job
     
+    Queued work is withdrawn; a running task cancels its in-flight provider
+    calls and stops before writing further results. Data already written is
+    kept.
+    """
     with db.driver.session() as session:
-        result = session.run(cypher_query, q=q)
-        entities = []
-        for record in result:
-            entity = record["e"]
-            entities.append({
-                "type": list(entity.labels)[0],
-                "properties": dict(entity)
-            })
-        
-        return {"results": entities}
+        try:
+            previous = _cancel_job(session, job_id)
+        except redis.RedisError as e:
+            raise HTTPException(status_code=503, detail=f"Cancellation unavailable: {e}")
+    
+    if previous is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if previous not in ACTIVE_JOB_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Job already {previous}")
+    
+    return {"success": True, "job_id": job_id, "previous_status": previous}
 
 
 @app.delete("/api/job/{job_id}")
 async def delete_job(job_id: str):
     """
     Delete a scan job and its associated data
+    
+    A job that is still pending or running is cancelled first. Entities the
+    job created are reclaimed in the background once nothing else (another
+    job, a case or a note) references them.
     """
     with db.driver.session() as session:
-        cypher_query = """
-            MATCH (j:ScanJob {id: $job_id})
-            OPTIONAL MATCH (j)-[r]-()
-            DELETE r, j
-        """
-        session.run(cypher_query, job_id=job_id)
+        try:
+            _cancel_job(session, job_id)
+        except redis.RedisError as e:
+            raise HTTPException(status_code=503, detail=f"Cannot stop job before deleting it: {e}")
+        
+        candidate_keys = garbage_collector.candidates(
+            session, "MATCH (:ScanJob {id: $job_id})-[:SCANNED]->(root:Entity)", {"job_id": job_id}
+        )
+        session.run(
+            f"""
+            MATCH (c:Case)-[:HAS_JOB]->(:ScanJob {{id: $job_id}})
+            SET c.stat_jobs = coalesce(c.stat_jobs, 0) - 1, {version_bump()}
+            """,
+            job_id=job_id
+        )
+        garbage_collector.delete_node(session, "MATCH (n:ScanJob {id: $job_id})", {"job_id": job_id})
+    
+    if candidate_keys:
+        collect_garbage.delay(candidate_keys)
     
     return {"success": True, "message": "Job deleted"}
 
@@ -319,11 +646,9 @@ async def create_note(note: NoteCreate):
             raise HTTPException(status_code=400, detail="Invalid entity type")
         
         # Create note node and relationship
+        entity_match, params = db.entity_match("e", note.entity_id, note.entity_type)
         cypher_query = f"""
-            MATCH (e:{label})
-            WHERE elementId(e) = $entity_id OR 
-                  (e.address = $entity_id) OR 
-                  (e.name = $entity_id)
+            {entity_match}
             CREATE (n:Note {{
                 id: $note_id,
                 content: $content,
@@ -334,9 +659,9 @@ async def create_note(note: NoteCreate):
         """
         result = session.run(
             cypher_query,
-            entity_id=note.entity_id,
             note_id=note_id,
-            content=note.content
+            content=note.content,
+            **params
         )
         
         record = result.single()
@@ -357,15 +682,14 @@ async def create_note(note: NoteCreate):
 async def get_notes(entity_id: str):
     """Get all notes for an entity"""
     with db.driver.session() as session:
-        cypher_query = """
+        entity_match, params = db.entity_match("e", entity_id)
+        cypher_query = f"""
+            {entity_match}
             MATCH (e)-[:HAS_NOTE]->(n:Note)
-            WHERE elementId(e) = $entity_id OR 
-                  e.address = $entity_id OR 
-                  e.name = $entity_id
             RETURN n
             ORDER BY n.created_at DESC
         """
-        result = session.run(cypher_query, entity_id=entity_id)
+        result = session.run(cypher_query, **params)
         
         notes = []
         for record in result:
@@ -400,23 +724,18 @@ async def add_tag(tag_data: TagCreate):
         if not label:
             raise HTTPException(status_code=400, detail="Invalid entity type")
         
+        entity_match, params = db.entity_match("e", tag_data.entity_id, tag_data.entity_type)
         cypher_query = f"""
-            MATCH (e:{label})
-            WHERE elementId(e) = $entity_id OR 
-                  e.address = $entity_id OR 
-                  e.name = $entity_id
+            {entity_match}
             SET e.tags = CASE 
                 WHEN e.tags IS NULL THEN [$tag]
                 WHEN NOT $tag IN e.tags THEN e.tags + $tag
                 ELSE e.tags
             END
+            SET e.tags_text = reduce(text = '', t IN e.tags | text + ' ' + t)
             RETURN e.tags as tags
         """
-        result = session.run(
-            cypher_query,
-            entity_id=tag_data.entity_id,
-            tag=tag_data.tag
-        )
+        result = session.run(cypher_query, tag=tag_data.tag, **params)
         
         record = result.single()
         if not record:
@@ -434,19 +753,14 @@ async def remove_tag(tag_data: TagRemove):
         if not label:
             raise HTTPException(status_code=400, detail="Invalid entity type")
         
+        entity_match, params = db.entity_match("e", tag_data.entity_id, tag_data.entity_type)
         cypher_query = f"""
-            MATCH (e:{label})
-            WHERE elementId(e) = $entity_id OR 
-                  e.address = $entity_id OR 
-                  e.name = $entity_id
+            {entity_match}
             SET e.tags = [tag IN e.tags WHERE tag <> $tag]
+            SET e.tags_text = reduce(text = '', t IN e.tags | text + ' ' + t)
             RETURN e.tags as tags
         """
-        result = session.run(
-            cypher_query,
-            entity_id=tag_data.entity_id,
-            tag=tag_data.tag
-        )
+        result = session.run(cypher_query, tag=tag_data.tag, **params)
         
         record = result.single()
         if not record:
@@ -465,14 +779,13 @@ async def get_predefined_tags():
 async def get_entity_tags(entity_id: str):
     """Get tags for an entity"""
     with db.driver.session() as session:
-        cypher_query = """
-            MATCH (e)
-            WHERE elementId(e) = $entity_id OR 
-                  e.address = $entity_id OR 
-                  e.name = $entity_id
+        entity_match, params = db.entity_match("e", entity_id)
+        cypher_query = f"""
+            {entity_match}
             RETURN COALESCE(e.tags, []) as tags
+            LIMIT 1
         """
-        result = session.run(cypher_query, entity_id=entity_id)
+        result = session.run(cypher_query, **params)
         
         record = result.single()
         if not record:
@@ -487,124 +800,73 @@ async def get_entity_tags(entity_id: str):
 # ============================================
 
 @app.post("/api/pivot/{entity_type}/{entity_id}")
-async def pivot_entity(entity_type: str, entity_id: str, pivot_type: str, depth: int = 1):
+async def pivot_entity(entity_type: str, entity_id: str, pivot_type: str, depth: int = 1,
+                       rel_types: Optional[List[str]] = Query(None), limit: int = 50,
+                       cursor: Optional[str] = None):
     """
     Pivot/expand from an entity to discover related entities
     
     Pivot types:
-    - related_domains: Find domains related to this entity
-    - related_ips: Find IPs related to this entity
-    - related_emails: Find emails related to this entity
+    - related_domains: Find domains within `depth` hops of this entity
+    - related_ips: Find IPs within `depth` hops of this entity
+    - related_emails: Find emails within `depth` hops of this entity
     - hosted_by_same_ip: Find other domains on same IP
     - same_registrar: Find domains with same registrar
+    - same_nameserver: Find domains sharing a name server
     - same_asn: Find IPs in same ASN
+    
+    The related_* pivots traverse `rel_types` (all entity relationships by
+    default). Infrastructure pivots read precomputed co-occurrence hubs and
+    return their member counts in `hubs`. Pass the returned `next_cursor` as
+    `cursor` to fetch the next page.
     """
+    label_map = {"email": "Email", "domain": "Domain", "ip": "IP"}
+    if entity_type not in label_map:
+        raise HTTPException(status_code=400, detail="Invalid entity type")
+    
+    entity_match, params = db.entity_match("e", entity_id, entity_type)
+    
     with db.driver.session() as session:
-        # Map entity types to labels
-        label_map = {"email": "Email", "domain": "Domain", "ip": "IP"}
-        label = label_map.get(entity_type)
-        if not label:
-            raise HTTPException(status_code=400, detail="Invalid entity type")
-        
-        # Build pivot query based on type
-        if pivot_type == "related_domains":
-            # Find domains connected to this entity
-            cypher_query = f"""
-                MATCH (e:{label})-[r]-(d:Domain)
-                WHERE elementId(e) = $entity_id OR 
-                      e.address = $entity_id OR 
-                      e.name = $entity_id
-                RETURN DISTINCT d, type(r) as rel_type
-                LIMIT 50
-            """
-        
-        elif pivot_type == "related_ips":
-            # Find IPs connected to this entity
-            cypher_query = f"""
-                MATCH (e:{label})-[r]-(i:IP)
-                WHERE elementId(e) = $entity_id OR 
-                      e.address = $entity_id OR 
-                      e.name = $entity_id
-                RETURN DISTINCT i, type(r) as rel_type
-                LIMIT 50
-            """
-        
-        elif pivot_type == "related_emails":
-            # Find emails connected to this entity
-            cypher_query = f"""
-                MATCH (e:{label})-[r]-(em:Email)
-                WHERE elementId(e) = $entity_id OR 
-                      e.address = $entity_id OR 
-                      e.name = $entity_id
-                RETURN DISTINCT em, type(r) as rel_type
-                LIMIT 50
-            """
-        
-        elif pivot_type == "hosted_by_same_ip":
-            # Find other domains hosted on same IP
-            if entity_type != "domain":
-                raise HTTPException(status_code=400, detail="This pivot only works for domains")
-            
-            cypher_query = """
-                MATCH (d1:Domain)-[:RESOLVES_TO]->(i:IP)<-[:RESOLVES_TO]-(d2:Domain)
-                WHERE (elementId(d1) = $entity_id OR d1.name = $entity_id)
-                  AND d1 <> d2
-                RETURN DISTINCT d2, 'RESOLVES_TO' as rel_type
-                LIMIT 50
-            """
-        
-        elif pivot_type == "same_registrar":
-            # Find domains with same registrar
-            if entity_type != "domain":
-                raise HTTPException(status_code=400, detail="This pivot only works for domains")
-            
-            cypher_query = """
-                MATCH (d1:Domain)-[:REGISTERED_WITH]->(o:Organization)<-[:REGISTERED_WITH]-(d2:Domain)
-                WHERE (elementId(d1) = $entity_id OR d1.name = $entity_id)
-                  AND d1 <> d2
-                RETURN DISTINCT d2, 'REGISTERED_WITH' as rel_type
-                LIMIT 50
-            """
-        
-        elif pivot_type == "same_asn":
-            # Find IPs in same ASN
-            if entity_type != "ip":
-                raise HTTPException(status_code=400, detail="This pivot only works for IPs")
-            
-            cypher_query = """
-                MATCH (i1:IP)-[:HOSTED_BY]->(o:Organization)<-[:HOSTED_BY]-(i2:IP)
-                WHERE (elementId(i1) = $entity_id OR i1.address = $entity_id)
-                  AND i1 <> i2
-                RETURN DISTINCT i2, 'HOSTED_BY' as rel_type
-                LIMIT 50
-            """
-        
-        else:
-            raise HTTPException(status_code=400, detail="Invalid pivot type")
-        
-        # Execute query
-        result = session.run(cypher_query, entity_id=entity_id)
-        
-        # Collect results
-        entities = []
-        for record in result:
-            entity_node = record[0]
-            rel_type = record.get("rel_type", "RELATED")
-            
-            entities.append({
-                "id": entity_node.element_id,
-                "label": list(entity_node.labels)[0],
-                "properties": dict(entity_node),
-                "relationship": rel_type
-            })
-        
-        return {
-            "success": True,
-            "pivot_type": pivot_type,
-            "entity_count": len(entities),
-            "entities": entities
-        }
+        try:
+            result = pivot_engine.pivot(
+                session, entity_match, params, entity_type, pivot_type,
+                depth=depth, relationships=rel_types, limit=limit, cursor=cursor
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    if result is None:
+        raise HTTPException(status_code=404, detail="Entity not found")
+    
+    return {
+        "success": True,
+        "pivot_type": pivot_type,
+        "entity_count": len(result["entities"]),
+        "entities": result["entities"],
+        "hubs": result["hubs"],
+        "next_cursor": result["next_cursor"],
+        "truncated": result["truncated"]
+    }
 
+@app.get("/api/pivot/{entity_type}/{entity_id}/infrastructure")
+async def get_entity_infrastructure(entity_type: str, entity_id: str):
+    """
+    Shared infrastructure (IP, registrar, ASN, name server) of an entity,
+    with how many other entities share each one
+    """
+    label_map = {"email": "Email", "domain": "Domain", "ip": "IP"}
+    if entity_type not in label_map:
+        raise HTTPException(status_code=400, detail="Invalid entity type")
+    
+    entity_match, params = db.entity_match("e", entity_id, entity_type)
+    
+    with db.driver.session() as session:
+        hubs = pivot_engine.hubs(session, entity_match, params)
+    
+    if hubs is None:
+        raise HTTPException(status_code=404, detail="Entity not found")
+    
+    return {"hubs": hubs}
 
 
 # ============================================
@@ -613,7 +875,7 @@ async def pivot_entity(entity_type: str, entity_id: str, pivot_type: str, depth:
 
 from app.models_cases import (
     CaseCreate, CaseUpdate, Case, CaseStatus, CasePriority,
-    CaseAddEntity, CaseAddJob
+    CaseAddEntity, CaseAddJob, WatchlistCreate, WatchlistUpdate, WatchlistMembers, Watchlist
 )
 
 @app.post("/api/cases", response_model=Case)
@@ -631,7 +893,8 @@ async def create_case(case_data: CaseCreate):
                 priority: $priority,
                 tags: $tags,
                 created_at: timestamp(),
-                updated_at: timestamp()
+                updated_at: timestamp(),
+                stats_ready: true
             })
             RETURN c
         """
@@ -666,13 +929,13 @@ async def create_case(case_data: CaseCreate):
 async def list_cases(status: Optional[str] = None, limit: int = 50):
     """List all cases"""
     with db.driver.session() as session:
+        # Counts are read from per-case counters; older cases are counted once
+        case_stats.recompute(session)
+        
         if status:
             cypher_query = """
                 MATCH (c:Case {status: $status})
-                OPTIONAL MATCH (c)-[:CONTAINS]->(e)
-                OPTIONAL MATCH (c)-[:HAS_JOB]->(j:ScanJob)
-                WITH c, count(DISTINCT e) as entity_count, count(DISTINCT j) as job_count
-                RETURN c, entity_count, job_count
+                RETURN c
                 ORDER BY c.updated_at DESC
                 LIMIT $limit
             """
@@ -680,10 +943,7 @@ async def list_cases(status: Optional[str] = None, limit: int = 50):
         else:
             cypher_query = """
                 MATCH (c:Case)
-                OPTIONAL MATCH (c)-[:CONTAINS]->(e)
-                OPTIONAL MATCH (c)-[:HAS_JOB]->(j:ScanJob)
-                WITH c, count(DISTINCT e) as entity_count, count(DISTINCT j) as job_count
-                RETURN c, entity_count, job_count
+                RETURN c
                 ORDER BY c.updated_at DESC
                 LIMIT $limit
             """
@@ -701,8 +961,8 @@ async def list_cases(status: Optional[str] = None, limit: int = 50):
                 "tags": case_node.get("tags", []),
                 "created_at": datetime.fromtimestamp(case_node["created_at"] / 1000).isoformat(),
                 "updated_at": datetime.fromtimestamp(case_node["updated_at"] / 1000).isoformat(),
-                "entity_count": record["entity_count"],
-                "job_count": record["job_count"]
+                "entity_count": case_node.get("stat_entities") or 0,
+                "job_count": case_node.get("stat_jobs") or 0
             })
         
         return {"cases": cases}
@@ -712,12 +972,10 @@ async def list_cases(status: Optional[str] = None, limit: int = 50):
 async def get_case(case_id: str):
     """Get case details"""
     with db.driver.session() as session:
+        case_stats.recompute(session, case_id)
         cypher_query = """
             MATCH (c:Case {id: $case_id})
-            OPTIONAL MATCH (c)-[:CONTAINS]->(e)
-            OPTIONAL MATCH (c)-[:HAS_JOB]->(j:ScanJob)
-            WITH c, count(DISTINCT e) as entity_count, count(DISTINCT j) as job_count
-            RETURN c, entity_count, job_count
+            RETURN c
         """
         result = session.run(cypher_query, case_id=case_id)
         
@@ -735,8 +993,8 @@ async def get_case(case_id: str):
             tags=case_node.get("tags", []),
             created_at=datetime.fromtimestamp(case_node["created_at"] / 1000),
             updated_at=datetime.fromtimestamp(case_node["updated_at"] / 1000),
-            entity_count=record["entity_count"],
-            job_count=record["job_count"]
+            entity_count=case_node.get("stat_entities") or 0,
+            job_count=case_node.get("stat_jobs") or 0
         )
 
 
@@ -765,6 +1023,7 @@ async def update_case(case_id: str, case_update: CaseUpdate):
             params["tags"] = case_update.tags
         
         updates.append("c.updated_at = $updated_at")
+        updates.append(version_bump())
         
         cypher_query = f"""
             MATCH (c:Case {{id: $case_id}})
@@ -785,12 +1044,23 @@ async def update_case(case_id: str, case_update: CaseUpdate):
 async def delete_case(case_id: str):
     """Delete a case"""
     with db.driver.session() as session:
-        cypher_query = """
-            MATCH (c:Case {id: $case_id})
-            DETACH DELETE c
-        """
-        session.run(cypher_query, case_id=case_id)
-        return {"success": True}
+        # Entities the case contains directly or through one of its watchlists
+        candidate_keys = garbage_collector.candidates(
+            session,
+            "MATCH (:Case {id: $case_id})-[:CONTAINS|HAS_WATCHLIST|WATCHES*1..2]->(root:Entity)",
+            {"case_id": case_id}
+        )
+        watchlists = "MATCH (:Case {id: $case_id})-[:HAS_WATCHLIST]->"
+        garbage_collector.delete_node(
+            session, watchlists + "(:Watchlist)-[:RECORDED]->(n:WatchEvent)", {"case_id": case_id}
+        )
+        garbage_collector.delete_node(session, watchlists + "(n:Watchlist)", {"case_id": case_id})
+        garbage_collector.delete_node(session, "MATCH (n:Case {id: $case_id})", {"case_id": case_id})
+    
+    if candidate_keys:
+        collect_garbage.delay(candidate_keys)
+    
+    return {"success": True}
 
 
 @app.post("/api/cases/{case_id}/entities")
@@ -802,22 +1072,17 @@ async def add_entity_to_case(case_id: str, entity_data: CaseAddEntity):
         if not label:
             raise HTTPException(status_code=400, detail="Invalid entity type")
         
+        entity_match, params = db.entity_match("e", entity_data.entity_id, entity_data.entity_type)
         cypher_query = f"""
             MATCH (c:Case {{id: $case_id}})
-            MATCH (e:{label})
-            WHERE elementId(e) = $entity_id OR 
-                  e.address = $entity_id OR 
-                  e.name = $entity_id
+            {entity_match}
             MERGE (c)-[:CONTAINS]->(e)
+            ON CREATE SET {membership_update(1)}
             SET c.updated_at = timestamp()
             RETURN c, e
         """
         
-        result = session.run(
-            cypher_query,
-            case_id=case_id,
-            entity_id=entity_data.entity_id
-        )
+        result = session.run(cypher_query, case_id=case_id, **params)
         
         if not result.single():
             raise HTTPException(status_code=404, detail="Case or entity not found")
@@ -829,10 +1094,11 @@ async def add_entity_to_case(case_id: str, entity_data: CaseAddEntity):
 async def add_job_to_case(case_id: str, job_data: CaseAddJob):
     """Add a scan job to a case"""
     with db.driver.session() as session:
-        cypher_query = """
-            MATCH (c:Case {id: $case_id})
-            MATCH (j:ScanJob {id: $job_id})
+        cypher_query = f"""
+            MATCH (c:Case {{id: $case_id}})
+            MATCH (j:ScanJob {{id: $job_id}})
             MERGE (c)-[:HAS_JOB]->(j)
+            ON CREATE SET c.stat_jobs = coalesce(c.stat_jobs, 0) + 1, {version_bump()}
             SET c.updated_at = timestamp()
             RETURN c, j
         """
@@ -855,7 +1121,7 @@ async def get_case_entities(case_id: str):
     with db.driver.session() as session:
         cypher_query = """
             MATCH (c:Case {id: $case_id})-[:CONTAINS]->(e)
-            RETURN e, labels(e)[0] as entity_type
+            RETURN e, [l IN labels(e) WHERE l <> 'Entity'][0] as entity_type
         """
         result = session.run(cypher_query, case_id=case_id)
         
@@ -875,16 +1141,16 @@ async def get_case_entities(case_id: str):
 async def remove_entity_from_case(case_id: str, entity_id: str):
     """Remove an entity from a case"""
     with db.driver.session() as session:
-        cypher_query = """
-            MATCH (c:Case {id: $case_id})-[r:CONTAINS]->(e)
-            WHERE elementId(e) = $entity_id OR 
-                  e.address = $entity_id OR 
-                  e.name = $entity_id
+        entity_match, params = db.entity_match("e", entity_id)
+        cypher_query = f"""
+            {entity_match}
+            MATCH (c:Case {{id: $case_id}})-[r:CONTAINS]->(e)
             DELETE r
-            SET c.updated_at = timestamp()
+            SET c.updated_at = timestamp(),
+                {membership_update(-1)}
             RETURN count(r) as deleted
         """
-        result = session.run(cypher_query, case_id=case_id, entity_id=entity_id)
+        result = session.run(cypher_query, case_id=case_id, **params)
         record = result.single()
         
         if record and record["deleted"] > 0:
@@ -897,19 +1163,10 @@ async def remove_entity_from_case(case_id: str, entity_id: str):
 async def get_case_stats(case_id: str):
     """Get detailed statistics for a case"""
     with db.driver.session() as session:
+        case_stats.recompute(session, case_id)
         cypher_query = """
             MATCH (c:Case {id: $case_id})
-            OPTIONAL MATCH (c)-[:CONTAINS]->(e)
-            WITH c, collect(DISTINCT e) as entities
-            RETURN c,
-                   size(entities) as total_entities,
-                   size([e IN entities WHERE labels(e)[0] = 'Email']) as email_count,
-                   size([e IN entities WHERE labels(e)[0] = 'Domain']) as domain_count,
-                   size([e IN entities WHERE labels(e)[0] = 'IP']) as ip_count,
-                   size([e IN entities WHERE e.risk_level = 'HIGH']) as high_risk_count,
-                   size([e IN entities WHERE e.risk_level = 'MEDIUM']) as medium_risk_count,
-                   size([e IN entities WHERE e.risk_level = 'LOW']) as low_risk_count,
-                   [e IN entities WHERE e.risk_score IS NOT NULL | e.risk_score] as risk_scores
+            RETURN c
         """
         result = session.run(cypher_query, case_id=case_id)
         record = result.single()
@@ -917,94 +1174,493 @@ async def get_case_stats(case_id: str):
         if not record:
             raise HTTPException(status_code=404, detail="Case not found")
         
-        risk_scores = record["risk_scores"]
-        avg_risk = sum(risk_scores) / len(risk_scores) if risk_scores else 0
-        
+        return case_stats.summary(record["c"])
+
+
+@app.get("/api/cases/{case_id}/export")
+async def export_case(case_id: str, format: str = "ndjson"):
+    """
+    Stream a case's entities and the relationships between them
+    
+    Formats: ndjson (entities then relationships), csv (entities only),
+    stix (STIX 2.1 bundle)
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of: {', '.join(EXPORT_FORMATS)}")
+    
+    with db.driver.session() as session:
+        if not session.run("MATCH (c:Case {id: $case_id}) RETURN c.id", case_id=case_id).single():
+            raise HTTPException(status_code=404, detail="Case not found")
+    
+    return _export_response("case", case_id, format)
+
+
+def _current_report(session, case_id: str) -> Optional[dict]:
+    """Report ID and title for a case at its current content version"""
+    case_stats.recompute(session, case_id)
+    cypher_query = """
+        MATCH (c:Case {id: $case_id})
+        RETURN c.title as title, coalesce(c.content_version, 0) as version
+    """
+    record = session.run(cypher_query, case_id=case_id).single()
+    if not record:
+        return None
+    return {"report_id": report_cache.report_id(case_id, record["version"]), "title": record["title"]}
+
+
+def _report_status(report_id: str) -> dict:
+    """Progress of a report: cached on disk, or the state of its generation task"""
+    if report_cache.exists(report_id):
         return {
-            "total_entities": record["total_entities"],
-            "entity_breakdown": {
-                "emails": record["email_count"],
-                "domains": record["domain_count"],
-                "ips": record["ip_count"]
-            },
-            "risk_breakdown": {
-                "high": record["high_risk_count"],
-                "medium": record["medium_risk_count"],
-                "low": record["low_risk_count"]
-            },
-            "average_risk_score": round(avg_risk, 2)
+            "report_id": report_id,
+            "status": "completed",
+            "progress": 100,
+            "download_url": f"/api/reports/{report_id}/download"
         }
+    
+    task = celery_app.AsyncResult(report_id)
+    status = {"report_id": report_id, "status": task.state.lower(), "progress": 0}
+    if task.state in ("QUEUED", "PROGRESS") and isinstance(task.info, dict):
+        status.update(progress=task.info.get("progress", 0), stage=task.info.get("stage"))
+    elif task.state == "SUCCESS":
+        # The task finished but its file is gone (or it reported a failure)
+        result = task.result or {}
+        status.update(status="failed", error=result.get("error", "Report file missing"))
+    return status
+
+
+def _request_report(case_id: str, report_id: str) -> dict:
+    """Enqueue report generation unless it is cached or already in progress"""
+    status = _report_status(report_id)
+    if status["status"] in ("pending", "failed", "failure"):
+        # Task ID doubles as report ID so progress can be looked up later
+        celery_app.backend.store_result(report_id, {"progress": 0, "stage": "queued"}, "QUEUED")
+        generate_report.apply_async((case_id, report_id), task_id=report_id)
+        status = _report_status(report_id)
+    return status
+
+
+@app.post("/api/cases/{case_id}/reports", status_code=202)
+async def request_case_report(case_id: str):
+    """
+    Start generating a PDF report for a case in the background
+    
+    Reports are cached per case content version, so an unchanged case is
+    served from cache immediately.
+    """
+    with db.driver.session() as session:
+        current = _current_report(session, case_id)
+    
+    if not current:
+        raise HTTPException(status_code=404, detail="Case not found")
+    
+    return _request_report(case_id, current["report_id"])
+
+
+@app.get("/api/reports/{report_id}")
+async def get_report_status(report_id: str):
+    """Get report generation progress"""
+    try:
+        report_cache.parse_report_id(report_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return _report_status(report_id)
+
+
+@app.get("/api/reports/{report_id}/download")
+async def download_report(report_id: str):
+    """Download a generated PDF report"""
+    try:
+        case_id, _ = report_cache.parse_report_id(report_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not report_cache.exists(report_id):
+        raise HTTPException(status_code=404, detail="Report not ready")
+    
+    return FileResponse(
+        report_cache.path(report_id),
+        media_type="application/pdf",
+        filename=f"case-{case_id}.pdf"
+    )
 
 
 @app.get("/api/cases/{case_id}/report")
 async def generate_case_report(case_id: str):
-    """Generate PDF report for a case"""
-    try:
-        # Get case data
-        with db.driver.session() as session:
-            case_query = """
-                MATCH (c:Case {id: $case_id})
-                OPTIONAL MATCH (c)-[:CONTAINS]->(e)
-                OPTIONAL MATCH (c)-[:HAS_JOB]->(j:ScanJob)
-                WITH c, count(DISTINCT e) as entity_count, count(DISTINCT j) as job_count
-                RETURN c, entity_count, job_count
-            """
-            result = session.run(case_query, case_id=case_id)
-            record = result.single()
-            
-            if not record:
-                raise HTTPException(status_code=404, detail="Case not found")
-            
-            case_node = record["c"]
-            case_data = {
-                "id": case_node["id"],
-                "title": case_node["title"],
-                "description": case_node.get("description"),
-                "status": case_node["status"],
-                "priority": case_node["priority"],
-                "tags": case_node.get("tags", []),
-                "created_at": datetime.fromtimestamp(case_node["created_at"] / 1000).isoformat(),
-                "updated_at": datetime.fromtimestamp(case_node["updated_at"] / 1000).isoformat(),
-                "entity_count": record["entity_count"],
-                "job_count": record["job_count"]
-            }
+    """
+    Generate PDF report for a case
+    
+    Serves the cached report when the case is unchanged; otherwise waits
+    (without blocking the server) for the background job, up to
+    `report_wait_seconds`, and falls back to returning its progress.
+    """
+    with db.driver.session() as session:
+        current = _current_report(session, case_id)
+    
+    if not current:
+        raise HTTPException(status_code=404, detail="Case not found")
+    
+    report_id = current["report_id"]
+    status = _request_report(case_id, report_id)
+    
+    deadline = asyncio.get_running_loop().time() + settings.report_wait_seconds
+    while status["status"] not in ("completed", "failed", "failure"):
+        if asyncio.get_running_loop().time() >= deadline:
+            return JSONResponse(status_code=202, content=status)
+        await asyncio.sleep(0.5)
+        status = _report_status(report_id)
+    
+    if status["status"] != "completed":
+        logger.error(f"Failed to generate report: {status.get('error')}")
+        raise HTTPException(status_code=500, detail=f"Failed to generate report: {status.get('error')}")
+    
+    filename = f"case-{current['title'].replace(' ', '-').lower()}-{datetime.now().strftime('%Y%m%d')}.pdf"
+    
+    return FileResponse(
+        report_cache.path(report_id),
+        media_type="application/pdf",
+        filename=filename
+    )
+
+
+# ============================================
+# WATCHLIST ENDPOINTS
+# ============================================
+
+WATCHABLE_TYPES = ["email", "domain", "ip"]
+
+
+def _watchlist(record) -> Watchlist:
+    w = record["w"]
+    return Watchlist(
+        id=w["id"],
+        case_id=record["case_id"],
+        name=w["name"],
+        cadence_hours=w["cadence_hours"],
+        enabled=w["enabled"],
+        member_count=record["member_count"],
+        created_at=datetime.fromtimestamp(w["created_at"] / 1000),
+        last_change_at=datetime.fromtimestamp(w["last_change_at"] / 1000) if w.get("last_change_at") else None
+    )
+
+
+def _watch_entities(session, watchlist_id: str, entities: List[CaseAddEntity]) -> int:
+    """
+    Add entities to a watchlist (and to its case), creating any not yet in the graph
+    
+    Each member's first refresh is offset by a hash of its key within one
+    cadence, so a large list is refreshed evenly rather than all at once.
+    
+    Returns:
+        Number of entities newly watched
+    """
+    by_type = {}
+    for entity in entities:
+        if entity.entity_type not in WATCHABLE_TYPES:
+            raise HTTPException(status_code=400, detail=f"Invalid entity type: {entity.entity_type}")
+        by_type.setdefault(entity.entity_type, {})[entity.entity_id] = None
+    
+    count_query = """
+        MATCH (w:Watchlist {id: $watchlist_id})
+        RETURN w.cadence_hours as cadence_hours, COUNT { (w)-[:WATCHES]->() } as member_count
+    """
+    record = session.run(count_query, watchlist_id=watchlist_id).single()
+    if not record:
+        raise HTTPException(status_code=404, detail="Watchlist not found")
+    cadence_ms = int(record["cadence_hours"] * 3600000)
+    member_count = record["member_count"]
+    
+    for entity_type, values in by_type.items():
+        label = ENTITY_LABELS[entity_type]
+        rows = []
+        for value in values:
+            key = entity_key(label, value)
+            rows.append({"key": key, "value": value, "offset": zlib.crc32(key.encode()) % cadence_ms})
         
-        # Get entities
-        with db.driver.session() as session:
-            entities_query = """
-                MATCH (c:Case {id: $case_id})-[:CONTAINS]->(e)
-                RETURN e, labels(e)[0] as entity_type
+        cypher_query = f"""
+            MATCH (c:Case)-[:HAS_WATCHLIST]->(w:Watchlist {{id: $watchlist_id}})
+            UNWIND $rows AS row
+            MERGE (e:Entity {{key: row.key}})
+            ON CREATE SET e:{label}, e.{ENTITY_ID_FIELDS[label]} = row.value
+            MERGE (c)-[:CONTAINS]->(e)
+            ON CREATE SET {membership_update(1)}
+            MERGE (w)-[r:WATCHES]->(e)
+            ON CREATE SET r.added_at = timestamp(), r.next_refresh_at = timestamp() + row.offset
+        """
+        session.run(cypher_query, watchlist_id=watchlist_id, rows=rows)
+    
+    return session.run(count_query, watchlist_id=watchlist_id).single()["member_count"] - member_count
+
+
+@app.post("/api/cases/{case_id}/watchlists", response_model=Watchlist)
+async def create_watchlist(case_id: str, watchlist_data: WatchlistCreate):
+    """Create a watchlist whose members are re-enriched every cadence_hours"""
+    watchlist_id = str(uuid.uuid4())
+    
+    with db.driver.session() as session:
+        cypher_query = """
+            MATCH (c:Case {id: $case_id})
+            CREATE (c)-[:HAS_WATCHLIST]->(w:Watchlist {
+                id: $watchlist_id,
+                name: $name,
+                cadence_hours: $cadence_hours,
+                enabled: true,
+                created_at: timestamp()
+            })
+            RETURN w
+        """
+        result = session.run(
+            cypher_query,
+            case_id=case_id,
+            watchlist_id=watchlist_id,
+            name=watchlist_data.name,
+            cadence_hours=watchlist_data.cadence_hours
+        )
+        record = result.single()
+        if not record:
+            raise HTTPException(status_code=404, detail="Case not found")
+        
+        member_count = 0
+        if watchlist_data.entities:
+            member_count = _watch_entities(session, watchlist_id, watchlist_data.entities)
+        
+        return _watchlist({"w": record["w"], "case_id": case_id, "member_count": member_count})
+
+
+@app.get("/api/cases/{case_id}/watchlists")
+async def list_watchlists(case_id: str):
+    """List a case's watchlists"""
+    with db.driver.session() as session:
+        cypher_query = """
+            MATCH (c:Case {id: $case_id})-[:HAS_WATCHLIST]->(w:Watchlist)
+            RETURN w, c.id as case_id, COUNT { (w)-[:WATCHES]->() } as member_count
+            ORDER BY w.created_at
+        """
+        result = session.run(cypher_query, case_id=case_id)
+        return {"watchlists": [_watchlist(record) for record in result]}
+
+
+@app.patch("/api/watchlists/{watchlist_id}", response_model=Watchlist)
+async def update_watchlist(watchlist_id: str, watchlist_update: WatchlistUpdate):
+    """Rename a watchlist, change its cadence, or pause/resume it"""
+    with db.driver.session() as session:
+        updates = []
+        params = {"watchlist_id": watchlist_id}
+        
+        if watchlist_update.name is not None:
+            updates.append("w.name = $name")
+            params["name"] = watchlist_update.name
+        if watchlist_update.enabled is not None:
+            updates.append("w.enabled = $enabled")
+            params["enabled"] = watchlist_update.enabled
+        if watchlist_update.cadence_hours is not None:
+            updates.append("w.cadence_hours = $cadence_hours")
+            params["cadence_hours"] = watchlist_update.cadence_hours
+        
+        cypher_query = f"""
+            MATCH (c:Case)-[:HAS_WATCHLIST]->(w:Watchlist {{id: $watchlist_id}})
+            {'SET ' + ', '.join(updates) if updates else ''}
+            RETURN w, c.id as case_id, COUNT {{ (w)-[:WATCHES]->() }} as member_count
+        """
+        record = session.run(cypher_query, **params).single()
+        if not record:
+            raise HTTPException(status_code=404, detail="Watchlist not found")
+        
+        # Pull refreshes that are now further out than one new cadence back in
+        if watchlist_update.cadence_hours is not None:
+            cypher_query = """
+                MATCH (w:Watchlist {id: $watchlist_id})-[r:WATCHES]->()
+                WHERE r.next_refresh_at > timestamp() + $cadence_ms
+                SET r.next_refresh_at = timestamp() + r.next_refresh_at % $cadence_ms
             """
-            result = session.run(entities_query, case_id=case_id)
-            
-            entities = []
-            for record in result:
-                entity_node = record["e"]
-                entities.append({
-                    "id": entity_node.element_id,
-                    "type": record["entity_type"],
-                    "properties": dict(entity_node)
-                })
-        
-        # Get statistics
-        stats_response = await get_case_stats(case_id)
-        
-        # Generate PDF
-        pdf_content = report_generator.generate_case_report(case_data, entities, stats_response)
-        
-        # Return PDF
-        filename = f"case-{case_data['title'].replace(' ', '-').lower()}-{datetime.now().strftime('%Y%m%d')}.pdf"
-        
-        return Response(
-            content=pdf_content,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename={filename}"
-            }
+            session.run(
+                cypher_query,
+                watchlist_id=watchlist_id,
+                cadence_ms=int(watchlist_update.cadence_hours * 3600000)
+            )
+        
+        return _watchlist(record)
+
+
+@app.delete("/api/watchlists/{watchlist_id}")
+async def delete_watchlist(watchlist_id: str):
+    """Delete a watchlist and its change events"""
+    with db.driver.session() as session:
+        params = {"watchlist_id": watchlist_id}
+        candidate_keys = garbage_collector.candidates(
+            session, "MATCH (:Watchlist {id: $watchlist_id})-[:WATCHES]->(root:Entity)", params
+        )
+        garbage_collector.delete_node(
+            session, "MATCH (:Watchlist {id: $watchlist_id})-[:RECORDED]->(n:WatchEvent)", params
         )
+        deleted = garbage_collector.delete_node(session, "MATCH (n:Watchlist {id: $watchlist_id})", params)
+    
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Watchlist not found")
+    if candidate_keys:
+        collect_garbage.delay(candidate_keys)
+    
+    return {"success": True}
+
+
+@app.post("/api/watchlists/{watchlist_id}/entities")
+async def add_watchlist_entities(watchlist_id: str, members: WatchlistMembers):
+    """Watch entities; they are also added to the watchlist's case"""
+    with db.driver.session() as session:
+        added = _watch_entities(session, watchlist_id, members.entities)
+    
+    return {"success": True, "added": added}
+
+
+@app.delete("/api/watchlists/{watchlist_id}/entities/{entity_type}/{entity_id}")
+async def remove_watchlist_entity(watchlist_id: str, entity_type: EntityType, entity_id: str):
+    """Stop watching an entity (it stays in the case)"""
+    with db.driver.session() as session:
+        entity_match, params = db.entity_match("e", entity_id, entity_type.value)
+        cypher_query = f"""
+            {entity_match}
+            MATCH (:Watchlist {{id: $watchlist_id}})-[r:WATCHES]->(e)
+            DELETE r
+            RETURN count(r) as deleted
+        """
+        record = session.run(cypher_query, watchlist_id=watchlist_id, **params).single()
         
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Failed to generate report: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to generate report: {str(e)}")
+        if not record or not record["deleted"]:
+            raise HTTPException(status_code=404, detail="Entity not found in watchlist")
+        
+        return {"success": True}
+
+
+@app.get("/api/watchlists/{watchlist_id}/events")
+async def get_watchlist_events(watchlist_id: str, limit: int = Query(100, ge=1, le=1000)):
+    """
+    Changes detected by scheduled refreshes, newest first
+    
+    An event is recorded only when at least one provider returned different
+    data than on its previous run.
+    """
+    with db.driver.session() as session:
+        record = session.run(
+            "MATCH (w:Watchlist {id: $watchlist_id}) RETURN w.id as id", watchlist_id=watchlist_id
+        ).single()
+        if not record:
+            raise HTTPException(status_code=404, detail="Watchlist not found")
+        
+        cypher_query = """
+            MATCH (:Watchlist {id: $watchlist_id})-[:RECORDED]->(ev:WatchEvent)
+            RETURN ev
+            ORDER BY ev.detected_at DESC
+            LIMIT $limit
+        """
+        result = session.run(cypher_query, watchlist_id=watchlist_id, limit=limit)
+        
+        events = []
+        for record in result:
+            event = record["ev"]
+            entity_type, value = event["entity_key"].split(":", 1)
+            events.append({
+                "id": event["id"],
+                "entity_type": entity_type,
+                "entity_id": value,
+                "providers": event.get("providers", []),
+                "risk_score_before": event.get("risk_score_before"),
+                "risk_score_after": event.get("risk_score_after"),
+                "detected_at": datetime.fromtimestamp(event["detected_at"] / 1000).isoformat()
+            })
+        
+        return {"events": events}
+
+
+# ============================================
+# ADMIN ENDPOINTS
+# ============================================
+
+@app.post("/api/admin/gc")
+async def start_garbage_collection(dry_run: bool = True):
+    """
+    Sweep the whole graph for orphaned entities in the background
+    
+    Runs as a dry run (count and sample only) unless dry_run=false.
+    """
+    task = collect_garbage.delay(None, dry_run=dry_run)
+    return {"task_id": task.id, "dry_run": dry_run}
+
+
+@app.post("/api/admin/rescore")
+async def start_rescoring(entity_type: Optional[List[EntityType]] = Query(None), stale_only: bool = False):
+    """
+    Recompute risk scores across the whole graph in the background
+    
+    Use after changing scoring rules; with stale_only, only entities scored
+    by an older rule set are rescored. Progress is available from the task
+    endpoint.
+    """
+    entity_types = [t.value for t in entity_type] if entity_type else None
+    task = rescore_entities.delay(entity_types, stale_only=stale_only)
+    return {"task_id": task.id, "entity_types": entity_types, "stale_only": stale_only}
+
+
+@app.get("/api/admin/risk-rules")
+async def get_risk_rules():
+    """Active risk rule set and how many stored scores predate it"""
+    try:
+        rule_set = risk_engine.rule_set()
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    with db.driver.session() as session:
+        cypher_query = """
+            MATCH (n:Entity)
+            WHERE n.risk_score IS NOT NULL AND coalesce(n.risk_rules_version, '') <> $version
+            RETURN [l IN labels(n) WHERE l <> 'Entity'][0] as label, count(n) as stale
+        """
+        result = session.run(cypher_query, version=rule_set.version)
+        stale = {record["label"]: record["stale"] for record in result}
+    
+    return {
+        "version": rule_set.version,
+        "source": rule_set.source,
+        "loaded_at": rule_set.loaded_at.isoformat(),
+        "entity_types": {entity_type: rule_set.inputs(entity_type) for entity_type in rule_set.entities},
+        "stale_scores": stale
+    }
+
+
+@app.get("/api/admin/scheduler")
+async def get_scheduler_stats():
+    """Worker slots in use and pending/running jobs per tenant"""
+    try:
+        return job_scheduler.stats()
+    except redis.RedisError as e:
+        raise HTTPException(status_code=503, detail=f"Scheduler unavailable: {e}")
+
+
+@app.get("/api/admin/key-pools")
+async def get_key_pool_stats():
+    """Daily usage, remaining quota and cool-down of every pooled provider key"""
+    try:
+        return key_pool.stats()
+    except redis.RedisError as e:
+        raise HTTPException(status_code=503, detail=f"Key pools unavailable: {e}")
+
+
+@app.get("/api/admin/provider-latency")
+async def get_provider_latency():
+    """Latency percentiles, timeout rate and current deadline per provider, worst tail first"""
+    try:
+        return provider_latency.stats()
+    except redis.RedisError as e:
+        raise HTTPException(status_code=503, detail=f"Latency histograms unavailable: {e}")
+
+
+@app.get("/api/admin/tasks/{task_id}")
+async def get_admin_task(task_id: str):
+    """Status and result of a background admin task"""
+    task = celery_app.AsyncResult(task_id)
+    return {
+        "task_id": task_id,
+        "status": task.status,
+        "progress": task.info if task.state == "PROGRESS" else None,
+        "result": task.result if task.successful() else None
+    }
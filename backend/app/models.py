@@ -10,12 +10,37 @@ class EntityType(str, Enum):
     IP = "ip"
 
 
+class JobLane(str, Enum):
+    INTERACTIVE = "interactive"
+    BULK = "bulk"
+
+
+class LookupProfile(str, Enum):
+    TRIAGE = "triage"
+    STANDARD = "standard"
+    DEEP = "deep"
+
+
 class LookupRequest(BaseModel):
     query: str = Field(..., description="Email, domain, or IP to investigate")
     entity_type: EntityType
     depth: int = Field(default=1, ge=1, le=3, description="Enrichment depth")
-    sources: Optional[List[str]] = Field(default=None, description="Specific sources to use")
+    sources: Optional[List[str]] = Field(default=None, description="Specific providers or capabilities to use")
     api_keys: Optional[Dict[str, str]] = Field(default=None, description="API keys for providers")
+    max_age_hours: Optional[float] = Field(
+        default=None, ge=0,
+        description="Reuse provider data younger than this (0 refreshes everything; default from settings)"
+    )
+    lane: JobLane = Field(
+        default=JobLane.INTERACTIVE,
+        description="Interactive lookups are scheduled ahead of bulk ones"
+    )
+    profile: LookupProfile = Field(
+        default=LookupProfile.DEEP,
+        description="Provider budget: triage runs only free sources, deep runs everything"
+    )
+    max_cost: Optional[float] = Field(default=None, ge=0, description="Quota cost budget, overriding the profile")
+    max_latency_seconds: Optional[float] = Field(default=None, gt=0, description="Latency budget, overriding the profile")
 
 
 class JobStatus(str, Enum):
@@ -24,6 +49,7 @@ class JobStatus(str, Enum):
     COMPLETED = "completed"
     PARTIAL = "partial"
     FAILED = "failed"
+    CANCELLED = "cancelled"
 
 
 class ScanJob(BaseModel):
@@ -36,6 +62,22 @@ class ScanJob(BaseModel):
     total_tasks: int = 0
     completed_tasks: int = 0
     errors: List[str] = []
+    profile: LookupProfile = LookupProfile.DEEP
+    planned_providers: Optional[List[str]] = Field(
+        default=None, description="Providers chosen for the lookup's budget, in run order"
+    )
+    reused_providers: List[str] = []
+    completed_providers: List[str] = []
+    attempts: int = 0
+    retries: List[Dict[str, Any]] = Field(
+        default=[], description="Transient provider failures and the retries scheduled for them"
+    )
+    next_retry_at: Optional[datetime] = None
+    attached: bool = Field(default=False, description="True if this lookup joined an identical in-flight job")
+    attached_requests: int = 0
+    estimated_wait_seconds: Optional[float] = Field(
+        default=None, description="Expected queueing delay before the job starts, estimated at submission"
+    )
 
 
 class GraphNode(BaseModel):
@@ -56,3 +56,30 @@ class CaseAddEntity(BaseModel):
 
 class CaseAddJob(BaseModel):
     job_id: str
+
+
+class WatchlistCreate(BaseModel):
+    name: str = Field(..., min_length=1, max_length=200)
+    cadence_hours: float = Field(24, ge=1, description="How often each member is re-enriched")
+    entities: List[CaseAddEntity] = []
+
+
+class WatchlistUpdate(BaseModel):
+    name: Optional[str] = Field(None, min_length=1, max_length=200)
+    cadence_hours: Optional[float] = Field(None, ge=1)
+    enabled: Optional[bool] = None
+
+
+class WatchlistMembers(BaseModel):
+    entities: List[CaseAddEntity] = Field(..., min_length=1, max_length=5000)
+
+
+class Watchlist(BaseModel):
+    id: str
+    case_id: str
+    name: str
+    cadence_hours: float
+    enabled: bool
+    member_count: int = 0
+    created_at: datetime
+    last_change_at: Optional[datetime] = None
@@ -1,6 +1,9 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 import httpx
+import time
 import logging
 
 logger = logging.getLogger(__name__)
@@ -9,9 +12,16 @@ logger = logging.getLogger(__name__)
 class BaseProvider(ABC):
     """Base class for OSINT providers"""
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, timeout: float = 30.0):
         self.api_key = api_key
-        self.client = httpx.AsyncClient(timeout=30.0)
+        # Applies to each request, not to a whole enrich() call
+        self.timeout = timeout
+        # (seconds, timed out) per request made, drained by the worker
+        self.request_latencies: List[Tuple[float, bool]] = []
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            event_hooks={"request": [self._start_request], "response": [self._finish_request]}
+        )
     
     @property
     @abstractmethod
@@ -28,11 +38,68 @@ class BaseProvider(ABC):
         """Close HTTP client"""
         await self.client.aclose()
     
+    def _record_request(self, seconds: float, timed_out: bool = False):
+        """Note one request's latency; a timed-out request counts as the full timeout"""
+        self.request_latencies.append((seconds, timed_out))
+    
+    async def _start_request(self, request: httpx.Request):
+        request.extensions["started_at"] = time.monotonic()
+    
+    async def _finish_request(self, response: httpx.Response):
+        started = response.request.extensions.get("started_at")
+        if started is not None:
+            self._record_request(time.monotonic() - started)
+    
     def _handle_error(self, error: Exception) -> Dict[str, Any]:
-        """Standard error handling"""
+        """
+        Standard error handling
+        
+        Rate limiting, server errors and network failures are marked
+        retryable, with the delay the API asked for (Retry-After) if any.
+        """
         logger.error(f"{self.name} error: {error}")
-        return {
+        result = {
             "success": False,
             "error": str(error),
-            "provider": self.name
+            "provider": self.name,
+            "error_class": "permanent",
+            "retryable": False,
+            "retry_after": None
         }
+        
+        if isinstance(error, httpx.HTTPStatusError):
+            status = error.response.status_code
+            result["status_code"] = status
+            if status == 429:
+                result["error_class"] = "rate_limited"
+            elif status in RETRYABLE_STATUS_CODES:
+                result["error_class"] = "server_error"
+            if result["error_class"] != "permanent":
+                result["retryable"] = True
+                result["retry_after"] = _retry_after(error.response)
+        elif isinstance(error, (httpx.TimeoutException, httpx.NetworkError)):
+            if isinstance(error, httpx.TimeoutException):
+                self._record_request(self.timeout, timed_out=True)
+            result["error_class"] = "network"
+            result["retryable"] = True
+        
+        return result
+
+
+# 5xx responses worth retrying; others (e.g. 501) will not change on retry
+RETRYABLE_STATUS_CODES = {500, 502, 503, 504}
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    """Seconds to wait according to a Retry-After header (delta-seconds or HTTP date)"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
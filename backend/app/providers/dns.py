@@ -1,7 +1,9 @@
 from app.providers.base import BaseProvider
 from typing import Dict, Any
 import dns.resolver
+import dns.exception
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +22,7 @@ class DNSProvider(BaseProvider):
         
         try:
             resolver = dns.resolver.Resolver()
+            resolver.lifetime = self.timeout
             results = {
                 "success": True,
                 "provider": self.name,
@@ -29,21 +32,21 @@ class DNSProvider(BaseProvider):
             
             # A records (IPv4)
             try:
-                a_records = resolver.resolve(query, 'A')
+                a_records = self._resolve(resolver, query, 'A')
                 results["records"]["A"] = [str(r) for r in a_records]
             except:
                 results["records"]["A"] = []
             
             # AAAA records (IPv6)
             try:
-                aaaa_records = resolver.resolve(query, 'AAAA')
+                aaaa_records = self._resolve(resolver, query, 'AAAA')
                 results["records"]["AAAA"] = [str(r) for r in aaaa_records]
             except:
                 results["records"]["AAAA"] = []
             
             # MX records
             try:
-                mx_records = resolver.resolve(query, 'MX')
+                mx_records = self._resolve(resolver, query, 'MX')
                 results["records"]["MX"] = [
                     {"priority": r.preference, "exchange": str(r.exchange)}
                     for r in mx_records
@@ -53,14 +56,14 @@ class DNSProvider(BaseProvider):
             
             # NS records
             try:
-                ns_records = resolver.resolve(query, 'NS')
+                ns_records = self._resolve(resolver, query, 'NS')
                 results["records"]["NS"] = [str(r) for r in ns_records]
             except:
                 results["records"]["NS"] = []
             
             # TXT records
             try:
-                txt_records = resolver.resolve(query, 'TXT')
+                txt_records = self._resolve(resolver, query, 'TXT')
                 results["records"]["TXT"] = [str(r) for r in txt_records]
             except:
                 results["records"]["TXT"] = []
@@ -69,3 +72,14 @@ class DNSProvider(BaseProvider):
             
         except Exception as e:
             return self._handle_error(e)
+    
+    def _resolve(self, resolver, query: str, record_type: str):
+        """Resolve one record type, noting its latency (the resolver lifetime is the timeout)"""
+        started = time.monotonic()
+        try:
+            answer = resolver.resolve(query, record_type)
+        except dns.exception.Timeout:
+            self._record_request(self.timeout, timed_out=True)
+            raise
+        self._record_request(time.monotonic() - started)
+        return answer
@@ -0,0 +1,118 @@
+"""
+Provider Registry
+What each provider covers, what it costs to call and which providers it builds on
+"""
+from app.providers.hibp import HIBPProvider
+from app.providers.dns import DNSProvider
+from app.providers.whois import WHOISProvider
+from app.providers.hunter import HunterProvider
+from app.providers.geoip import GeoIPProvider
+from app.providers.shodan import ShodanProvider
+from app.providers.virustotal import VirusTotalProvider
+from app.providers.urlscan import URLScanProvider
+from app.providers.alienvault import AlienVaultProvider
+
+
+# Provider name -> declaration:
+#   provider      class to instantiate with an API key
+#   entity_types  lookups the provider supports
+#   capabilities  kinds of data it contributes (usable as lookup "sources")
+#   latency       expected seconds per call, until latency has been observed
+#   cost          quota units per call; 0 for sources without an API quota
+#   api_key       name of its key in a request's api_keys / key pool entry
+#   key_required  skipped entirely when no key is available
+#   depends_on    providers whose results it needs, planned and run first
+PROVIDER_REGISTRY = {
+    "dns": {
+        "provider": DNSProvider,
+        "entity_types": ["domain"],
+        "capabilities": ["dns"],
+        "latency": 1.0,
+        "cost": 0,
+        "api_key": None,
+        "key_required": False,
+        "depends_on": []
+    },
+    "whois": {
+        "provider": WHOISProvider,
+        "entity_types": ["domain"],
+        "capabilities": ["registration"],
+        "latency": 3.0,
+        "cost": 0,
+        "api_key": None,
+        "key_required": False,
+        "depends_on": []
+    },
+    "geoip": {
+        "provider": GeoIPProvider,
+        "entity_types": ["ip"],
+        "capabilities": ["geolocation", "asn"],
+        "latency": 1.0,
+        "cost": 0,
+        "api_key": None,
+        "key_required": False,
+        "depends_on": []
+    },
+    "haveibeenpwned": {
+        "provider": HIBPProvider,
+        "entity_types": ["email"],
+        "capabilities": ["breaches"],
+        "latency": 2.0,
+        "cost": 1,
+        "api_key": "hibp",
+        "key_required": True,
+        "depends_on": []
+    },
+    "hunter": {
+        "provider": HunterProvider,
+        "entity_types": ["email", "domain"],
+        "capabilities": ["email_verification", "email_discovery"],
+        "latency": 3.0,
+        "cost": 1,
+        "api_key": "hunter",
+        "key_required": True,
+        "depends_on": []
+    },
+    "shodan": {
+        "provider": ShodanProvider,
+        "entity_types": ["ip"],
+        "capabilities": ["ports", "vulnerabilities"],
+        "latency": 3.0,
+        "cost": 1,
+        "api_key": "shodan",
+        "key_required": True,
+        "depends_on": []
+    },
+    "virustotal": {
+        "provider": VirusTotalProvider,
+        "entity_types": ["domain", "ip"],
+        "capabilities": ["reputation"],
+        "latency": 3.0,
+        "cost": 1,
+        "api_key": "virustotal",
+        "key_required": True,
+        "depends_on": []
+    },
+    # Without a key it searches existing public scans instead of submitting one
+    "urlscan": {
+        "provider": URLScanProvider,
+        "entity_types": ["domain"],
+        "capabilities": ["technologies"],
+        "latency": 5.0,
+        "cost": 1,
+        "api_key": "urlscan",
+        "key_required": False,
+        "depends_on": []
+    },
+    # Works without a key, but unauthenticated OTX calls are rate-limited
+    "alienvault": {
+        "provider": AlienVaultProvider,
+        "entity_types": ["domain", "ip"],
+        "capabilities": ["threat_intel", "reputation"],
+        "latency": 4.0,
+        "cost": 1,
+        "api_key": "alienvault",
+        "key_required": False,
+        "depends_on": []
+    },
+}
@@ -2,6 +2,7 @@ from app.providers.base import BaseProvider
 from typing import Dict, Any
 import whois
 import logging
+import time
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -20,7 +21,10 @@ class WHOISProvider(BaseProvider):
             return {"success": False, "error": "WHOIS only supports domain lookups"}
         
         try:
+            # Blocking and not interruptible; only its latency is recorded
+            started = time.monotonic()
             w = whois.whois(query)
+            self._record_request(time.monotonic() - started)
             
             # Extract dates
             creation_date = w.creation_date
@@ -0,0 +1,6 @@
+import redis
+from app.config import settings
+
+# Shared by the API and workers for short-lived coordination state; the
+# connection is opened lazily on first use
+redis_client = redis.Redis.from_url(settings.redis_url, decode_responses=True)
@@ -0,0 +1,131 @@
+"""
+Admission Control
+Per-client token buckets and a queue-depth limit in front of the enrichment queue
+"""
+from app.config import settings
+from app.celery_app import LOOKUP_QUEUE
+from app.redis_client import redis_client
+from app.services.scheduler import job_scheduler
+from typing import Dict, Any
+import math
+import time
+import redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Refill the bucket for the time elapsed since the last request, then try
+# to take one token. Returns {admitted, seconds until a token is available}.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local admitted = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    admitted = 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {admitted, tostring(wait)}
+"""
+
+DURATION_KEY = "lookup:duration_ewma"
+DURATION_SMOOTHING = 0.2
+
+
+class AdmissionController:
+    """Decide whether a lookup may be queued, and how long it is likely to wait"""
+    
+    BUCKET_PREFIX = "ratelimit:lookup:"
+    
+    def __init__(self, client):
+        self.client = client
+        self._take_token = client.register_script(TOKEN_BUCKET_SCRIPT)
+    
+    def admit(self, client_id: str) -> Dict[str, Any]:
+        """
+        Check the client's token bucket and the enrichment queue depth
+        
+        The queue is checked first so that rejected requests do not spend
+        tokens. If Redis is unavailable, every request is admitted.
+        
+        Returns:
+            {
+                "admitted": bool,
+                "reason": None | "rate_limited" | "queue_full",
+                "retry_after": seconds (int, 0 when admitted),
+                "queue_depth": int,
+                "estimated_wait_seconds": float
+            }
+        """
+        try:
+            queue_depth = self.queue_depth()
+            estimated_wait = self.estimated_wait(queue_depth)
+            decision = {
+                "admitted": True,
+                "reason": None,
+                "retry_after": 0,
+                "queue_depth": queue_depth,
+                "estimated_wait_seconds": estimated_wait
+            }
+            
+            if queue_depth >= settings.lookup_max_queue_depth:
+                # Roughly the time for the backlog to drain back under the limit
+                excess = queue_depth - settings.lookup_max_queue_depth + 1
+                decision.update(
+                    admitted=False,
+                    reason="queue_full",
+                    retry_after=max(1, math.ceil(self.estimated_wait(excess)))
+                )
+                return decision
+            
+            admitted, wait = self._take_token(
+                keys=[self.BUCKET_PREFIX + client_id],
+                args=[settings.lookup_rate_per_minute / 60, settings.lookup_burst, time.time()]
+            )
+            if not admitted:
+                decision.update(admitted=False, reason="rate_limited", retry_after=max(1, math.ceil(float(wait))))
+            return decision
+        
+        except redis.RedisError as e:
+            logger.warning(f"Admission control unavailable, admitting lookup: {e}")
+            return {
+                "admitted": True,
+                "reason": None,
+                "retry_after": 0,
+                "queue_depth": 0,
+                "estimated_wait_seconds": 0.0
+            }
+    
+    def queue_depth(self) -> int:
+        """Jobs not yet picked up by a worker: held by the scheduler or in the Celery queue"""
+        return job_scheduler.pending_count() + self.client.llen(LOOKUP_QUEUE)
+    
+    def estimated_wait(self, queue_depth: int) -> float:
+        """Seconds until a newly queued lookup starts, from the average job duration"""
+        duration = float(self.client.get(DURATION_KEY) or settings.lookup_default_duration_seconds)
+        return round(queue_depth / settings.lookup_worker_slots * duration, 1)
+    
+    def record_duration(self, seconds: float):
+        """Fold a finished job's run time into the moving average used for estimates"""
+        try:
+            previous = self.client.get(DURATION_KEY)
+            average = seconds if previous is None else (
+                DURATION_SMOOTHING * seconds + (1 - DURATION_SMOOTHING) * float(previous)
+            )
+            self.client.set(DURATION_KEY, round(average, 3))
+        except redis.RedisError as e:
+            logger.warning(f"Failed to record lookup duration: {e}")
+
+
+# Global instance
+admission_controller = AdmissionController(redis_client)
@@ -0,0 +1,47 @@
+"""
+Job Cancellation
+Redis flags that running enrichment tasks poll to stop cooperatively
+"""
+from app.config import settings
+from app.redis_client import redis_client
+import redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    """Raised inside a worker once its job has been cancelled"""
+
+
+class CancellationRegistry:
+    """Cancel requests by job ID, kept long enough for any running attempt to see them"""
+    
+    PREFIX = "cancel:"
+    
+    def __init__(self, client):
+        self.client = client
+    
+    def request(self, job_id: str):
+        """Ask the worker running a job (now or later) to stop"""
+        self.client.set(self.PREFIX + job_id, "1", ex=settings.job_cancel_ttl_seconds)
+    
+    def is_cancelled(self, job_id: str) -> bool:
+        """Whether a job has been cancelled; jobs keep running if Redis is unavailable"""
+        try:
+            return bool(self.client.exists(self.PREFIX + job_id))
+        except redis.RedisError as e:
+            logger.warning(f"Could not check cancellation of job {job_id}: {e}")
+            return False
+    
+    def check(self, job_id: str):
+        """
+        Raises:
+            JobCancelled: if the job has been cancelled
+        """
+        if self.is_cancelled(job_id):
+            raise JobCancelled(job_id)
+
+
+# Global instance
+cancellation = CancellationRegistry(redis_client)
@@ -0,0 +1,148 @@
+"""
+Case Statistics
+Per-case counters kept on the Case node and updated incrementally
+"""
+from typing import Dict, Any, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+RISK_LEVELS = ["HIGH", "MEDIUM", "LOW"]
+ENTITY_COUNTERS = {"Email": "stat_emails", "Domain": "stat_domains", "IP": "stat_ips"}
+
+
+def version_bump(case: str = "c", when: Optional[str] = None) -> str:
+    """
+    SET assignment marking a case's reportable content as changed, or only
+    when the Cypher condition `when` holds
+    """
+    step = f"CASE WHEN {when} THEN 1 ELSE 0 END" if when else "1"
+    return f"{case}.content_version = coalesce({case}.content_version, 0) + {step}"
+
+
+def membership_update(sign: int, case: str = "c", entity: str = "e") -> str:
+    """
+    SET assignments that add (sign=1) or remove (sign=-1) one entity's
+    contribution to its case counters, for use after SET or ON CREATE SET
+    """
+    assignments = [
+        version_bump(case),
+        f"{case}.stat_entities = coalesce({case}.stat_entities, 0) + {sign}"
+    ]
+    for label, field in ENTITY_COUNTERS.items():
+        assignments.append(
+            f"{case}.{field} = coalesce({case}.{field}, 0) "
+            f"+ CASE WHEN {entity}:{label} THEN {sign} ELSE 0 END"
+        )
+    for level in RISK_LEVELS:
+        field = f"stat_risk_{level.lower()}"
+        assignments.append(
+            f"{case}.{field} = coalesce({case}.{field}, 0) "
+            f"+ CASE WHEN {entity}.risk_level = '{level}' THEN {sign} ELSE 0 END"
+        )
+    assignments.append(
+        f"{case}.stat_risk_sum = coalesce({case}.stat_risk_sum, 0) "
+        f"+ {sign} * coalesce({entity}.risk_score, 0)"
+    )
+    assignments.append(
+        f"{case}.stat_risk_scored = coalesce({case}.stat_risk_scored, 0) "
+        f"+ CASE WHEN {entity}.risk_score IS NULL THEN 0 ELSE {sign} END"
+    )
+    return ",\n    ".join(assignments)
+
+
+def risk_update(case: str = "c", source: str = "$") -> str:
+    """
+    SET assignments that move one entity from its old risk (old_score,
+    old_level) to its new risk (score, level) in a case's counters
+
+    The values are read from query parameters by default; pass e.g.
+    source="row." to read them from an UNWIND row instead. The case version
+    only moves when the score or level changed, so rescoring that lands on
+    the same risk leaves case caches valid.
+    """
+    score, level = f"{source}score", f"{source}level"
+    old_score, old_level = f"{source}old_score", f"{source}old_level"
+    changed = (
+        f"coalesce({score}, -1) <> coalesce({old_score}, -1) "
+        f"OR coalesce({level}, '') <> coalesce({old_level}, '')"
+    )
+    assignments = [version_bump(case, when=changed)]
+    for risk_level in RISK_LEVELS:
+        field = f"stat_risk_{risk_level.lower()}"
+        assignments.append(
+            f"{case}.{field} = coalesce({case}.{field}, 0) "
+            f"+ CASE WHEN {level} = '{risk_level}' THEN 1 ELSE 0 END "
+            f"- CASE WHEN {old_level} = '{risk_level}' THEN 1 ELSE 0 END"
+        )
+    assignments.append(
+        f"{case}.stat_risk_sum = coalesce({case}.stat_risk_sum, 0) "
+        f"+ coalesce({score}, 0) - coalesce({old_score}, 0)"
+    )
+    assignments.append(
+        f"{case}.stat_risk_scored = coalesce({case}.stat_risk_scored, 0) "
+        f"+ CASE WHEN {score} IS NULL THEN 0 ELSE 1 END "
+        f"- CASE WHEN {old_score} IS NULL THEN 0 ELSE 1 END"
+    )
+    return ",\n    ".join(assignments)
+
+
+class CaseStats:
+    """Read and repair the counters stored on Case nodes"""
+
+    def recompute(self, session, case_id: Optional[str] = None, force: bool = False) -> int:
+        """
+        Rebuild counters from the graph
+
+        Only cases that have never been counted are rebuilt unless force is
+        set, so this is cheap to call before reading counters.
+        """
+        query = """
+            MATCH (c:Case)
+            WHERE ($case_id IS NULL OR c.id = $case_id) AND ($force OR c.stats_ready IS NULL)
+            OPTIONAL MATCH (c)-[:CONTAINS]->(e)
+            WITH c, collect(DISTINCT e) as entities
+            OPTIONAL MATCH (c)-[:HAS_JOB]->(j:ScanJob)
+            WITH c, entities, count(DISTINCT j) as job_count
+            SET c.stat_entities = size(entities),
+                c.stat_emails = size([e IN entities WHERE e:Email]),
+                c.stat_domains = size([e IN entities WHERE e:Domain]),
+                c.stat_ips = size([e IN entities WHERE e:IP]),
+                c.stat_risk_high = size([e IN entities WHERE e.risk_level = 'HIGH']),
+                c.stat_risk_medium = size([e IN entities WHERE e.risk_level = 'MEDIUM']),
+                c.stat_risk_low = size([e IN entities WHERE e.risk_level = 'LOW']),
+                c.stat_risk_sum = reduce(total = 0, e IN entities | total + coalesce(e.risk_score, 0)),
+                c.stat_risk_scored = size([e IN entities WHERE e.risk_score IS NOT NULL]),
+                c.stat_jobs = job_count,
+                c.stats_ready = true,
+                c.content_version = coalesce(c.content_version, 0) + 1
+            RETURN count(c) as rebuilt
+        """
+        rebuilt = session.run(query, case_id=case_id, force=force).single()["rebuilt"]
+        if rebuilt:
+            logger.info(f"Rebuilt statistics for {rebuilt} case(s)")
+        return rebuilt
+
+    def summary(self, case_node) -> Dict[str, Any]:
+        """Statistics payload for a Case node, read straight from its counters"""
+        scored = case_node.get("stat_risk_scored") or 0
+        risk_sum = case_node.get("stat_risk_sum") or 0
+        return {
+            "total_entities": case_node.get("stat_entities") or 0,
+            "entity_breakdown": {
+                "emails": case_node.get("stat_emails") or 0,
+                "domains": case_node.get("stat_domains") or 0,
+                "ips": case_node.get("stat_ips") or 0
+            },
+            "risk_breakdown": {
+                "high": case_node.get("stat_risk_high") or 0,
+                "medium": case_node.get("stat_risk_medium") or 0,
+                "low": case_node.get("stat_risk_low") or 0
+            },
+            "average_risk_score": round(risk_sum / scored, 2) if scored else 0
+        }
+
+
+# Global instance
+case_stats = CaseStats()
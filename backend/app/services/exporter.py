@@ -0,0 +1,234 @@
+"""
+Bulk Exporter
+Streams case and job contents as NDJSON, CSV or a STIX 2.1 bundle in constant memory
+"""
+from app.database import primary_label, ENRICHMENT_RELATIONSHIPS, ENTITY_ID_FIELDS
+from typing import Dict, Any, Iterator, Optional
+from datetime import datetime, timezone
+import csv
+import io
+import ipaddress
+import json
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "stix": "application/stix+json;version=2.1",
+}
+
+CSV_COLUMNS = ["type", "value", "key", "risk_score", "risk_level", "first_seen", "last_updated", "tags"]
+
+# Namespace for deterministic STIX cyber-observable IDs (STIX 2.1 section 2.9)
+STIX_NAMESPACE = uuid.UUID("00abedb4-aa42-466c-9c01-fed23315a9b7")
+STIX_OBSERVABLES = {"email-addr", "domain-name", "ipv4-addr", "ipv6-addr"}
+
+_RELS = "|".join(ENRICHMENT_RELATIONSHIPS)
+
+# Scope -> (entity query, relationship query); both take $scope_id
+SCOPES = {
+    "case": (
+        "MATCH (:Case {id: $scope_id})-[:CONTAINS]->(e:Entity) RETURN e",
+        f"""
+        MATCH (c:Case {{id: $scope_id}})-[:CONTAINS]->(a:Entity)-[r:{_RELS}]->(b:Entity)
+        WHERE (c)-[:CONTAINS]->(b)
+        RETURN a, type(r) as rel_type, b
+        """,
+    ),
+    "job": (
+        f"""
+        CALL {{
+            MATCH (:ScanJob {{id: $scope_id}})-[:SCANNED]->(e:Entity) RETURN e
+            UNION
+            MATCH (:ScanJob {{id: $scope_id}})-[:SCANNED]->(:Entity)-[:{_RELS}]-(e:Entity) RETURN e
+        }}
+        RETURN e
+        """,
+        f"""
+        MATCH (:ScanJob {{id: $scope_id}})-[:SCANNED]->(:Entity)-[r:{_RELS}]-(:Entity)
+        WITH DISTINCT r
+        RETURN startNode(r) as a, type(r) as rel_type, endNode(r) as b
+        """,
+    ),
+}
+
+
+def _entity_value(node) -> Optional[str]:
+    return node.get(ENTITY_ID_FIELDS.get(primary_label(node), "name"))
+
+
+class Exporter:
+    """Serialize graph contents row by row as Neo4j streams them"""
+
+    BATCH_SIZE = 1000
+
+    def stream(self, driver, scope: str, scope_id: str, fmt: str) -> Iterator[str]:
+        """
+        Yield the export document in chunks
+
+        Records are pulled from Neo4j BATCH_SIZE at a time, so memory use does
+        not grow with the number of exported entities.
+        """
+        entity_query, relationship_query = SCOPES[scope]
+        writer = getattr(self, f"_write_{fmt}")
+
+        with driver.session(fetch_size=self.BATCH_SIZE) as session:
+            # Queries only start when the writer reaches them, so the entity
+            # result is fully streamed before the relationship query runs
+            def entities():
+                for record in session.run(entity_query, scope_id=scope_id):
+                    yield record["e"]
+
+            def relationships():
+                for record in session.run(relationship_query, scope_id=scope_id):
+                    yield record["a"], record["rel_type"], record["b"]
+
+            yield from writer(entities(), relationships())
+
+    # ---- NDJSON ----
+
+    def _write_ndjson(self, entities, relationships) -> Iterator[str]:
+        for node in entities:
+            yield json.dumps({
+                "type": "entity",
+                "label": primary_label(node),
+                "key": node.get("key"),
+                "properties": dict(node)
+            }, default=str) + "\n"
+
+        for start, rel_type, end in relationships:
+            yield json.dumps({
+                "type": "relationship",
+                "relationship": rel_type,
+                "source": start.get("key"),
+                "target": end.get("key")
+            }) + "\n"
+
+    # ---- CSV ----
+
+    def _write_csv(self, entities, relationships) -> Iterator[str]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        def flush() -> str:
+            chunk = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            return chunk
+
+        writer.writerow(CSV_COLUMNS)
+        yield flush()
+
+        # CSV is a flat entity list; relationships are only in NDJSON and STIX
+        for node in entities:
+            writer.writerow([
+                primary_label(node),
+                _entity_value(node),
+                node.get("key"),
+                node.get("risk_score"),
+                node.get("risk_level"),
+                node.get("first_seen"),
+                node.get("last_updated"),
+                ";".join(node.get("tags") or [])
+            ])
+            yield flush()
+
+    # ---- STIX 2.1 ----
+
+    def _write_stix(self, entities, relationships) -> Iterator[str]:
+        now = datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+        yield f'{{"type": "bundle", "id": "bundle--{uuid.uuid4()}", "objects": ['
+
+        first = True
+        for node in entities:
+            stix_object = self._stix_object(node, now)
+            if stix_object:
+                yield ("" if first else ",") + json.dumps(stix_object)
+                first = False
+
+        for start, rel_type, end in relationships:
+            source_ref = self._stix_id(start)
+            target_ref = self._stix_id(end)
+            if not source_ref or not target_ref:
+                continue
+            relationship_type = rel_type.lower().replace("_", "-")
+            yield ("" if first else ",") + json.dumps({
+                "type": "relationship",
+                "spec_version": "2.1",
+                "id": f"relationship--{uuid.uuid5(STIX_NAMESPACE, f'{source_ref}|{relationship_type}|{target_ref}')}",
+                "created": now,
+                "modified": now,
+                "relationship_type": relationship_type,
+                "source_ref": source_ref,
+                "target_ref": target_ref
+            })
+            first = False
+
+        yield "]}"
+
+    def _stix_type(self, node) -> Optional[str]:
+        label = primary_label(node)
+        if label == "Email":
+            return "email-addr"
+        if label == "Domain":
+            return "domain-name"
+        if label == "IP":
+            try:
+                version = ipaddress.ip_address(node.get("address")).version
+            except ValueError:
+                return None
+            return "ipv4-addr" if version == 4 else "ipv6-addr"
+        if label == "Organization":
+            return "identity"
+        if label == "Breach":
+            return "incident"
+        return None
+
+    def _stix_id(self, node) -> Optional[str]:
+        """Deterministic STIX ID, so the same entity keeps its ID across exports"""
+        stix_type = self._stix_type(node)
+        value = _entity_value(node)
+        if not stix_type or value is None:
+            return None
+        # Observables use the spec's ID-contributing property; SDOs reuse the same scheme
+        contributing = json.dumps(
+            {"value": value} if stix_type in STIX_OBSERVABLES else {"name": value},
+            sort_keys=True,
+            separators=(",", ":")
+        )
+        return f"{stix_type}--{uuid.uuid5(STIX_NAMESPACE, contributing)}"
+
+    def _stix_object(self, node, now: str) -> Optional[Dict[str, Any]]:
+        stix_id = self._stix_id(node)
+        if not stix_id:
+            return None
+
+        stix_type = stix_id.split("--", 1)[0]
+        value = _entity_value(node)
+        stix_object = {"type": stix_type, "spec_version": "2.1", "id": stix_id}
+
+        if stix_type == "identity":
+            stix_object.update(created=now, modified=now, name=value, identity_class="organization")
+        elif stix_type == "incident":
+            stix_object.update(created=now, modified=now, name=value)
+            if node.get("title"):
+                stix_object["description"] = node["title"]
+        else:
+            stix_object["value"] = value
+
+        # Risk scoring travels as custom properties
+        if node.get("risk_score") is not None:
+            stix_object["x_osint_risk_score"] = node["risk_score"]
+            stix_object["x_osint_risk_level"] = node.get("risk_level")
+        if node.get("tags"):
+            stix_object["x_osint_tags"] = list(node["tags"])
+
+        return stix_object
+
+
+# Global instance
+exporter = Exporter()
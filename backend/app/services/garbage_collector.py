@@ -0,0 +1,156 @@
+"""
+Garbage Collector
+Reclaims entity nodes that no scan job, case or note references any more
+"""
+from app.database import ENRICHMENT_RELATIONSHIPS
+from typing import Dict, Any, List, Optional
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# An entity is live if a job scanned it, a case contains it, a watchlist
+# watches it, it carries a note, or it is an enrichment neighbour of such an
+# anchored entity
+ORPHAN_PREDICATE = f"""
+    NOT EXISTS {{ (e)<-[:SCANNED|CONTAINS|WATCHES]-() }}
+    AND NOT EXISTS {{ (e)-[:HAS_NOTE]->() }}
+    AND NOT EXISTS {{
+        MATCH (e)-[:{'|'.join(ENRICHMENT_RELATIONSHIPS)}]-(a)
+        WHERE EXISTS {{ (a)<-[:SCANNED|CONTAINS|WATCHES]-() }} OR EXISTS {{ (a)-[:HAS_NOTE]->() }}
+    }}
+"""
+
+
+class GarbageCollector:
+    """Find and delete orphaned entities in chunked transactions"""
+
+    SAMPLE_SIZE = 20
+
+    def delete_node(self, session, match: str, params: Dict[str, Any], batch_size: int = 1000) -> int:
+        """
+        Delete a node and its relationships without one large transaction
+
+        Relationships are removed in chunks first so that nodes with many
+        connections (large jobs, big cases) never need a single huge commit.
+        Outgoing and incoming ones are deleted in turn, so a self-loop is
+        matched (and deleted) once.
+        """
+        for pattern in ("(n)-[r]->()", "(n)<-[r]-()"):
+            session.run(
+                f"""
+                {match}
+                MATCH {pattern}
+                CALL {{ WITH r DELETE r }} IN TRANSACTIONS OF $batch_size ROWS
+                """,
+                batch_size=batch_size,
+                **params
+            )
+        result = session.run(f"{match} DETACH DELETE n RETURN count(n) as deleted", **params)
+        return result.single()["deleted"]
+
+    def candidates(self, session, match: str, params: Dict[str, Any]) -> List[str]:
+        """
+        Keys of the entities anchored by a job or case, plus their enrichment
+        neighbours: the only nodes that can become orphans when it is deleted
+        """
+        result = session.run(
+            f"""
+            {match}
+            OPTIONAL MATCH (root)-[:{'|'.join(ENRICHMENT_RELATIONSHIPS)}]-(neighbour:Entity)
+            RETURN collect(DISTINCT root.key) + collect(DISTINCT neighbour.key) as keys
+            """,
+            **params
+        )
+        record = result.single()
+        return sorted(set(record["keys"])) if record else []
+
+    def collect(self, session, candidate_keys: Optional[List[str]] = None,
+                dry_run: bool = False, batch_size: int = 1000) -> Dict[str, Any]:
+        """
+        Reclaim orphaned entities
+
+        With candidate_keys only those entities are checked (used right after
+        a job or case is deleted); otherwise every entity is swept.
+
+        Returns:
+            {
+                "dry_run": bool,
+                "orphans": int,
+                "deleted": int,
+                "hubs_deleted": int,
+                "sample": [key, ...],
+                "elapsed_seconds": float,
+                "nodes_per_second": float
+            }
+        """
+        started = time.monotonic()
+
+        if candidate_keys is not None:
+            source = "UNWIND $keys AS key MATCH (e:Entity {key: key})"
+        else:
+            source = "MATCH (e:Entity)"
+        params = {"keys": candidate_keys or [], "batch_size": batch_size}
+
+        record = session.run(
+            f"""
+            {source}
+            WHERE {ORPHAN_PREDICATE}
+            RETURN count(e) as orphans, collect(e.key)[..{self.SAMPLE_SIZE}] as sample
+            """,
+            **params
+        ).single()
+        stats = {
+            "dry_run": dry_run,
+            "orphans": record["orphans"],
+            "deleted": 0,
+            "hubs_deleted": 0,
+            "sample": record["sample"]
+        }
+
+        if not dry_run and stats["orphans"]:
+            # Hub counters are kept in step with the members being removed
+            result = session.run(
+                f"""
+                {source}
+                WHERE {ORPHAN_PREDICATE}
+                CALL {{
+                    WITH e
+                    OPTIONAL MATCH (e)-[:MEMBER_OF]->(h:InfraHub)
+                    SET h.member_count = h.member_count - 1,
+                        h.top_members = [k IN h.top_members WHERE k <> e.key]
+                    WITH DISTINCT e
+                    DETACH DELETE e
+                }} IN TRANSACTIONS OF $batch_size ROWS
+                RETURN count(*) as deleted
+                """,
+                **params
+            )
+            stats["deleted"] = result.single()["deleted"]
+
+            result = session.run(
+                """
+                MATCH (h:InfraHub)
+                WHERE h.member_count <= 0
+                CALL { WITH h DETACH DELETE h } IN TRANSACTIONS OF $batch_size ROWS
+                RETURN count(*) as deleted
+                """,
+                batch_size=batch_size
+            )
+            stats["hubs_deleted"] = result.single()["deleted"]
+
+        elapsed = time.monotonic() - started
+        processed = stats["orphans"] if dry_run else stats["deleted"]
+        stats["elapsed_seconds"] = round(elapsed, 3)
+        stats["nodes_per_second"] = round(processed / elapsed, 1) if elapsed > 0 else 0.0
+
+        logger.info(
+            f"GC {'dry run' if dry_run else 'run'}: {stats['orphans']} orphan(s), "
+            f"{stats['deleted']} deleted in {stats['elapsed_seconds']}s"
+        )
+        return stats
+
+
+# Global instance
+garbage_collector = GarbageCollector()
@@ -0,0 +1,98 @@
+"""
+In-flight Lookups
+Short-lived Redis index of pending/running jobs by normalized query, used to deduplicate lookups
+"""
+from app.config import settings
+from app.redis_client import redis_client
+from typing import Optional
+import redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Delete the claim only if it still belongs to the finishing job
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Extend the claim only if it still belongs to the job
+REFRESH_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class InflightIndex:
+    """Maps (entity type, normalized query) to the job currently enriching it"""
+    
+    PREFIX = "inflight:"
+    
+    def __init__(self, client):
+        self.client = client
+        self._release = client.register_script(RELEASE_SCRIPT)
+        self._refresh = client.register_script(REFRESH_SCRIPT)
+    
+    def key(self, entity_type: str, query: str) -> str:
+        """Index key; queries are case-insensitive for every entity type"""
+        return f"{self.PREFIX}{entity_type}:{query.strip().lower()}"
+    
+    def claim(self, entity_type: str, query: str, job_id: str) -> Optional[str]:
+        """
+        Register job_id as the in-flight job for a query
+        
+        Claims expire after `lookup_dedup_ttl_seconds`, so a worker that dies
+        without releasing cannot block the query for long; the job renews
+        its claim while it is queued, running or waiting to retry (see
+        refresh). If Redis is unavailable, lookups are not deduplicated.
+        
+        Returns:
+            None if the claim was taken, else the ID of the job already holding it
+        """
+        key = self.key(entity_type, query)
+        try:
+            if self.client.set(key, job_id, nx=True, ex=settings.lookup_dedup_ttl_seconds):
+                return None
+            holder = self.client.get(key)
+        except redis.RedisError as e:
+            logger.warning(f"In-flight index unavailable, not deduplicating {query}: {e}")
+            return None
+        
+        # The holder finished between SET and GET; take the free slot
+        if holder is None:
+            return self.claim(entity_type, query, job_id)
+        return holder
+    
+    def replace(self, entity_type: str, query: str, job_id: str):
+        """Take over a claim whose holder is no longer pending or running"""
+        try:
+            self.client.set(self.key(entity_type, query), job_id, ex=settings.lookup_dedup_ttl_seconds)
+        except redis.RedisError as e:
+            logger.warning(f"In-flight index unavailable: {e}")
+    
+    def refresh(self, entity_type: str, query: str, job_id: str, wait_seconds: float = 0):
+        """
+        Keep a job's claim alive for another `lookup_dedup_ttl_seconds`, plus
+        however long the job is about to wait (in the queue or for a retry)
+        """
+        ttl = settings.lookup_dedup_ttl_seconds + int(wait_seconds or 0)
+        try:
+            self._refresh(keys=[self.key(entity_type, query)], args=[job_id, ttl])
+        except redis.RedisError as e:
+            logger.warning(f"Failed to refresh in-flight claim for {query}: {e}")
+    
+    def release(self, entity_type: str, query: str, job_id: str):
+        """Drop the claim once a job has finished, unless another job has taken it over"""
+        try:
+            self._release(keys=[self.key(entity_type, query)], args=[job_id])
+        except redis.RedisError as e:
+            logger.warning(f"Failed to release in-flight claim for {query}: {e}")
+
+
+# Global instance
+inflight_index = InflightIndex(redis_client)
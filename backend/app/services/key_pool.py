@@ -0,0 +1,233 @@
+"""
+API Key Pool
+Spreads provider calls across several API keys by remaining quota, with cool-down after quota errors
+"""
+from app.config import settings
+from app.redis_client import redis_client
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+import hashlib
+import redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Provider name -> the single-key setting that also belongs to its pool
+SETTINGS_KEYS = {
+    "haveibeenpwned": "hibp_api_key",
+    "hunter": "hunter_api_key",
+    "shodan": "shodan_api_key",
+    "virustotal": "virustotal_api_key",
+    "urlscan": "urlscan_api_key",
+    "alienvault": "alienvault_api_key",
+    "leakcheck": "leakcheck_api_key",
+}
+
+USED_KEY = "keypool:{provider}:{key_id}:used:{day}"
+COOLDOWN_KEY = "keypool:{provider}:{key_id}:cooldown"
+
+# Ranks keys without a configured quota by usage alone
+UNLIMITED = 10 ** 9
+
+
+def _key_id(api_key: str) -> str:
+    """Stable identifier for a key that does not reveal it"""
+    return hashlib.sha1(api_key.encode()).hexdigest()[:12]
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y%m%d")
+
+
+def _seconds_until_midnight() -> int:
+    now = datetime.now(timezone.utc)
+    return 86400 - (now.hour * 3600 + now.minute * 60 + now.second)
+
+
+class KeyPool:
+    """
+    Chooses which of a provider's API keys to use for each call
+
+    Pools are `provider_api_keys` plus the provider's single-key setting.
+    Daily usage per key is counted in Redis (reset at midnight UTC) and the
+    key with the most quota left today (`provider_key_daily_quota`) is
+    picked; keys with none left are not used again until the reset. Keys
+    that hit a rate limit cool down for the Retry-After period, or
+    `key_cooldown_seconds`, and are skipped meanwhile.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def keys(self, provider: str) -> List[str]:
+        """All configured keys for a provider"""
+        pool = list(settings.provider_api_keys.get(provider, []))
+        single = getattr(settings, SETTINGS_KEYS.get(provider, ""), None)
+        if single and single not in pool:
+            pool.insert(0, single)
+        return pool
+
+    def acquire(self, provider: str, request_key: Optional[str] = None,
+                exclude: Optional[List[str]] = None, ready_only: bool = False) -> Optional[str]:
+        """
+        Key to use for a call to a provider that is about to go out
+
+        A key supplied with the request is always used as-is. Otherwise the
+        pooled key with the most remaining quota that is not cooling down
+        is chosen and its usage counted; if every key with quota left is
+        cooling down, the one that recovers first is returned so the call
+        can still be tried, unless ready_only is set. Returns None, without
+        counting a use, once every pooled key has used up its daily quota
+        (or, with ready_only, when every key with quota left is cooling down).
+        """
+        if request_key:
+            return request_key
+        pool = [key for key in self.keys(provider) if key not in (exclude or [])]
+        if not pool:
+            return None
+
+        try:
+            chosen = self._choose(provider, pool, ready_only)
+            if not chosen:
+                if not ready_only:
+                    logger.warning(f"Every {provider} key has used up its daily quota")
+                return None
+
+            used_key = USED_KEY.format(provider=provider, key_id=chosen["id"], day=_today())
+            pipe = self.client.pipeline()
+            pipe.incr(used_key)
+            pipe.expire(used_key, 2 * 86400)
+            pipe.execute()
+            return chosen["key"]
+        except redis.RedisError as e:
+            logger.warning(f"Key pool unavailable for {provider}, using its first key: {e}")
+            return pool[0]
+
+    def peek(self, provider: str, request_key: Optional[str] = None) -> Optional[str]:
+        """
+        Key acquire() would choose right now, without counting a use
+
+        Lets providers be set up before it is known whether they will be
+        called at all.
+        """
+        if request_key:
+            return request_key
+        pool = self.keys(provider)
+        if not pool:
+            return None
+        try:
+            chosen = self._choose(provider, pool)
+            return chosen["key"] if chosen else None
+        except redis.RedisError:
+            return pool[0]
+
+    def checkout(self, provider) -> bool:
+        """
+        Give a provider the pooled key to use for the call it is about to make
+
+        A key supplied with the request (or no key) is left alone.
+
+        Returns:
+            False if the provider holds a pooled key but every pooled key
+            has used up its quota; its key is then cleared
+        """
+        if not provider.api_key or provider.api_key not in self.keys(provider.name):
+            return True
+        provider.api_key = self.acquire(provider.name)
+        return provider.api_key is not None
+
+    def rotate(self, provider, result: Dict[str, Any]) -> bool:
+        """
+        After a rate-limited call, cool the provider's key down and swap in another
+
+        Only pooled keys are rotated; a key supplied with the request is not.
+
+        Returns:
+            True if the provider now holds a different key worth trying
+        """
+        current = provider.api_key
+        if not current or current not in self.keys(provider.name):
+            return False
+
+        self.cool_down(provider.name, current, result.get("retry_after"))
+        # Cooling keys are passed over before a use is counted, so rotating
+        # never spends quota on a call that is not made
+        replacement = self.acquire(provider.name, exclude=[current], ready_only=True)
+        if not replacement:
+            return False
+
+        logger.info(f"Rotating {provider.name} to key ...{replacement[-4:]} after a rate limit")
+        provider.api_key = replacement
+        return True
+
+    def cool_down(self, provider: str, api_key: str, retry_after: Optional[float] = None):
+        """Take a key out of rotation, at most until midnight UTC when daily quotas reset"""
+        seconds = retry_after or settings.key_cooldown_seconds
+        seconds = min(int(seconds) + 1, _seconds_until_midnight())
+        try:
+            self.client.set(COOLDOWN_KEY.format(provider=provider, key_id=_key_id(api_key)), "1", ex=seconds)
+        except redis.RedisError as e:
+            logger.warning(f"Failed to cool down {provider} key: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Usage, remaining quota and cool-down of every pooled key"""
+        pools = {}
+        for provider in sorted(set(SETTINGS_KEYS) | set(settings.provider_api_keys)):
+            pool = self.keys(provider)
+            if not pool:
+                continue
+            pools[provider] = [
+                {
+                    "key": f"...{entry['key'][-4:]}",
+                    "used_today": entry["used"],
+                    "remaining_today": entry["remaining"],
+                    "cooldown_seconds": entry["cooldown"]
+                }
+                for entry in self._state(provider, pool)
+            ]
+        return pools
+
+    def _state(self, provider: str, pool: List[str]) -> List[Dict[str, Any]]:
+        quota = settings.provider_key_daily_quota.get(provider)
+        day = _today()
+        pipe = self.client.pipeline()
+        for key in pool:
+            key_id = _key_id(key)
+            pipe.get(USED_KEY.format(provider=provider, key_id=key_id, day=day))
+            pipe.ttl(COOLDOWN_KEY.format(provider=provider, key_id=key_id))
+        replies = pipe.execute()
+
+        state = []
+        for i, key in enumerate(pool):
+            used, cooldown = int(replies[2 * i] or 0), replies[2 * i + 1]
+            state.append({
+                "key": key,
+                "id": _key_id(key),
+                "used": used,
+                "remaining": None if quota is None else quota - used,
+                "cooldown": max(cooldown, 0)
+            })
+        return state
+
+    def _choose(self, provider: str, pool: List[str], ready_only: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Ready key with the most headroom, else (unless ready_only) the first
+        to recover; never an exhausted one
+        """
+        state = [entry for entry in self._state(provider, pool)
+                 if entry["remaining"] is None or entry["remaining"] > 0]
+        ready = [entry for entry in state if not entry["cooldown"]]
+        if ready:
+            return max(ready, key=self._headroom)
+        if ready_only or not state:
+            return None
+        return min(state, key=lambda entry: entry["cooldown"])
+
+    def _headroom(self, entry: Dict[str, Any]) -> int:
+        """Remaining quota, or (without a configured quota) the least used key first"""
+        return entry["remaining"] if entry["remaining"] is not None else UNLIMITED - entry["used"]
+
+
+# Global instance
+key_pool = KeyPool(redis_client)
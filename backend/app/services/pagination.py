@@ -0,0 +1,31 @@
+"""
+Keyset Pagination
+Opaque cursor encoding shared by paginated endpoints
+"""
+from typing import Dict, Any
+import base64
+import json
+
+
+def encode_cursor(position: Dict[str, Any]) -> str:
+    """Encode the last-seen sort key of a page as an opaque, URL-safe cursor"""
+    raw = json.dumps(position, separators=(",", ":"), sort_keys=True).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """
+    Decode a cursor produced by encode_cursor
+
+    Raises:
+        ValueError: if the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+    if not isinstance(position, dict):
+        raise ValueError("Invalid cursor")
+    return position
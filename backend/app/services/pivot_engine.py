@@ -0,0 +1,398 @@
+"""
+Pivot Engine
+Bounded breadth-first expansion paged from a cached result, and co-occurrence hub lookups with keyset pagination
+"""
+from neo4j import Query
+from neo4j.exceptions import Neo4jError
+from app.config import settings
+from app.redis_client import redis_client
+from app.database import primary_label, entity_key, ENRICHMENT_RELATIONSHIPS, ENTITY_LABELS
+from app.services.pagination import encode_cursor, decode_cursor
+from typing import Dict, Any, List, Optional
+import hashlib
+import json
+import time
+import uuid
+import redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Pivot type -> target labels for traversal pivots, or the co-occurrence hub
+# kind (with the relationship it stands for) for infrastructure pivots
+PIVOTS = {
+    "related_domains": {"targets": ["Domain"]},
+    "related_ips": {"targets": ["IP"]},
+    "related_emails": {"targets": ["Email"]},
+    "hosted_by_same_ip": {"hub": "ip", "relationship": "RESOLVES_TO", "source": "domain"},
+    "same_registrar": {"hub": "registrar", "relationship": "REGISTERED_WITH", "source": "domain"},
+    "same_nameserver": {"hub": "nameserver", "relationship": "USES_NAMESERVER", "source": "domain"},
+    "same_asn": {"hub": "asn", "relationship": "HOSTED_BY", "source": "ip"},
+}
+
+# Ordered matches of one traversal, paged by later cursors
+EXPANSION_KEY = "pivot:expansion:{token}"
+
+
+class PivotEngine:
+    """Expand an entity's neighbourhood level by level within a time and row budget"""
+
+    MAX_PAGE_SIZE = 200
+
+    def pivot(self, session, entity_match: str, params: Dict[str, Any], entity_type: str,
+              pivot_type: str, depth: int = 1, relationships: Optional[List[str]] = None,
+              limit: int = 50, cursor: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Run a pivot from the entity bound by `entity_match`
+
+        Returns None if the entity does not exist, otherwise:
+            {
+                "entities": [{"id", "label", "properties", "relationship", "hops"}, ...],
+                "hubs": [{"kind", "value", "member_count", "top_members"}, ...],
+                "next_cursor": str | None,
+                "truncated": bool
+            }
+
+        Raises:
+            ValueError: for unknown pivots, relationship types or cursors
+        """
+        spec = PIVOTS.get(pivot_type)
+        if not spec:
+            raise ValueError("Invalid pivot type")
+        if spec.get("source") and spec["source"] != entity_type:
+            raise ValueError(f"This pivot only works for {spec['source']}s")
+
+        limit = max(1, min(limit, self.MAX_PAGE_SIZE))
+        after = decode_cursor(cursor) if cursor else None
+
+        if spec.get("hub"):
+            return self._hub_members(session, entity_match, params, spec, limit, after)
+
+        relationships = relationships or ENRICHMENT_RELATIONSHIPS
+        unknown = set(relationships) - set(ENRICHMENT_RELATIONSHIPS)
+        if unknown:
+            raise ValueError(f"Invalid relationship type(s): {', '.join(sorted(unknown))}")
+
+        depth = max(1, min(depth, settings.pivot_max_depth))
+        signature = hashlib.sha1(json.dumps(
+            [params, entity_type, pivot_type, depth, sorted(relationships)], sort_keys=True, default=str
+        ).encode()).hexdigest()[:12]
+
+        if after:
+            matches, offset, truncated, token = self._cached_page(after, signature, limit)
+        else:
+            start = session.run(
+                f"{entity_match} RETURN elementId(e) as id LIMIT 1", **params
+            ).single()
+            if not start:
+                return None
+
+            found, truncated = self._expand(session, start["id"], relationships, depth)
+
+            # Keyset order: nearest first, then canonical key
+            targets = set(spec["targets"])
+            matches = sorted(
+                (hit for hit in found if hit["label"] in targets),
+                key=lambda hit: (hit["hops"], hit["sort_key"])
+            )
+            offset, token = 0, None
+            if len(matches) > limit:
+                token = self._cache_expansion(matches)
+                if token is None:
+                    truncated = True
+            matches = matches[:limit + 1]
+
+        page = matches[:limit]
+        next_cursor = None
+        if len(matches) > limit and token:
+            next_cursor = encode_cursor({"x": token, "o": offset + limit, "s": signature, "t": truncated})
+
+        nodes = self._nodes(session, [hit["id"] for hit in page])
+        return {
+            "entities": [
+                {
+                    "id": hit["id"],
+                    "label": hit["label"],
+                    "properties": dict(nodes[hit["id"]]),
+                    "relationship": hit["rel_type"],
+                    "hops": hit["hops"]
+                }
+                for hit in page if hit["id"] in nodes
+            ],
+            "hubs": [],
+            "next_cursor": next_cursor,
+            "truncated": truncated
+        }
+
+    def hubs(self, session, entity_match: str, params: Dict[str, Any],
+             kind: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Co-occurrence hubs an entity belongs to, read from materialized counters
+
+        Returns None if the entity does not exist. `member_count` excludes the
+        entity itself, so it is the number of entities a pivot would return.
+        """
+        query = f"""
+            {entity_match}
+            OPTIONAL MATCH (e)-[:MEMBER_OF]->(h:InfraHub)
+            WHERE $kind IS NULL OR h.kind = $kind
+            RETURN e.key as key, collect(h) as hubs
+        """
+        record = session.run(query, kind=kind, **params).single()
+        if not record:
+            return None
+
+        return [
+            {
+                "kind": hub["kind"],
+                "value": hub["value"],
+                "member_count": max(hub["member_count"] - 1, 0),
+                "top_members": [k for k in hub["top_members"] if k != record["key"]]
+            }
+            for hub in sorted(record["hubs"], key=lambda h: (h["kind"], h["value"]))
+        ]
+
+    def _hub_members(self, session, entity_match: str, params: Dict[str, Any],
+                     spec: Dict[str, Any], limit: int, after: Optional[Dict[str, Any]]):
+        """
+        Page through the other members of an entity's co-occurrence hubs
+
+        Counts come from the hub nodes themselves, ordered by canonical key.
+        Small hubs are expanded and sorted; for hubs with at least
+        `pivot_hub_scan_min_members` members, the page is read by walking the
+        Entity key index from the cursor and keeping keys that belong to the
+        hubs. That walk reads at most `pivot_row_budget` keys per request, so
+        a sparse hub yields a short page with a cursor at the last key read
+        rather than a scan of the whole key range.
+        """
+        hubs = self.hubs(session, entity_match, params, spec["hub"])
+        if hubs is None:
+            return None
+
+        prefix = entity_key(ENTITY_LABELS[spec["source"]], "")
+        if after is not None and (not isinstance(after.get("k"), str) or type(after.get("b", 0)) is not int):
+            # e.g. a traversal pivot's cursor; it must not read as the end of the hub
+            raise ValueError("Invalid cursor")
+        after_key = after["k"] if after else prefix
+        if sum(hub["member_count"] for hub in hubs) >= settings.pivot_hub_scan_min_members:
+            return self._scan_hub_members(session, entity_match, params, spec, hubs, limit,
+                                          prefix, after_key, after or {})
+
+        members_query = f"""
+            {entity_match}
+            MATCH (e)-[:MEMBER_OF]->(h:InfraHub {{kind: $kind}})<-[:MEMBER_OF]-(m:Entity)
+            WHERE m <> e AND m.key > $after_key
+            WITH DISTINCT m
+            ORDER BY m.key
+            LIMIT $limit
+            RETURN m
+        """
+        truncated = False
+        try:
+            records = list(session.run(
+                Query(members_query, timeout=settings.pivot_time_budget_ms / 1000),
+                kind=spec["hub"],
+                after_key=after_key,
+                limit=limit + 1,
+                **params
+            ))
+        except Neo4jError as e:
+            if "TransactionTimedOut" not in (e.code or ""):
+                raise
+            logger.warning(f"Hub member expansion timed out for {spec['hub']}")
+            records, truncated = [], True
+
+        page = [record["m"] for record in records[:limit]]
+        next_cursor = None
+        if len(records) > limit:
+            next_cursor = encode_cursor({"k": page[-1]["key"]})
+        return self._hub_page(spec, hubs, page, next_cursor, truncated)
+
+    def _scan_hub_members(self, session, entity_match: str, params: Dict[str, Any],
+                          spec: Dict[str, Any], hubs: List[Dict[str, Any]], limit: int,
+                          prefix: str, after_key: str, after: Dict[str, Any]):
+        """
+        One bounded walk of the key index for big hubs
+
+        A walk that times out is retried by the client from the same key
+        with half the scan budget, which later cursors keep, so every
+        request makes progress.
+        """
+        budget = max(limit + 1, int(after.get("b") or settings.pivot_row_budget))
+        scan_query = f"""
+            {entity_match}
+            MATCH (e)-[:MEMBER_OF]->(h:InfraHub {{kind: $kind}})
+            WITH e, collect(h) as hubs
+            MATCH (m:Entity)
+            WHERE m.key STARTS WITH $prefix AND m.key > $after_key
+            WITH e, hubs, m
+            ORDER BY m.key
+            LIMIT $budget
+            WITH e, hubs, collect(m) as scanned
+            RETURN [m IN scanned WHERE m <> e
+                        AND EXISTS {{ MATCH (m)-[:MEMBER_OF]->(h) WHERE h IN hubs }}][..$limit] as members,
+                   size(scanned) as scanned, scanned[-1].key as last_key
+        """
+        try:
+            record = session.run(
+                Query(scan_query, timeout=settings.pivot_time_budget_ms / 1000),
+                kind=spec["hub"],
+                prefix=prefix,
+                after_key=after_key,
+                budget=budget,
+                limit=limit + 1,
+                **params
+            ).single()
+        except Neo4jError as e:
+            if "TransactionTimedOut" not in (e.code or ""):
+                raise
+            logger.warning(f"Hub member scan of {budget} keys timed out for {spec['hub']}")
+            retry = {"k": after_key, "b": max(limit + 1, budget // 2)}
+            return self._hub_page(spec, hubs, [], encode_cursor(retry), True)
+
+        members = record["members"] if record else []
+        page = members[:limit]
+        reduced = {"b": budget} if after.get("b") else {}
+        next_cursor, truncated = None, False
+        if len(members) > limit:
+            next_cursor = encode_cursor({"k": page[-1]["key"], **reduced})
+        elif record and record["scanned"] >= budget:
+            # Budget spent before the page filled up: continue after the last key read
+            next_cursor = encode_cursor({"k": record["last_key"], **reduced})
+            truncated = True
+        return self._hub_page(spec, hubs, page, next_cursor, truncated)
+
+    def _hub_page(self, spec: Dict[str, Any], hubs: List[Dict[str, Any]], page: List[Any],
+                  next_cursor: Optional[str], truncated: bool) -> Dict[str, Any]:
+        return {
+            "entities": [
+                {
+                    "id": node.element_id,
+                    "label": primary_label(node),
+                    "properties": dict(node),
+                    "relationship": spec["relationship"],
+                    "hops": 2
+                }
+                for node in page
+            ],
+            "hubs": hubs,
+            "next_cursor": next_cursor,
+            "truncated": truncated
+        }
+
+    def _cache_expansion(self, matches: List[Dict[str, Any]]) -> Optional[str]:
+        """
+        Keep a traversal's ordered matches for `pivot_cursor_ttl_seconds`, so
+        later pages are read from the list instead of traversing again (and
+        stay consistent while the graph changes)
+
+        Returns:
+            Token for the cursor, or None if the cache is unavailable
+        """
+        token = uuid.uuid4().hex
+        key = EXPANSION_KEY.format(token=token)
+        try:
+            pipe = redis_client.pipeline()
+            for i in range(0, len(matches), 1000):
+                pipe.rpush(key, *(json.dumps(hit) for hit in matches[i:i + 1000]))
+            pipe.expire(key, settings.pivot_cursor_ttl_seconds)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Pivot expansion cache unavailable, returning the first page only: {e}")
+            return None
+        return token
+
+    def _cached_page(self, after: Dict[str, Any], signature: str, limit: int):
+        """
+        Matches from a cursor's position in its cached expansion (one extra to detect a next page)
+
+        Raises:
+            ValueError: for cursors of another pivot, or whose expansion expired
+        """
+        if "x" not in after or after.get("s") != signature:
+            raise ValueError("Invalid cursor")
+        offset = int(after.get("o", 0))
+        key = EXPANSION_KEY.format(token=after["x"])
+        try:
+            entries = redis_client.lrange(key, offset, offset + limit)
+            exists = entries or redis_client.exists(key)
+        except redis.RedisError as e:
+            logger.warning(f"Pivot expansion cache unavailable: {e}")
+            exists = False
+        if not exists:
+            raise ValueError("Cursor expired, start the pivot again")
+        return [json.loads(entry) for entry in entries], offset, bool(after.get("t")), after["x"]
+
+    def _nodes(self, session, ids: List[str]) -> Dict[str, Any]:
+        """Nodes of one page by element id; nodes deleted since the expansion are left out"""
+        if not ids:
+            return {}
+        records = session.run(
+            "UNWIND $ids AS id MATCH (n) WHERE elementId(n) = id RETURN id, n", ids=ids
+        )
+        return {record["id"]: record["n"] for record in records}
+
+    def _expand(self, session, start_id: str, relationships: List[str], depth: int):
+        """
+        Breadth-first expansion with global node deduplication
+
+        Each level is one query over the whole frontier, returning only ids,
+        labels and keys; nodes already seen are dropped here with a set rather
+        than checked against a list in Cypher. The row budget caps the total
+        number of discovered nodes and the time budget is enforced as a
+        server-side transaction timeout on each level.
+        """
+        expand_query = f"""
+            UNWIND $frontier AS source_id
+            MATCH (a) WHERE elementId(a) = source_id
+            MATCH (a)-[r:{'|'.join(relationships)}]-(b:Entity)
+            WITH b, min(type(r)) as rel_type
+            RETURN elementId(b) as id, [label IN labels(b) WHERE label <> 'Entity'][0] as label,
+                   rel_type, coalesce(b.key, elementId(b)) as sort_key
+            ORDER BY sort_key
+            LIMIT $row_limit
+        """
+        deadline = time.monotonic() + settings.pivot_time_budget_ms / 1000
+        visited = {start_id}
+        frontier = [start_id]
+        found = []
+
+        for hops in range(1, depth + 1):
+            remaining_rows = settings.pivot_row_budget - len(found)
+            remaining_time = deadline - time.monotonic()
+            if remaining_rows <= 0 or remaining_time <= 0:
+                return found, True
+
+            try:
+                # Rows for already visited nodes are dropped below; at most
+                # len(visited) of them, so the limit still leaves enough
+                records = session.run(
+                    Query(expand_query, timeout=remaining_time),
+                    frontier=frontier,
+                    row_limit=remaining_rows + len(visited) + 1
+                ).data()
+            except Neo4jError as e:
+                if "TransactionTimedOut" not in (e.code or ""):
+                    raise
+                logger.warning(f"Pivot expansion timed out at depth {hops}")
+                return found, True
+
+            fresh = [record for record in records if record["id"] not in visited]
+            truncated = len(fresh) > remaining_rows
+            frontier = []
+            for record in fresh[:remaining_rows]:
+                visited.add(record["id"])
+                frontier.append(record["id"])
+                found.append({**record, "label": record["label"] or "Entity", "hops": hops})
+
+            if truncated:
+                return found, True
+            if not frontier:
+                break
+
+        return found, False
+
+
+# Global instance
+pivot_engine = PivotEngine()
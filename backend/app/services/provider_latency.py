@@ -0,0 +1,139 @@
+"""
+Provider Latency
+Per-provider request latency histograms in Redis, and the request timeouts derived from them
+"""
+from app.config import settings
+from app.redis_client import redis_client
+from app.providers.registry import PROVIDER_REGISTRY
+from typing import Dict, Any, List, Optional
+import math
+import time
+import redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Upper bounds (seconds) of the histogram buckets; slower calls count as "inf"
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 45, 60, 90]
+
+HISTOGRAM_KEY = "latency:{provider}:{hour}"     # hash bucket -> calls, plus "timeouts"
+
+
+def _bucket(seconds: float, timed_out: bool = False) -> str:
+    """Histogram field for a request; one that timed out took longer, so it goes a bucket up"""
+    for i, bound in enumerate(LATENCY_BUCKETS):
+        if seconds <= bound:
+            i += int(timed_out)
+            return str(LATENCY_BUCKETS[i]) if i < len(LATENCY_BUCKETS) else "inf"
+    return "inf"
+
+
+def _report(seconds: Optional[float]):
+    """Percentile for the API; JSON has no infinity"""
+    return f">{LATENCY_BUCKETS[-1]}" if seconds == math.inf else seconds
+
+
+class ProviderLatency:
+    """
+    Tracks how long each provider's requests take and sets their timeouts
+
+    Individual requests are counted, not whole enrich() calls, so polling
+    providers (URLScan waits between requests) are timed per request too.
+    Requests go into hourly histograms that expire after
+    `provider_latency_window_hours`, so timeouts follow an API that gets
+    faster or slower. A provider's timeout is the upper bound of the bucket
+    holding its `provider_timeout_percentile` latency, times
+    `provider_timeout_headroom`, within the min/max limits; a request that
+    timed out counts in the next bucket up, so frequent timeouts push the
+    timeout out again. `provider_timeouts` fixes a provider's timeout.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def observe(self, provider: str, seconds: float, timed_out: bool = False):
+        """Count a finished (or timed-out) provider request"""
+        hour = int(time.time() // 3600)
+        key = HISTOGRAM_KEY.format(provider=provider, hour=hour)
+        bucket = _bucket(seconds, timed_out)
+        try:
+            pipe = self.client.pipeline()
+            pipe.hincrby(key, bucket, 1)
+            if timed_out:
+                pipe.hincrby(key, "timeouts", 1)
+            pipe.expire(key, (settings.provider_latency_window_hours + 1) * 3600)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Failed to record {provider} latency: {e}")
+
+    def timeout(self, provider: str) -> float:
+        """Timeout in seconds for each request of the next call to a provider"""
+        if provider in settings.provider_timeouts:
+            return settings.provider_timeouts[provider]
+        try:
+            histogram = self._histogram(provider)
+        except redis.RedisError as e:
+            logger.warning(f"Latency histogram unavailable for {provider}: {e}")
+            return settings.provider_timeout_default_seconds
+        return self._timeout(histogram)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Request latency percentiles, timeout rate and timeout per provider, slowest tail first"""
+        report = []
+        for provider in PROVIDER_REGISTRY:
+            histogram = self._histogram(provider)
+            samples = sum(count for bucket, count in histogram.items() if bucket != "timeouts")
+            report.append({
+                "provider": provider,
+                "samples": samples,
+                "timeouts": histogram.get("timeouts", 0),
+                "timeout_rate": round(histogram.get("timeouts", 0) / samples, 3) if samples else 0,
+                "p50_seconds": self._percentile(histogram, 0.5),
+                "p95_seconds": self._percentile(histogram, 0.95),
+                "p99_seconds": self._percentile(histogram, 0.99),
+                "timeout_seconds": settings.provider_timeouts.get(provider, self._timeout(histogram)),
+                "timeout_source": "settings" if provider in settings.provider_timeouts else (
+                    "adaptive" if samples >= settings.provider_timeout_min_samples else "default"
+                )
+            })
+        report.sort(key=lambda entry: -(entry["p99_seconds"] or 0))
+        for entry in report:
+            for field in ("p50_seconds", "p95_seconds", "p99_seconds"):
+                entry[field] = _report(entry[field])
+        return report
+
+    def _histogram(self, provider: str) -> Dict[str, int]:
+        """Bucket counts summed over the window"""
+        hour = int(time.time() // 3600)
+        pipe = self.client.pipeline()
+        for offset in range(settings.provider_latency_window_hours):
+            pipe.hgetall(HISTOGRAM_KEY.format(provider=provider, hour=hour - offset))
+        histogram: Dict[str, int] = {}
+        for counts in pipe.execute():
+            for bucket, count in (counts or {}).items():
+                histogram[bucket] = histogram.get(bucket, 0) + int(count)
+        return histogram
+
+    def _percentile(self, histogram: Dict[str, int], percentile: float) -> Optional[float]:
+        """Upper bound of the bucket holding the percentile; inf if beyond the last bucket"""
+        samples = sum(count for bucket, count in histogram.items() if bucket != "timeouts")
+        if not samples:
+            return None
+        seen = 0
+        for bound in LATENCY_BUCKETS:
+            seen += histogram.get(str(bound), 0)
+            if seen >= percentile * samples:
+                return bound
+        return math.inf
+
+    def _timeout(self, histogram: Dict[str, int]) -> float:
+        samples = sum(count for bucket, count in histogram.items() if bucket != "timeouts")
+        if samples < settings.provider_timeout_min_samples:
+            return settings.provider_timeout_default_seconds
+        timeout = self._percentile(histogram, settings.provider_timeout_percentile) * settings.provider_timeout_headroom
+        return round(max(settings.provider_timeout_min_seconds, min(timeout, settings.provider_timeout_max_seconds)), 1)
+
+
+# Global instance
+provider_latency = ProviderLatency(redis_client)
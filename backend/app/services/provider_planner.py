@@ -0,0 +1,144 @@
+"""
+Provider Planner
+Chooses and orders the providers a lookup runs within its latency and cost budget
+"""
+from app.config import settings
+from app.redis_client import redis_client
+from app.providers.registry import PROVIDER_REGISTRY
+from app.services.key_pool import key_pool
+from typing import Dict, Any, List, Optional
+import redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+LATENCY_KEY = "planner:latency"     # hash provider -> moving average of call seconds
+LATENCY_SMOOTHING = 0.2
+
+
+class ProviderPlanner:
+    """
+    Plans which providers a lookup runs, cheapest and fastest first
+
+    A lookup's profile (`provider_profiles`) sets its budget: the total
+    quota cost of its provider calls and their total expected latency,
+    since providers run one after another. Explicit `max_cost` and
+    `max_latency_seconds` on the request override the profile. Expected
+    latency is the moving average of observed calls, falling back to the
+    registry's estimate for providers not seen yet.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def plan(self, entity_type: str, profile: str = "deep", sources: Optional[List[str]] = None,
+             api_keys: Optional[Dict[str, str]] = None, max_cost: Optional[float] = None,
+             max_latency_seconds: Optional[float] = None) -> List[str]:
+        """
+        Provider names to run for a lookup, in order
+
+        `sources` restricts the plan to the named providers or capabilities.
+        Providers that need an API key are left out when neither the request
+        nor the key pool has one. A provider that does not fit the remaining
+        budget is skipped and cheaper ones after it are still considered.
+        """
+        budget = settings.provider_profiles.get(profile, {})
+        if max_cost is None:
+            max_cost = budget.get("max_cost")
+        if max_latency_seconds is None:
+            max_latency_seconds = budget.get("max_latency_seconds")
+
+        candidates = [
+            name for name, spec in PROVIDER_REGISTRY.items()
+            if entity_type in spec["entity_types"]
+            and self._has_key(spec, name, api_keys or {})
+            and (not sources or name in sources or set(spec["capabilities"]) & set(sources))
+        ]
+        latencies = self.latencies(candidates)
+
+        plan, cost, latency = [], 0, 0.0
+        for name in self._order(candidates, latencies):
+            spec = PROVIDER_REGISTRY[name]
+            if any(dependency not in plan for dependency in spec["depends_on"]):
+                continue
+            if max_cost is not None and cost + spec["cost"] > max_cost:
+                continue
+            if max_latency_seconds is not None and latency + latencies[name] > max_latency_seconds:
+                continue
+            plan.append(name)
+            cost += spec["cost"]
+            latency += latencies[name]
+
+        logger.info(f"Planned {', '.join(plan) or 'no providers'} for {entity_type} ({profile}): "
+                    f"cost {cost}, ~{latency:.1f}s")
+        return plan
+
+    def latencies(self, names: List[str]) -> Dict[str, float]:
+        """Expected seconds per call: observed average, else the registry estimate"""
+        observed = [None] * len(names)
+        if names:
+            try:
+                observed = self.client.hmget(LATENCY_KEY, names)
+            except redis.RedisError as e:
+                logger.warning(f"Observed provider latencies unavailable: {e}")
+        return {
+            name: float(value) if value is not None else PROVIDER_REGISTRY[name]["latency"]
+            for name, value in zip(names, observed)
+        }
+
+    def record_latency(self, provider: str, seconds: float):
+        """Fold a finished provider call into its moving average"""
+        try:
+            previous = self.client.hget(LATENCY_KEY, provider)
+            average = seconds if previous is None else (
+                LATENCY_SMOOTHING * seconds + (1 - LATENCY_SMOOTHING) * float(previous)
+            )
+            self.client.hset(LATENCY_KEY, provider, round(average, 3))
+        except redis.RedisError as e:
+            logger.warning(f"Failed to record {provider} latency: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Registry entries with their expected latency, and each profile's budget"""
+        latencies = self.latencies(list(PROVIDER_REGISTRY))
+        return {
+            "profiles": settings.provider_profiles,
+            "providers": {
+                name: {
+                    "entity_types": spec["entity_types"],
+                    "capabilities": spec["capabilities"],
+                    "cost": spec["cost"],
+                    "expected_latency_seconds": latencies[name],
+                    "key_required": spec["key_required"],
+                    "depends_on": spec["depends_on"]
+                }
+                for name, spec in PROVIDER_REGISTRY.items()
+            }
+        }
+
+    def _has_key(self, spec: Dict[str, Any], name: str, api_keys: Dict[str, str]) -> bool:
+        if not spec["key_required"]:
+            return True
+        return bool(api_keys.get(spec["api_key"]) or key_pool.keys(name))
+
+    def _order(self, candidates: List[str], latencies: Dict[str, float]) -> List[str]:
+        """Cheapest, then fastest first, with every provider after its dependencies"""
+        remaining = sorted(candidates, key=lambda name: (PROVIDER_REGISTRY[name]["cost"], latencies[name]))
+        ordered = []
+        while remaining:
+            ready = [
+                name for name in remaining
+                if all(dependency in ordered or dependency not in remaining
+                       for dependency in PROVIDER_REGISTRY[name]["depends_on"])
+            ]
+            # A dependency cycle cannot be satisfied; plan() drops its members
+            if not ready:
+                ordered.extend(remaining)
+                break
+            ordered.append(ready[0])
+            remaining.remove(ready[0])
+        return ordered
+
+
+# Global instance
+provider_planner = ProviderPlanner(redis_client)
@@ -0,0 +1,69 @@
+"""
+Report Cache
+On-disk store of generated case reports, keyed by case content version
+"""
+from app.config import settings
+from typing import Tuple
+import glob
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ReportCache:
+    """Locate, validate and prune cached PDF reports"""
+    
+    def __init__(self, directory: str):
+        self.directory = directory
+    
+    def report_id(self, case_id: str, version: int) -> str:
+        """Report ID for a case at a given content version"""
+        return f"{case_id}-v{version}"
+    
+    def parse_report_id(self, report_id: str) -> Tuple[str, int]:
+        """
+        Split a report ID into (case_id, version)
+        
+        Raises:
+            ValueError: if the report ID is malformed
+        """
+        case_id, sep, version = report_id.rpartition("-v")
+        if not sep or not case_id or not version.isdigit():
+            raise ValueError("Invalid report ID")
+        return case_id, int(version)
+    
+    def path(self, report_id: str) -> str:
+        return os.path.join(self.directory, f"{report_id}.pdf")
+    
+    def exists(self, report_id: str) -> bool:
+        return os.path.exists(self.path(report_id))
+    
+    def prepare(self, report_id: str) -> str:
+        """Ensure the cache directory exists and return the report path"""
+        os.makedirs(self.directory, exist_ok=True)
+        return self.path(report_id)
+    
+    def prune(self, case_id: str, keep_report_id: str):
+        """
+        Remove reports for versions of a case older than keep_report_id
+        
+        Newer versions are left alone: a slow task for an old version must
+        not delete a report that is already cached for a later one.
+        """
+        _, keep_version = self.parse_report_id(keep_report_id)
+        for path in glob.glob(os.path.join(self.directory, f"{glob.escape(case_id)}-v*.pdf")):
+            try:
+                report_case_id, version = self.parse_report_id(os.path.basename(path)[:-len(".pdf")])
+            except ValueError:
+                continue
+            if report_case_id != case_id or version >= keep_version:
+                continue
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"Failed to remove stale report {path}: {e}")
+
+
+# Global instance
+report_cache = ReportCache(settings.reports_dir)
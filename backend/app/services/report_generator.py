@@ -11,6 +11,7 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, Tabl
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 from datetime import datetime
 import io
+import os
 from typing import Dict, List, Any
 
 
@@ -65,8 +66,29 @@ class ReportGenerator:
             bytes: PDF file content
         """
         buffer = io.BytesIO()
+        self._build_document(buffer, case_data, entities, stats)
+        
+        # Get PDF content
+        pdf_content = buffer.getvalue()
+        buffer.close()
+        
+        return pdf_content
+    
+    def write_case_report(self, path: str, case_data: Dict, entities: List[Dict], stats: Dict = None):
+        """
+        Generate a PDF report for a case straight to a file
+        
+        The document is rendered to a temporary file next to `path` and moved
+        into place once complete, so readers never see a partial report.
+        """
+        tmp_path = f"{path}.tmp"
+        self._build_document(tmp_path, case_data, entities, stats)
+        os.replace(tmp_path, path)
+    
+    def _build_document(self, output, case_data: Dict, entities: List[Dict], stats: Dict = None):
+        """Render the report to a filename or file-like object"""
         doc = SimpleDocTemplate(
-            buffer,
+            output,
             pagesize=letter,
             rightMargin=72,
             leftMargin=72,
@@ -95,12 +117,6 @@ class ReportGenerator:
         
         # Build PDF
         doc.build(story)
-        
-        # Get PDF content
-        pdf_content = buffer.getvalue()
-        buffer.close()
-        
-        return pdf_content
     
     def _build_header(self, case_data: Dict) -> List:
         """Build report header"""
@@ -0,0 +1,102 @@
+"""
+Risk History
+Compact, capped per-entity time series of risk scores stored on the node itself
+"""
+from app.config import settings
+from typing import Dict, Any, List, Optional
+import time
+
+# Each point is one integer, small enough to stay exact in JSON clients:
+#   bits 26-51  minutes since HISTORY_EPOCH
+#   bits 11-25  reason code mask (rule "code" 0-14)
+#   bit  10     score was propagated from a linked entity
+#   bits  7-8   level index
+#   bits  0-6   score (0-100)
+HISTORY_EPOCH = 1704067200  # 2024-01-01T00:00:00Z
+LEVELS = ["LOW", "MEDIUM", "HIGH"]
+MAX_REASON_CODES = 15
+
+_MINUTE_SHIFT = 26
+_MASK_SHIFT = 11
+_LINKED_SHIFT = 10
+_LEVEL_SHIFT = 7
+
+# Age -> bucket width used when compacting; points inside one bucket
+# collapse to the highest-scoring one
+DOWNSAMPLE_TIERS = [
+    (7 * 86400, 0),
+    (90 * 86400, 86400),
+    (None, 7 * 86400),
+]
+
+
+def pack(timestamp: float, score: float, level: str, reason_mask: int, linked: bool) -> int:
+    minutes = max(0, int(timestamp - HISTORY_EPOCH) // 60)
+    return (
+        minutes << _MINUTE_SHIFT
+        | (reason_mask & (2 ** MAX_REASON_CODES - 1)) << _MASK_SHIFT
+        | int(bool(linked)) << _LINKED_SHIFT
+        | LEVELS.index(level) << _LEVEL_SHIFT
+        | max(0, min(int(round(score)), 100))
+    )
+
+
+def unpack(point: int) -> Dict[str, Any]:
+    return {
+        "timestamp": HISTORY_EPOCH + (point >> _MINUTE_SHIFT) * 60,
+        "reason_mask": (point >> _MASK_SHIFT) & (2 ** MAX_REASON_CODES - 1),
+        "linked": bool((point >> _LINKED_SHIFT) & 1),
+        "level": LEVELS[(point >> _LEVEL_SHIFT) & 3],
+        "score": point & 127
+    }
+
+
+class RiskHistory:
+    """Append-only change log of an entity's risk, downsampled as it ages"""
+
+    def append(self, history: Optional[List[int]], score: float, level: str,
+               reason_mask: int, linked: bool, now: Optional[float] = None) -> List[int]:
+        """
+        History with a new point added, unless the risk is unchanged since the
+        last point; compacted once it exceeds `risk_history_max_points`
+        """
+        now = now or time.time()
+        history = list(history or [])
+        if history:
+            last = unpack(history[-1])
+            if (last["score"], last["level"], last["reason_mask"], last["linked"]) == \
+                    (max(0, min(int(round(score)), 100)), level, reason_mask, bool(linked)):
+                return history
+
+        history.append(pack(now, score, level, reason_mask, linked))
+        if len(history) > settings.risk_history_max_points:
+            history = self._compact(history, now)
+        return history
+
+    def decode(self, history: Optional[List[int]]) -> List[Dict[str, Any]]:
+        """Stored points as dicts, oldest first"""
+        return [unpack(point) for point in history or []]
+
+    def last_mask(self, history: Optional[List[int]]) -> int:
+        """Reason codes of the most recent point"""
+        return unpack(history[-1])["reason_mask"] if history else 0
+
+    def _compact(self, history: List[int], now: float) -> List[int]:
+        """Keep recent points as-is and the peak of each older bucket"""
+        buckets: Dict[Any, int] = {}
+        for point in history:
+            age = now - unpack(point)["timestamp"]
+            for max_age, width in DOWNSAMPLE_TIERS:
+                if max_age is None or age < max_age:
+                    break
+            bucket = (width, int(unpack(point)["timestamp"] // width)) if width else point
+            kept = buckets.get(bucket)
+            if kept is None or unpack(point)["score"] >= unpack(kept)["score"]:
+                buckets[bucket] = point
+
+        compacted = sorted(buckets.values(), key=lambda point: point >> _MINUTE_SHIFT)
+        return compacted[-settings.risk_history_max_points:]
+
+
+# Global instance
+risk_history = RiskHistory()
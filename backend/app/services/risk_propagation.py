@@ -0,0 +1,245 @@
+"""
+Risk Propagation
+Spreads risk between linked entities with decay, recomputing only the affected neighbourhood
+"""
+from app.config import settings
+from app.services.case_stats import risk_update
+from app.services.risk_engine import risk_engine
+from app.services.risk_history import risk_history
+from app.services.risk_rules import RuleSet, NO_INDICATORS
+from typing import Dict, Any, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+NEIGHBOUR_CANDIDATES = 16     # strongest neighbours per entity considered when choosing its source
+
+# Neighbours that can pass risk on are the scored ones. Candidates come in
+# order of the effective score they could pass on; `strongest_base` is the
+# neighbour whose own score is highest, for when every candidate's risk
+# came from the entity itself.
+EVALUATE_QUERY = """
+    UNWIND $keys AS key
+    MATCH (v:Entity {{key: key}})
+    WHERE v.risk_score IS NOT NULL
+    OPTIONAL MATCH (v)-[r:{relationships}]-(u:Entity)
+    WHERE u.risk_score IS NOT NULL
+    WITH v, u, r, $weights[type(r)] as weight
+    ORDER BY u.risk_score * weight DESC
+    WITH v, collect(CASE WHEN u IS NULL THEN null ELSE {{
+        key: u.key,
+        label: [l IN labels(u) WHERE l <> 'Entity'][0],
+        relationship: type(r),
+        weight: weight,
+        score: u.risk_score,
+        base_score: coalesce(u.risk_base_score, u.risk_score),
+        path: u.risk_linked_path
+    }} END) as neighbours
+    RETURN v.key as key,
+           coalesce(v.risk_base_score, v.risk_score) as base_score,
+           v.risk_score as old_score,
+           v.risk_level as old_level,
+           coalesce(v.risk_reasons, []) as reasons,
+           v.risk_linked_score as old_linked_score,
+           v.risk_linked_reason as old_linked_reason,
+           v.risk_linked_path as old_linked_path,
+           v.risk_history as history,
+           neighbours[..$candidates] as candidates,
+           reduce(best = null, n IN neighbours |
+               CASE WHEN best IS NULL OR n.base_score * n.weight > best.base_score * best.weight
+                    THEN n ELSE best END) as strongest_base
+"""
+
+NEIGHBOURS_QUERY = """
+    UNWIND $keys AS key
+    MATCH (:Entity {{key: key}})-[:{relationships}]-(u:Entity)
+    WHERE u.risk_score IS NOT NULL
+    RETURN DISTINCT u.key as key
+    LIMIT $limit
+"""
+
+WRITE_QUERY = f"""
+    UNWIND $rows AS row
+    MATCH (n:Entity {{key: row.key}})
+    SET n.risk_base_score = coalesce(n.risk_base_score, row.base_score),
+        n.risk_linked_score = row.linked_score,
+        n.risk_linked_reason = row.linked_reason,
+        n.risk_linked_path = row.linked_path,
+        n.risk_score = row.score,
+        n.risk_level = row.level,
+        n.risk_reasons = row.reasons,
+        n.risk_history = row.history
+    WITH n, row
+    MATCH (n)<-[:CONTAINS]-(c:Case)
+    SET {risk_update(source="row.")}
+"""
+
+
+class RiskPropagator:
+    """
+    Max-product propagation of risk scores over enrichment relationships
+
+    Each entity's effective score is max(own score, decay * max over
+    neighbours of weight(relationship) * neighbour score), iterated to a
+    fixed point. Decay < 1 makes the iteration converge and bounds how far
+    risk can travel.
+
+    Propagated scores carry the path they came along (`risk_linked_path`,
+    origin first). A neighbour whose propagated score came through an
+    entity passes only its own score back to it, so risk never echoes
+    around a cycle: once an origin's score drops, nothing it sent out can
+    keep it or its neighbours up.
+    """
+
+    def propagate(self, session, keys: List[str],
+                  rule_set: Optional[RuleSet] = None) -> Dict[str, Any]:
+        """
+        Re-settle the neighbourhood of entities whose own score changed
+
+        The seeds and their neighbours are re-evaluated first; after that
+        only neighbours of entities whose score moved by at least the
+        tolerance are visited, for up to `risk_propagation_max_rounds`
+        rounds and `risk_propagation_max_nodes` evaluations beyond the seeds.
+
+        Returns:
+            {"rounds": int, "evaluated": int, "updated": int, "truncated": bool}
+        """
+        rule_set = rule_set or risk_engine.rule_set()
+        weights = rule_set.propagation["weights"]
+        stats = {"rounds": 0, "evaluated": 0, "updated": 0, "truncated": False}
+        if not weights or not keys:
+            return stats
+
+        relationships = "|".join(weights)
+        seeds = list(dict.fromkeys(keys))
+        budget = len(seeds) + settings.risk_propagation_max_nodes
+        seen = set(seeds)
+        frontier = seeds + [
+            key for key in self._neighbours(session, relationships, seeds)
+            if key not in seen
+        ]
+
+        while frontier:
+            if stats["rounds"] >= settings.risk_propagation_max_rounds or stats["evaluated"] >= budget:
+                stats["truncated"] = True
+                break
+
+            frontier = frontier[:budget - stats["evaluated"]]
+            records = session.run(
+                EVALUATE_QUERY.format(relationships=relationships),
+                keys=frontier,
+                weights=weights,
+                candidates=NEIGHBOUR_CANDIDATES
+            ).data()
+            rows, moved = self._settle(rule_set, records)
+            if rows:
+                session.run(WRITE_QUERY, rows=rows)
+
+            stats["rounds"] += 1
+            stats["evaluated"] += len(records)
+            stats["updated"] += len(rows)
+            frontier = self._neighbours(session, relationships, moved) if moved else []
+
+        if stats["updated"]:
+            logger.info(
+                f"Risk propagation updated {stats['updated']} entities "
+                f"in {stats['rounds']} round(s){' (truncated)' if stats['truncated'] else ''}"
+            )
+        return stats
+
+    def _settle(self, rule_set: RuleSet, records: List[Dict[str, Any]]):
+        """New effective scores for one round; returns (rows to write, keys that moved)"""
+        decay = rule_set.propagation["decay"]
+        tolerance = rule_set.propagation["tolerance"]
+        rows, moved = [], []
+
+        for record in records:
+            top, contribution, path = self._strongest(record)
+            linked_score = linked_reason = linked_path = None
+            if contribution:
+                linked_score = round(decay * contribution)
+                linked_path = path
+                value = top["key"].split(":", 1)[-1]
+                linked_reason = (
+                    f"Linked to {top['label']} {value} via {top['relationship']} "
+                    f"(propagated risk {linked_score})"
+                )
+
+            # Stored reasons carry the previous linked reason only if it applied
+            base_reasons = [
+                reason for reason in record["reasons"] if reason != record["old_linked_reason"]
+            ] or [NO_INDICATORS]
+            base = {
+                "score": record["base_score"],
+                "level": rule_set.level(record["base_score"]),
+                "reasons": base_reasons
+            }
+            effective = rule_set.combine(base, linked_score, linked_reason)
+
+            if (effective["score"] == record["old_score"]
+                    and effective["level"] == record["old_level"]
+                    and linked_score == record["old_linked_score"]
+                    and linked_reason == record["old_linked_reason"]
+                    and linked_path == record["old_linked_path"]):
+                continue
+
+            rows.append({
+                "key": record["key"],
+                "base_score": record["base_score"],
+                "linked_score": linked_score,
+                "linked_reason": linked_reason,
+                "linked_path": linked_path,
+                "score": effective["score"],
+                "level": effective["level"],
+                "reasons": effective["reasons"],
+                # The entity's own reason codes are unchanged, so carry them over
+                "history": risk_history.append(
+                    record["history"],
+                    effective["score"],
+                    effective["level"],
+                    risk_history.last_mask(record["history"]),
+                    linked=effective["score"] > base["score"]
+                ),
+                "old_score": record["old_score"],
+                "old_level": record["old_level"]
+            })
+            if abs(effective["score"] - (record["old_score"] or 0)) >= tolerance:
+                moved.append(record["key"])
+
+        return rows, moved
+
+    def _strongest(self, record: Dict[str, Any]):
+        """
+        The neighbour passing the most risk to an entity, with that risk
+        (before decay) and its path; (None, None, None) without neighbours
+
+        A neighbour passes on its effective score, unless that was
+        propagated through this entity (or predates paths being stored),
+        in which case only its own score counts.
+        """
+        best = (None, None, None)
+        neighbours = list(record["candidates"])
+        if record["strongest_base"]:
+            neighbours.append(record["strongest_base"])
+        for neighbour in neighbours:
+            path = neighbour["path"]
+            if neighbour["score"] > neighbour["base_score"] and path and record["key"] not in path:
+                contribution, path = neighbour["score"] * neighbour["weight"], path + [neighbour["key"]]
+            else:
+                contribution, path = neighbour["base_score"] * neighbour["weight"], [neighbour["key"]]
+            if best[1] is None or contribution > best[1]:
+                best = (neighbour, contribution, path)
+        return best
+
+    def _neighbours(self, session, relationships: str, keys: List[str]) -> List[str]:
+        result = session.run(
+            NEIGHBOURS_QUERY.format(relationships=relationships),
+            keys=keys,
+            limit=settings.risk_propagation_max_nodes
+        )
+        return [record["key"] for record in result]
+
+
+# Global instance
+risk_propagator = RiskPropagator()
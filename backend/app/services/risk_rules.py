@@ -0,0 +1,448 @@
+"""
+Risk Rules
+Loads versioned risk rule sets from JSON and compiles them into evaluators
+"""
+from app.config import settings
+from app.database import ENRICHMENT_RELATIONSHIPS
+from typing import Dict, Any, List, Optional, Callable, Tuple
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+import hashlib
+import string
+import json
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+RULE_KINDS = ("scaled", "bands", "flag", "equals")
+MAX_REASON_CODE = 14
+NO_INDICATORS = "No significant risk indicators found"
+
+# A compiled rule: properties -> (points, reason or None)
+ScalarRule = Callable[[Dict[str, Any]], Tuple[float, Optional[str]]]
+# A compiled rule over a batch: list of properties -> (points, reason choice) arrays,
+# where the choice indexes the rule's reasons and is -1 for rows the rule did not fire on
+VectorRule = Callable[[List[Dict[str, Any]]], Tuple[np.ndarray, np.ndarray]]
+# Renders a rule's chosen reason for one entity
+ReasonRenderer = Callable[[int, Dict[str, Any]], str]
+
+
+def _column(rows: List[Dict[str, Any]], field: str, default: float = np.nan) -> np.ndarray:
+    """One numeric property across a batch, with missing values replaced by default"""
+    return np.array(
+        [default if row.get(field) is None else row[field] for row in rows],
+        dtype=float
+    )
+
+
+def _count_column(rows: List[Dict[str, Any]], field: str) -> np.ndarray:
+    """Length of a list property across a batch"""
+    return np.array([len(row.get(field) or []) for row in rows], dtype=float)
+
+
+def _number(spec: Dict[str, Any], key: str):
+    value = spec[key]
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{key} must be a number")
+    return value
+
+
+class _Reason:
+    """A reason template, optionally with singular and plural forms"""
+
+    def __init__(self, spec):
+        if isinstance(spec, str):
+            spec = {"one": spec, "other": spec}
+        self.one = spec["one"]
+        self.other = spec["other"]
+        self.count = spec.get("count")
+
+    def fields(self) -> List[str]:
+        """Properties referenced by the templates, besides the rule's own value"""
+        names = {self.count} if self.count else set()
+        for template in (self.one, self.other):
+            names.update(name for _, name, _, _ in string.Formatter().parse(template) if name)
+        names.discard("value")
+        return sorted(names)
+
+    def render(self, value, props: Dict[str, Any]) -> str:
+        count = props.get(self.count, 0) if self.count else value
+        template = self.one if count == 1 else self.other
+        return template.format_map(defaultdict(int, props, value=value))
+
+
+class EntityRules:
+    """Compiled rules for one entity type"""
+
+    def __init__(self, scalar: List[ScalarRule], vector: List[VectorRule], render: List[ReasonRenderer],
+                 inputs: List[str], codes: List[Optional[int]], ids: List[str]):
+        self.scalar = scalar
+        self.vector = vector
+        self.render = render
+        self.inputs = inputs
+        self.codes = codes
+        self.ids = ids
+
+
+class RuleSet:
+    """A validated, compiled rule set"""
+
+    def __init__(self, spec: Dict[str, Any], source: Optional[str] = None):
+        """
+        Raises:
+            ValueError: if the rule set is malformed
+        """
+        self.version = spec.get("version")
+        if not isinstance(self.version, str) or not self.version:
+            raise ValueError("Rule set needs a version string")
+
+        thresholds = spec.get("thresholds") or {}
+        self.low_threshold = thresholds.get("low", 30)
+        self.medium_threshold = thresholds.get("medium", 60)
+        if not self.low_threshold <= self.medium_threshold:
+            raise ValueError("Rule set thresholds must satisfy low <= medium")
+        self.max_score = spec.get("max_score", 100)
+        self.propagation = self._parse_propagation(spec.get("propagation") or {})
+
+        self.source = source
+        self.loaded_at = datetime.now()
+        self.entities = {
+            entity_type: self._compile_entity(entity_type, rules)
+            for entity_type, rules in (spec.get("entities") or {}).items()
+        }
+
+    # ---- Evaluation ----
+
+    def evaluate(self, entity_type: str, props: Dict[str, Any]) -> Dict[str, Any]:
+        """Score one entity; same shape as RiskEngine.calculate_risk"""
+        score = 0
+        reasons = []
+        reason_mask = 0
+        compiled = self.entities.get(entity_type)
+        for index, rule in enumerate(compiled.scalar if compiled else []):
+            points, reason = rule(props)
+            score += points
+            if reason:
+                reasons.append(reason)
+                if compiled.codes[index] is not None:
+                    reason_mask |= 1 << compiled.codes[index]
+
+        score = min(score, self.max_score)
+        return {
+            "score": score,
+            "level": self.level(score),
+            "reasons": reasons or [NO_INDICATORS],
+            "reason_mask": reason_mask,
+            "rules_version": self.version
+        }
+
+    def evaluate_batch(self, entity_type: str, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Score many entities of one type at once
+
+        Returns:
+            {
+                "scores": array,
+                "levels": array,
+                "reasons": [[reason, ...], ...],
+                "reason_masks": array
+            }
+            aligned with rows and matching evaluate() row for row
+        """
+        scores = np.zeros(len(rows))
+        reason_masks = np.zeros(len(rows), dtype=np.int64)
+        compiled = self.entities.get(entity_type)
+        rules = list(zip(compiled.vector, compiled.render, compiled.codes)) if compiled else []
+
+        choices = np.full((len(rules), len(rows)), -1, dtype=np.int64)
+        for index, (rule, _, code) in enumerate(rules):
+            points, choices[index] = rule(rows)
+            scores += points
+            if code is not None:
+                reason_masks |= (choices[index] >= 0).astype(np.int64) << code
+
+        # Only the reasons that fired are rendered; scoring itself stays in arrays
+        reasons = [[] for _ in rows]
+        for row, rule in zip(*np.nonzero(choices.T >= 0)):
+            reasons[row].append(rules[rule][1](int(choices[rule, row]), rows[row]))
+
+        scores = np.minimum(scores, self.max_score)
+        return {
+            "scores": scores,
+            "levels": self.levels(scores),
+            "reasons": [row_reasons or [NO_INDICATORS] for row_reasons in reasons],
+            "reason_masks": reason_masks
+        }
+
+    def levels(self, scores: np.ndarray) -> np.ndarray:
+        """Risk levels for an array of scores"""
+        return np.select(
+            [scores < self.low_threshold, scores < self.medium_threshold],
+            ["LOW", "MEDIUM"],
+            default="HIGH"
+        )
+
+    def combine(self, base: Dict[str, Any], linked_score: Optional[float],
+                linked_reason: Optional[str]) -> Dict[str, Any]:
+        """
+        Effective risk from an entity's own score and the score propagated
+        from its neighbours: whichever is higher, with the reason for it
+        """
+        if linked_score is None or linked_score <= base["score"]:
+            return {"score": base["score"], "level": base["level"], "reasons": base["reasons"]}
+
+        reasons = [reason for reason in base["reasons"] if reason != NO_INDICATORS]
+        return {
+            "score": linked_score,
+            "level": self.level(linked_score),
+            "reasons": reasons + [linked_reason]
+        }
+
+    def level(self, score: float) -> str:
+        if score < self.low_threshold:
+            return "LOW"
+        if score < self.medium_threshold:
+            return "MEDIUM"
+        return "HIGH"
+
+    def inputs(self, entity_type: str) -> List[str]:
+        """Properties an entity type's score depends on"""
+        compiled = self.entities.get(entity_type)
+        return compiled.inputs if compiled else []
+
+    def reason_ids(self, entity_type: str, reason_mask: int) -> List[str]:
+        """Rule IDs behind a reason code mask"""
+        compiled = self.entities.get(entity_type)
+        if not compiled:
+            return []
+        return [
+            rule_id for rule_id, code in zip(compiled.ids, compiled.codes)
+            if code is not None and reason_mask & (1 << code)
+        ]
+
+    def fingerprint(self, entity_type: str, props: Dict[str, Any]) -> str:
+        """Digest of exactly the properties the entity's score is computed from"""
+        values = [props.get(field) for field in self.inputs(entity_type)]
+        payload = json.dumps(values, separators=(",", ":"), default=str)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    # ---- Compilation ----
+
+    def _parse_propagation(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        """Decay, per-relationship weights and write tolerance for risk propagation"""
+        weights = spec.get("relationships") or {}
+        unknown = set(weights) - set(ENRICHMENT_RELATIONSHIPS)
+        if unknown:
+            raise ValueError(f"Cannot propagate over relationship(s): {', '.join(sorted(unknown))}")
+        for relationship in weights:
+            if not 0 < _number(weights, relationship) <= 1:
+                raise ValueError(f"Propagation weight for {relationship} must be in (0, 1]")
+
+        decay = _number(spec, "decay") if "decay" in spec else 0.5
+        if not 0 < decay < 1:
+            raise ValueError("Propagation decay must be in (0, 1)")
+
+        return {
+            "decay": decay,
+            "weights": weights,
+            "tolerance": _number(spec, "tolerance") if "tolerance" in spec else 1
+        }
+
+    def _compile_entity(self, entity_type: str, rules: List[Dict[str, Any]]) -> EntityRules:
+        scalar, vector, render, inputs, codes, ids = [], [], [], set(), [], []
+        for index, rule in enumerate(rules):
+            rule_id = rule.get("id", f"{entity_type}[{index}]")
+            try:
+                rule_scalar, rule_vector, rule_render, rule_inputs = self._compile_rule(rule)
+                # Codes identify rules in stored risk history, so keep them stable across versions
+                code = rule.get("code")
+                if code is not None:
+                    if not isinstance(code, int) or not 0 <= code <= MAX_REASON_CODE:
+                        raise ValueError(f"code must be an integer from 0 to {MAX_REASON_CODE}")
+                    if code in codes:
+                        raise ValueError(f"code {code} is already used")
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"Invalid risk rule {rule_id}: {e}") from e
+            scalar.append(rule_scalar)
+            vector.append(rule_vector)
+            render.append(rule_render)
+            inputs.update(rule_inputs)
+            codes.append(code)
+            ids.append(rule_id)
+        return EntityRules(scalar, vector, render, sorted(inputs), codes, ids)
+
+    def _compile_rule(self, rule: Dict[str, Any]):
+        kind = rule["kind"]
+        if kind not in RULE_KINDS:
+            raise ValueError(f"unknown kind {kind!r}")
+
+        field = rule["property"]
+        if not isinstance(field, str):
+            raise ValueError("property must be a string")
+        counted = rule.get("measure", "value") == "count"
+
+        def value_of(props):
+            if counted:
+                return len(props.get(field) or [])
+            return props.get(field)
+
+        def column(rows, default=np.nan):
+            return _count_column(rows, field) if counted else _column(rows, field, default)
+
+        reasons: List[_Reason] = []
+
+        if kind == "scaled":
+            weight, cap = _number(rule, "weight"), _number(rule, "cap")
+            reason = _Reason(rule["reason"])
+            reasons.append(reason)
+
+            def scalar(props):
+                value = value_of(props) or 0
+                if value > 0:
+                    return min(value * weight, cap), reason.render(value, props)
+                return 0, None
+
+            def vector(rows):
+                values = column(rows, 0)
+                fired = values > 0
+                return np.where(fired, np.minimum(values * weight, cap), 0), np.where(fired, 0, -1)
+
+        elif kind == "bands":
+            bands = []
+            for band in rule["bands"]:
+                if ("below" in band) == ("above" in band):
+                    raise ValueError("each band needs exactly one of below/above")
+                band_reason = _Reason(band["reason"])
+                reasons.append(band_reason)
+                bands.append((band.get("below"), band.get("above"), _number(band, "points"), band_reason))
+
+            def scalar(props):
+                value = value_of(props)
+                if value is None:
+                    return 0, None
+                for below, above, points, band_reason in bands:
+                    if (below is not None and value < below) or (above is not None and value > above):
+                        return points, band_reason.render(value, props)
+                return 0, None
+
+            def vector(rows):
+                values = column(rows)
+                conditions = [
+                    values < below if below is not None else values > above
+                    for below, above, _, _ in bands
+                ]
+                return (
+                    np.select(conditions, [points for _, _, points, _ in bands], default=0),
+                    np.select(conditions, list(range(len(bands))), default=-1)
+                )
+
+        elif kind == "flag":
+            points = _number(rule, "points")
+            reason = _Reason(rule["reason"])
+            reasons.append(reason)
+
+            def scalar(props):
+                value = value_of(props)
+                return (points, reason.render(value, props)) if value else (0, None)
+
+            def vector(rows):
+                fired = np.array([bool(value_of(row)) for row in rows], dtype=bool)
+                return np.where(fired, points, 0), np.where(fired, 0, -1)
+
+        else:  # equals
+            cases = {
+                match: (_number(case, "points"), _Reason(case["reason"]))
+                for match, case in rule["cases"].items()
+            }
+            reasons.extend(case_reason for _, case_reason in cases.values())
+
+            def scalar(props):
+                value = value_of(props)
+                if value in cases:
+                    points, case_reason = cases[value]
+                    return points, case_reason.render(value, props)
+                return 0, None
+
+            def vector(rows):
+                values = np.array([value_of(row) for row in rows], dtype=object)
+                total = np.zeros(len(rows))
+                choice = np.full(len(rows), -1)
+                for index, (match, (points, _)) in enumerate(cases.items()):
+                    matched = values == match
+                    total += np.where(matched, points, 0)
+                    choice = np.where(matched, index, choice)
+                return total, choice
+
+        def render(choice, props):
+            return reasons[choice].render(value_of(props), props)
+
+        inputs = {field}
+        for reason in reasons:
+            inputs.update(reason.fields())
+        return scalar, vector, render, inputs
+
+
+class RiskRules:
+    """The active rule set, reloaded from disk when the file changes"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._rule_set: Optional[RuleSet] = None
+        self._mtime: Optional[float] = None
+        self._digest: Optional[str] = None
+        self._checked_at = 0.0
+
+    def current(self) -> RuleSet:
+        """
+        Active rule set, checking the file for changes at most every
+        `risk_rules_reload_seconds`
+
+        A rule file that fails to load, or whose rules changed without a new
+        version (stored scores name the version that produced them), is
+        logged and ignored, keeping the previous rule set in force.
+
+        Raises:
+            ValueError: if no valid rule set has been loaded yet
+        """
+        now = time.monotonic()
+        if self._rule_set is None or now - self._checked_at >= settings.risk_rules_reload_seconds:
+            self._checked_at = now
+            self._reload_if_changed()
+        return self._rule_set
+
+    def _reload_if_changed(self):
+        try:
+            mtime = self.path.stat().st_mtime
+            if self._rule_set is not None and mtime == self._mtime:
+                return
+            # Remember the attempt so a broken file is only reported once
+            self._mtime = mtime
+            text = self.path.read_text()
+            digest = hashlib.sha1(text.encode()).hexdigest()
+            if digest == self._digest:
+                return
+            rule_set = RuleSet(json.loads(text), source=str(self.path))
+        except (OSError, ValueError) as e:
+            if self._rule_set is None:
+                raise ValueError(f"Could not load risk rules from {self.path}: {e}") from e
+            logger.error(f"Keeping risk rules {self._rule_set.version}; reload failed: {e}")
+            return
+
+        if self._rule_set is not None and rule_set.version == self._rule_set.version:
+            logger.error(
+                f"Keeping risk rules {self._rule_set.version}; {self.path} changed without "
+                f"a new version, bump it to apply the change"
+            )
+            return
+
+        logger.info(f"Loaded risk rules {rule_set.version} from {self.path}")
+        self._rule_set = rule_set
+        self._digest = digest
+
+
+# Global instance
+risk_rules = RiskRules(settings.risk_rules_path)
@@ -0,0 +1,235 @@
+"""
+Job Scheduler
+Weighted fair queuing of lookup jobs across tenants, in front of the Celery queue
+"""
+from app.config import settings
+from app.celery_app import celery_app, LOOKUP_QUEUE
+from app.redis_client import redis_client
+from app.services.inflight import inflight_index
+from typing import Dict, Any, List, Optional
+import json
+import time
+import redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Interactive jobs are always dispatched before bulk ones
+LANES = ["interactive", "bulk"]
+
+PENDING_KEY = "sched:pending:{lane}:{tenant}"     # list of job payloads
+ACTIVE_KEY = "sched:active:{lane}"                # set of tenants with pending jobs
+PENDING_COUNT_KEY = "sched:pending_count"
+VTIME_KEY = "sched:vtime"                         # hash tenant -> virtual time
+CLOCK_KEY = "sched:clock"                         # virtual time of the last dispatch
+RUNNING_KEY = "sched:running"                     # zset job_id -> dispatch time
+TENANT_RUNNING_KEY = "sched:running:{tenant}"
+LOCK_KEY = "sched:lock"
+
+
+class JobScheduler:
+    """
+    Holds submitted jobs per tenant and releases them to the workers
+
+    Jobs only enter the Celery lookup queue when the fleet has a free slot
+    (`lookup_worker_slots` running jobs in total), so a tenant that submits
+    thousands of jobs cannot bury everyone else's behind them in FIFO order.
+    Among tenants below their concurrency cap (`tenant_max_concurrency`),
+    the one with the lowest virtual time goes next; dispatching a job
+    advances a tenant's virtual time by 1 / weight, so over time tenants get
+    slots in proportion to `tenant_weights` (default weight 1).
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def submit(self, job: Dict[str, Any], tenant: str, lane: str = "interactive") -> List[str]:
+        """
+        Queue a job for a tenant and dispatch whatever now fits
+
+        `job` holds the enrich_entity arguments: job_id, query, entity_type,
+        api_keys, max_age_hours and the planned providers.
+
+        Returns:
+            IDs of the jobs dispatched by this call
+        """
+        try:
+            self._enqueue(job, tenant, lane)
+        except redis.RedisError as e:
+            logger.warning(f"Scheduler unavailable, dispatching job {job['job_id']} directly: {e}")
+            self._send(job, tenant)
+            return [job["job_id"]]
+
+        return self.dispatch()
+
+    def _enqueue(self, job: Dict[str, Any], tenant: str, lane: str):
+        with self.client.lock(LOCK_KEY, timeout=10, blocking_timeout=10):
+            # A tenant returning from idle starts at the current virtual time
+            # rather than spending credit banked while it had nothing queued
+            if not any(self.client.sismember(ACTIVE_KEY.format(lane=l), tenant) for l in LANES):
+                clock = float(self.client.get(CLOCK_KEY) or 0)
+                if float(self.client.hget(VTIME_KEY, tenant) or 0) < clock:
+                    self.client.hset(VTIME_KEY, tenant, clock)
+
+            pipe = self.client.pipeline()
+            pipe.rpush(PENDING_KEY.format(lane=lane, tenant=tenant), json.dumps({**job, "tenant": tenant}))
+            pipe.sadd(ACTIVE_KEY.format(lane=lane), tenant)
+            pipe.incr(PENDING_COUNT_KEY)
+            pipe.execute()
+
+    def finish(self, job_id: str, tenant: Optional[str]):
+        """Free a finished job's slot and hand it to the next job"""
+        try:
+            pipe = self.client.pipeline()
+            pipe.zrem(RUNNING_KEY, job_id)
+            if tenant:
+                pipe.zrem(TENANT_RUNNING_KEY.format(tenant=tenant), job_id)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Failed to release scheduler slot for job {job_id}: {e}")
+        self.dispatch()
+
+    def renew(self, job_id: str, tenant: Optional[str]):
+        """
+        Extend a running job's slot lease; called as each attempt of the job
+        starts, so a job resumed past the task time limit keeps its slot
+        """
+        try:
+            now = time.time()
+            pipe = self.client.pipeline()
+            pipe.zadd(RUNNING_KEY, {job_id: now})
+            if tenant:
+                pipe.zadd(TENANT_RUNNING_KEY.format(tenant=tenant), {job_id: now})
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Failed to renew scheduler slot for job {job_id}: {e}")
+
+    def dispatch(self) -> List[str]:
+        """Send pending jobs to the workers while there are free slots"""
+        dispatched = []
+        try:
+            with self.client.lock(LOCK_KEY, timeout=10, blocking_timeout=10):
+                self._dispatch_free_slots(dispatched)
+        except redis.RedisError as e:
+            logger.warning(f"Job dispatch interrupted: {e}")
+
+        if dispatched:
+            logger.info(f"Dispatched {len(dispatched)} job(s)")
+        return dispatched
+
+    def _dispatch_free_slots(self, dispatched: List[str]):
+        self._expire_running()
+        free = settings.lookup_worker_slots - self.client.zcard(RUNNING_KEY)
+
+        while free > 0:
+            picked = self._pick()
+            if not picked:
+                break
+            lane, tenant = picked
+
+            pending_key = PENDING_KEY.format(lane=lane, tenant=tenant)
+            payload = self.client.lpop(pending_key)
+            if not self.client.llen(pending_key):
+                self.client.srem(ACTIVE_KEY.format(lane=lane), tenant)
+            if payload is None:
+                continue
+            job = json.loads(payload)
+
+            vtime = float(self.client.hget(VTIME_KEY, tenant) or 0)
+            now = time.time()
+            pipe = self.client.pipeline()
+            pipe.set(CLOCK_KEY, vtime)
+            pipe.hset(VTIME_KEY, tenant, vtime + 1 / self._weight(tenant))
+            pipe.zadd(RUNNING_KEY, {job["job_id"]: now})
+            pipe.zadd(TENANT_RUNNING_KEY.format(tenant=tenant), {job["job_id"]: now})
+            pipe.decr(PENDING_COUNT_KEY)
+            pipe.execute()
+
+            self._send(job, tenant)
+            inflight_index.refresh(job["entity_type"], job["query"], job["job_id"])
+            dispatched.append(job["job_id"])
+            free -= 1
+
+    def cancel(self, job_id: str, tenant: str, lane: str) -> bool:
+        """
+        Withdraw a job that has not been dispatched yet
+
+        Returns:
+            True if the job was still pending and is now removed
+        """
+        pending_key = PENDING_KEY.format(lane=lane, tenant=tenant)
+        with self.client.lock(LOCK_KEY, timeout=10, blocking_timeout=10):
+            for payload in self.client.lrange(pending_key, 0, -1):
+                if json.loads(payload)["job_id"] != job_id:
+                    continue
+                if not self.client.lrem(pending_key, 1, payload):
+                    return False
+                self.client.decr(PENDING_COUNT_KEY)
+                if not self.client.llen(pending_key):
+                    self.client.srem(ACTIVE_KEY.format(lane=lane), tenant)
+                return True
+        return False
+
+    def pending_count(self) -> int:
+        """Jobs held by the scheduler that have not been dispatched yet"""
+        return max(0, int(self.client.get(PENDING_COUNT_KEY) or 0))
+
+    def stats(self) -> Dict[str, Any]:
+        """Pending and running jobs per tenant, for the admin API"""
+        self._expire_running()
+        tenants: Dict[str, Dict[str, Any]] = {}
+        for lane in LANES:
+            for tenant in self.client.smembers(ACTIVE_KEY.format(lane=lane)):
+                entry = tenants.setdefault(tenant, {"pending": {}, "running": 0})
+                entry["pending"][lane] = self.client.llen(PENDING_KEY.format(lane=lane, tenant=tenant))
+        for tenant, entry in tenants.items():
+            entry["running"] = self.client.zcard(TENANT_RUNNING_KEY.format(tenant=tenant))
+            entry["weight"] = self._weight(tenant)
+        return {
+            "slots": settings.lookup_worker_slots,
+            "running": self.client.zcard(RUNNING_KEY),
+            "pending": self.pending_count(),
+            "tenants": tenants
+        }
+
+    def _pick(self) -> Optional[tuple]:
+        """(lane, tenant) to dispatch from next, or None if nothing is eligible"""
+        for lane in LANES:
+            eligible = [
+                tenant for tenant in self.client.smembers(ACTIVE_KEY.format(lane=lane))
+                if self.client.zcard(TENANT_RUNNING_KEY.format(tenant=tenant)) < settings.tenant_max_concurrency
+            ]
+            if eligible:
+                vtimes = self.client.hmget(VTIME_KEY, eligible)
+                return lane, min(zip((float(v or 0) for v in vtimes), eligible))[1]
+        return None
+
+    def _send(self, job: Dict[str, Any], tenant: str):
+        # The task ID is the job ID, so a queued task can be revoked by job
+        celery_app.send_task(
+            "enrich_entity",
+            task_id=job["job_id"],
+            queue=LOOKUP_QUEUE,
+            args=[job["job_id"], job["query"], job["entity_type"],
+                  job.get("api_keys") or {}, job.get("max_age_hours")],
+            kwargs={"tenant": tenant, "providers": job.get("providers")}
+        )
+
+    def _weight(self, tenant: str) -> float:
+        return settings.tenant_weights.get(tenant, 1.0)
+
+    def _expire_running(self):
+        """
+        Drop slots whose lease (renewed as each attempt starts) outlived the
+        task time limit: their worker was lost
+        """
+        cutoff = time.time() - celery_app.conf.task_time_limit - 60
+        self.client.zremrangebyscore(RUNNING_KEY, "-inf", cutoff)
+        for lane in LANES:
+            for tenant in self.client.smembers(ACTIVE_KEY.format(lane=lane)):
+                self.client.zremrangebyscore(TENANT_RUNNING_KEY.format(tenant=tenant), "-inf", cutoff)
+
+
+# Global instance
+job_scheduler = JobScheduler(redis_client)
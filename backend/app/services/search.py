@@ -0,0 +1,90 @@
+"""
+Entity Search
+Full-text and prefix search over graph entities backed by a Neo4j full-text index
+"""
+from app.database import search_index, primary_label
+from typing import Dict, Any, List, Optional
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Characters with special meaning in Lucene query syntax
+_LUCENE_SPECIAL = re.compile(r'([+\-!(){}\[\]^"~*?:\\/]|&&|\|\|)')
+
+
+class EntitySearch:
+    """Query the full-text entity index with ranking, label filtering and paging"""
+
+    MAX_PAGE_SIZE = 100
+
+    def build_query(self, q: str, mode: str = "fulltext") -> Optional[str]:
+        """
+        Translate user input into a Lucene query string
+
+        In "prefix" mode the last term is treated as incomplete so the index
+        can serve autocomplete; in "fulltext" mode every term must match.
+        """
+        terms = [_LUCENE_SPECIAL.sub(r"\\\1", t) for t in q.strip().split()]
+        if not terms:
+            return None
+
+        if mode == "prefix":
+            terms[-1] = f"{terms[-1]}*"
+
+        return " AND ".join(terms)
+
+    def search(self, session, q: str, label: Optional[str] = None, mode: str = "fulltext",
+               limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """
+        Run a ranked search against the full-text index
+
+        Returns:
+            {
+                "results": [{"id", "type", "score", "properties"}, ...],
+                "next_offset": int | None
+            }
+        """
+        lucene_query = self.build_query(q, mode)
+        if not lucene_query:
+            return {"results": [], "next_offset": None}
+
+        limit = max(1, min(limit, self.MAX_PAGE_SIZE))
+        offset = max(0, offset)
+
+        # The label picks the index and Lucene pages the hits itself, so only
+        # one page (plus one row, to know whether another page exists) is read
+        cypher_query = f"""
+            CALL db.index.fulltext.queryNodes('{search_index(label)}', $lucene_query,
+                                              {{skip: $offset, limit: $limit}})
+            YIELD node, score
+            RETURN node, score
+            ORDER BY score DESC
+        """
+        result = session.run(
+            cypher_query,
+            lucene_query=lucene_query,
+            offset=offset,
+            limit=limit + 1
+        )
+
+        entities: List[Dict[str, Any]] = []
+        for record in result:
+            node = record["node"]
+            entities.append({
+                "id": node.element_id,
+                "type": primary_label(node),
+                "score": record["score"],
+                "properties": dict(node)
+            })
+
+        has_more = len(entities) > limit
+        return {
+            "results": entities[:limit],
+            "next_offset": offset + limit if has_more else None
+        }
+
+
+# Global instance
+entity_search = EntitySearch()
@@ -1,124 +1,635 @@
 from app.celery_app import celery_app
-from app.database import db
+from celery.exceptions import SoftTimeLimitExceeded
+from app.database import db, entity_key, ENTITY_LABELS
 from app.config import settings
-from app.providers.hibp import HIBPProvider
-from app.providers.leakcheck import LeakCheckProvider
-from app.providers.dns import DNSProvider
-from app.providers.whois import WHOISProvider
-from app.providers.hunter import HunterProvider
-from app.providers.geoip import GeoIPProvider
-from app.providers.shodan import ShodanProvider
-from app.providers.virustotal import VirusTotalProvider
-from app.providers.urlscan import URLScanProvider
-from app.providers.alienvault import AlienVaultProvider
+from app.providers.registry import PROVIDER_REGISTRY
 from app.services.risk_engine import risk_engine
+from app.services.risk_propagation import risk_propagator
+from app.services.risk_history import risk_history
+from app.services.case_stats import risk_update
+from app.services.inflight import inflight_index
+from app.services.admission import admission_controller
+from app.services.scheduler import job_scheduler
+from app.services.cancellation import cancellation, JobCancelled
+from app.services.key_pool import key_pool
+from app.services.provider_planner import provider_planner
+from app.services.provider_latency import provider_latency
 import asyncio
+import hashlib
+import json
 import logging
+import random
+import time
+import uuid
 
 logger = logging.getLogger(__name__)
 
 
-@celery_app.task(bind=True, name="enrich_entity")
-def enrich_entity(self, job_id: str, query: str, entity_type: str, api_keys: dict = None):
-    """Main enrichment task"""
+# Provider -> result fields that change between runs without the source
+# data changing (a keyed URLScan call submits a new scan every time), left
+# out of result digests so watchlist refreshes only report real changes
+VOLATILE_RESULT_FIELDS = {
+    "whois": {"domain_age_days"},
+    "urlscan": {"scan_id", "report_url", "screenshot_url", "scan_date", "status", "message"},
+    "virustotal": {"last_analysis_date", "last_update_date", "harmless_count", "undetected_count",
+                   "total_engines", "popularity_rank"},
+    "shodan": {"last_update"},
+}
+
+
+# Acknowledged only once finished, so a task whose worker dies is redelivered
+# and resumes from the job's provider checkpoints
+@celery_app.task(bind=True, name="enrich_entity", acks_late=True, reject_on_worker_lost=True)
+def enrich_entity(self, job_id: str, query: str, entity_type: str, api_keys: dict = None,
+                  max_age_hours: float = None, tenant: str = None, providers: list = None):
+    """Main enrichment task; runs the providers planned at submission (all of them if not given)"""
+    if max_age_hours is None:
+        max_age_hours = settings.enrichment_max_age_hours
+    started = time.monotonic()
+    resuming = deferred = False
+    # Each attempt runs at most task_time_limit, so renewing the slot lease
+    # here keeps it for as long as the job keeps resuming
+    job_scheduler.renew(job_id, tenant)
     try:
         # Run async enrichment
-        result = asyncio.run(_enrich_entity_async(job_id, query, entity_type, api_keys or {}))
+        result = asyncio.run(
+            _enrich_entity_async(job_id, query, entity_type, api_keys or {}, max_age_hours, providers)
+        )
+        admission_controller.record_duration(time.monotonic() - started)
+        deferred = result.get("deferred", False)
         return result
+    except JobCancelled:
+        logger.info(f"Job {job_id} cancelled, stopped enriching {query}")
+        _mark_cancelled(job_id)
+        return {"success": False, "cancelled": True}
+    except SoftTimeLimitExceeded:
+        # Providers that finished are checkpointed; the retry runs only the rest
+        logger.warning(f"Enrichment of {query} hit the time limit, resuming job {job_id}")
+        resuming = True
+        raise self.retry(countdown=settings.enrichment_resume_delay_seconds, max_retries=None)
     except Exception as e:
         logger.error(f"Enrichment failed for {query}: {e}")
         return {"success": False, "error": str(e)}
+    finally:
+        # The tenant's slot goes to the next scheduled job, and later
+        # lookups of this entity start a new job (once any deferred
+        # provider retries are done)
+        if not resuming:
+            job_scheduler.finish(job_id, tenant)
+            if not deferred:
+                inflight_index.release(entity_type, query, job_id)
 
 
-async def _enrich_entity_async(job_id: str, query: str, entity_type: str, api_keys: dict):
+async def _enrich_entity_async(job_id: str, query: str, entity_type: str, api_keys: dict,
+                               max_age_hours: float = 0, provider_names: list = None):
     """Async enrichment logic"""
+    if provider_names is None:
+        provider_names = provider_planner.plan(entity_type, api_keys=api_keys)
+    cancellation.check(job_id)
     db.connect()
     
     try:
-        # Create scan job node
+        # Start the job created at submission; a retried or redelivered task
+        # finds the providers its earlier attempts completed. A job cancelled
+        # or deleted since the check above is left as it is
         with db.driver.session() as session:
             cypher_query = """
-                MERGE (j:ScanJob {id: $job_id})
+                MATCH (j:ScanJob {id: $job_id})
+                WHERE j.status <> 'cancelled'
                 SET j.search_query = $search_query, j.entity_type = $entity_type, 
-                    j.status = 'running', j.started_at = timestamp()
+                    j.status = 'running', j.started_at = coalesce(j.started_at, timestamp()),
+                    j.attempts = coalesce(j.attempts, 0) + 1,
+                    j.planned_providers = coalesce(j.planned_providers, $planned)
+                RETURN j.attempts as attempts, coalesce(j.completed_providers, []) as completed
             """
-            session.run(cypher_query, job_id=job_id, search_query=query, entity_type=entity_type)
+            record = session.run(
+                cypher_query, job_id=job_id, search_query=query, entity_type=entity_type,
+                planned=provider_names
+            ).single()
+            if not record:
+                raise JobCancelled(job_id)
+            
+            # Give up on a job that keeps dying or timing out
+            if record["attempts"] > settings.enrichment_max_attempts:
+                cypher_query = """
+                    MATCH (j:ScanJob {id: $job_id})
+                    SET j.status = 'failed', j.completed_at = timestamp(),
+                        j.errors = coalesce(j.errors, []) + $error
+                """
+                error = f"Gave up after {settings.enrichment_max_attempts} attempts"
+                session.run(cypher_query, job_id=job_id, error=error)
+                return {"success": False, "error": error}
         
-        # Initialize providers with API keys from request or fallback to settings
-        providers = []
+        completed = set(record["completed"])
+        if completed:
+            logger.info(f"Resuming job {job_id}: skipping completed providers {', '.join(sorted(completed))}")
+        
+        providers = _build_providers(provider_names, api_keys)
         
         if entity_type == "email":
-            # Use HIBP if key is available
-            hibp_key = api_keys.get("hibp") or settings.hibp_api_key
-            if hibp_key:
-                providers.append(HIBPProvider(hibp_key))
-            hunter_key = api_keys.get("hunter") or settings.hunter_api_key
-            providers.append(HunterProvider(hunter_key))
             # Create email node
             db.merge_email_node(query, {"address": query})
             db.create_relationship("ScanJob", "id", job_id, "Email", "address", query, "SCANNED", {})
             
         elif entity_type == "domain":
-            providers.append(DNSProvider())
-            providers.append(WHOISProvider())
-            hunter_key = api_keys.get("hunter") or settings.hunter_api_key
-            providers.append(HunterProvider(hunter_key))
-            vt_key = api_keys.get("virustotal") or settings.virustotal_api_key
-            providers.append(VirusTotalProvider(vt_key))
-            urlscan_key = api_keys.get("urlscan") or settings.urlscan_api_key
-            providers.append(URLScanProvider(urlscan_key))
-            alienvault_key = api_keys.get("alienvault") or settings.alienvault_api_key
-            providers.append(AlienVaultProvider(alienvault_key))
             # Create domain node
             db.merge_domain_node(query, {"name": query})
             db.create_relationship("ScanJob", "id", job_id, "Domain", "name", query, "SCANNED", {})
             
         elif entity_type == "ip":
-            providers.append(GeoIPProvider())
-            shodan_key = api_keys.get("shodan") or settings.shodan_api_key
-            providers.append(ShodanProvider(shodan_key))
-            vt_key = api_keys.get("virustotal") or settings.virustotal_api_key
-            providers.append(VirusTotalProvider(vt_key))
-            alienvault_key = api_keys.get("alienvault") or settings.alienvault_api_key
-            providers.append(AlienVaultProvider(alienvault_key))
             # Create IP node
             db.merge_ip_node(query, {"address": query})
             db.create_relationship("ScanJob", "id", job_id, "IP", "address", query, "SCANNED", {})
         
-        # Run all providers
-        results = []
+        # Run providers whose data on this entity is stale; the job is
+        # already linked to the entity, so fresh data is reused as-is
+        key = entity_key(ENTITY_LABELS[entity_type], query)
+        fresh = _fresh_providers(key, [provider.name for provider in providers], max_age_hours)
+        results = await _run_providers(
+            job_id, query, entity_type, providers, completed=completed, fresh=fresh
+        )
+        
+        if fresh:
+            with db.driver.session() as session:
+                cypher_query = """
+                    MATCH (j:ScanJob {id: $job_id})
+                    SET j.reused_providers = $reused
+                """
+                session.run(cypher_query, job_id=job_id, reused=sorted(fresh))
+        
+        # Calculate risk score after all enrichments complete
+        cancellation.check(job_id)
+        await _calculate_risk_score(query, entity_type)
+        
+        # Providers that failed transiently run again later in their own
+        # task, so this worker is not held up waiting for them
+        if _defer_retries(job_id, query, entity_type, api_keys, results, {}):
+            return {"success": True, "results": results, "deferred": True}
+        
+        _complete_job(job_id, results)
+        return {"success": True, "results": results}
+        
+    finally:
+        db.close()
+
+
+async def _run_providers(job_id: str, query: str, entity_type: str, providers: list,
+                         completed: set = frozenset(), fresh: set = frozenset()) -> list:
+    """
+    Run providers one after another, writing and checkpointing each success
+    
+    Providers already completed by this job, or whose data is fresh, are
+    skipped. Every provider is closed afterwards.
+    
+    Raises:
+        JobCancelled: if the job is cancelled meanwhile; nothing is written after that
+    """
+    key = entity_key(ENTITY_LABELS[entity_type], query)
+    results = []
+    try:
         for provider in providers:
             try:
+                if provider.name in completed:
+                    continue
+                if provider.name in fresh:
+                    logger.info(f"Skipping provider {provider.name} for {query}: data is fresh")
+                    continue
+                
+                # Later lookups keep attaching to this job while it runs
+                inflight_index.refresh(entity_type, query, job_id)
                 logger.info(f"Running provider: {provider.name} for {query}")
-                result = await provider.enrich(query, entity_type)
+                result = await _call_provider(job_id, provider, query, entity_type)
                 results.append(result)
                 logger.info(f"Provider {provider.name} result: {result.get('success', False)}")
                 
-                # Process results and create graph nodes
+                # Process results and create graph nodes, unless the job
+                # was cancelled while the provider was running
+                cancellation.check(job_id)
                 await _process_provider_result(query, entity_type, result)
                 
+                if result.get("success"):
+                    _mark_enriched(key, provider.name, _result_digest(result))
+                    _checkpoint(job_id, provider.name)
+                
+            except JobCancelled:
+                raise
             except Exception as e:
                 logger.error(f"Provider {provider.name} failed: {e}", exc_info=True)
             finally:
                 await provider.close()
-        
-        # Calculate risk score after all enrichments complete
-        await _calculate_risk_score(query, entity_type)
-        
-        # Update job status
+    except JobCancelled:
+        # Providers that never ran still hold open HTTP clients
+        for provider in providers:
+            await provider.close()
+        raise
+    
+    return results
+
+
+def _retry_delay(attempt: int, retry_after: float = None) -> float:
+    """Jittered exponential backoff, but never sooner than the API's Retry-After"""
+    backoff = min(settings.provider_retry_max_seconds, settings.provider_retry_base_seconds * 2 ** (attempt - 1))
+    delay = random.uniform(backoff / 2, backoff)
+    return round(max(delay, retry_after or 0), 1)
+
+
+def _defer_retries(job_id: str, query: str, entity_type: str, api_keys: dict,
+                   results: list, attempts: dict) -> bool:
+    """
+    Schedule a retry_providers task for providers that failed transiently
+    
+    Each failure is logged to the job's retry history. A provider is given
+    up on after `provider_max_retries` retries, or when its Retry-After is
+    longer than `provider_retry_max_seconds` (e.g. a daily quota).
+    
+    Returns:
+        True if a retry was scheduled
+    """
+    due, delays, history = {}, [], []
+    for result in results:
+        if not result.get("retryable"):
+            continue
+        name = result["provider"]
+        attempt = attempts.get(name, 0) + 1
+        retry_after = result.get("retry_after")
+        entry = {
+            "provider": name,
+            "attempt": attempt,
+            "error_class": result.get("error_class"),
+            "status_code": result.get("status_code"),
+            "retry_after": retry_after,
+            "failed_at": int(time.time() * 1000)
+        }
+        if attempt > settings.provider_max_retries or (retry_after or 0) > settings.provider_retry_max_seconds:
+            entry["gave_up"] = True
+        else:
+            entry["delay"] = _retry_delay(attempt, retry_after)
+            due[name] = attempt
+            delays.append(entry["delay"])
+        history.append(json.dumps(entry))
+    
+    if not history:
+        return False
+    
+    countdown = max(delays) if delays else None
+    with db.driver.session() as session:
+        cypher_query = """
+            MATCH (j:ScanJob {id: $job_id})
+            SET j.retry_history = coalesce(j.retry_history, []) + $history,
+                j.next_retry_at = CASE WHEN $countdown IS NULL THEN null
+                                       ELSE timestamp() + toInteger($countdown * 1000) END
+        """
+        session.run(cypher_query, job_id=job_id, history=history, countdown=countdown)
+    
+    if not due:
+        return False
+    
+    logger.info(f"Retrying {', '.join(sorted(due))} for {query} in {countdown}s")
+    inflight_index.refresh(entity_type, query, job_id, countdown)
+    retry_providers.apply_async(
+        args=[job_id, query, entity_type, sorted(due), api_keys, {**attempts, **due}],
+        countdown=countdown
+    )
+    return True
+
+
+def _mark_cancelled(job_id: str):
+    """
+    Record a job stopped by cancellation as cancelled, in case the worker
+    started it after the API marked it
+    """
+    try:
+        db.connect()
         with db.driver.session() as session:
             cypher_query = """
                 MATCH (j:ScanJob {id: $job_id})
-                SET j.status = 'completed', j.completed_at = timestamp()
+                WHERE j.status IN ['pending', 'running']
+                SET j.status = 'cancelled', j.completed_at = coalesce(j.completed_at, timestamp())
             """
             session.run(cypher_query, job_id=job_id)
+    except Exception as e:
+        logger.error(f"Failed to mark job {job_id} cancelled: {e}")
+    finally:
+        db.close()
+
+
+def _complete_job(job_id: str, results: list):
+    """Mark a job finished; partial if a provider still failed transiently after its retries"""
+    status = "partial" if any(result.get("retryable") for result in results) else "completed"
+    with db.driver.session() as session:
+        cypher_query = """
+            MATCH (j:ScanJob {id: $job_id})
+            WHERE j.status <> 'cancelled'
+            SET j.status = $status, j.completed_at = timestamp()
+        """
+        session.run(cypher_query, job_id=job_id, status=status)
+
+
+@celery_app.task(name="retry_providers", acks_late=True, reject_on_worker_lost=True)
+def retry_providers(job_id: str, query: str, entity_type: str, provider_names: list,
+                    api_keys: dict = None, attempts: dict = None):
+    """Run providers of a job again after transient failures"""
+    deferred = False
+    try:
+        result = asyncio.run(
+            _retry_providers_async(job_id, query, entity_type, provider_names, api_keys or {}, attempts or {})
+        )
+        deferred = result.get("deferred", False)
+        return result
+    except JobCancelled:
+        logger.info(f"Job {job_id} cancelled, dropped provider retries for {query}")
+        _mark_cancelled(job_id)
+        return {"success": False, "cancelled": True}
+    except Exception as e:
+        logger.error(f"Provider retry failed for {query}: {e}")
+        return {"success": False, "error": str(e)}
+    finally:
+        if not deferred:
+            inflight_index.release(entity_type, query, job_id)
+
+
+async def _retry_providers_async(job_id: str, query: str, entity_type: str, provider_names: list,
+                                 api_keys: dict, attempts: dict):
+    """Rerun the named providers, rescore if any succeeded, and finish or defer again"""
+    cancellation.check(job_id)
+    db.connect()
+    
+    try:
+        with db.driver.session() as session:
+            record = session.run(
+                "MATCH (j:ScanJob {id: $job_id}) RETURN coalesce(j.completed_providers, []) as completed",
+                job_id=job_id
+            ).single()
+        if not record:
+            return {"success": False, "error": "Job not found"}
+        
+        providers = _build_providers(provider_names, api_keys)
+        results = await _run_providers(
+            job_id, query, entity_type, providers, completed=set(record["completed"])
+        )
+        
+        cancellation.check(job_id)
+        if any(result.get("success") for result in results):
+            await _calculate_risk_score(query, entity_type)
+        
+        if _defer_retries(job_id, query, entity_type, api_keys, results, attempts):
+            return {"success": True, "results": results, "deferred": True}
         
+        _complete_job(job_id, results)
         return {"success": True, "results": results}
+    
+    finally:
+        db.close()
+
+
+async def _call_provider(job_id: str, provider, query: str, entity_type: str) -> dict:
+    """
+    Cancellable provider call through the key pool
+
+    A rate-limited pooled key is cooled down and the call retried at once
+    with the next key that has quota left. A pooled key is only taken (and
+    counted against its quota) here, once the call is certain to go out;
+    with every pooled key out of quota, a provider that can run without a
+    key does so and the others are skipped.
+    """
+    if not key_pool.checkout(provider) and PROVIDER_REGISTRY[provider.name]["key_required"]:
+        return {
+            "success": False,
+            "provider": provider.name,
+            "error": f"Every {provider.name} API key has used up its daily quota",
+            "error_class": "quota_exhausted",
+            "retryable": False,
+            "retry_after": None
+        }
+    result = await _timed_call(job_id, provider, query, entity_type)
+    while result.get("error_class") == "rate_limited" and key_pool.rotate(provider, result):
+        result = await _timed_call(job_id, provider, query, entity_type)
+    return result
+
+
+async def _timed_call(job_id: str, provider, query: str, entity_type: str) -> dict:
+    """
+    One provider call; its duration feeds the planner and each request it
+    made feeds the timeout histograms
+    """
+    started = time.monotonic()
+    try:
+        return await _cancellable(job_id, provider.enrich(query, entity_type))
+    finally:
+        provider_planner.record_latency(provider.name, time.monotonic() - started)
+        for seconds, timed_out in provider.request_latencies:
+            provider_latency.observe(provider.name, seconds, timed_out)
+        provider.request_latencies.clear()
+
+
+async def _cancellable(job_id: str, coro):
+    """
+    Await a provider call, cancelling it as soon as the job (if any) is cancelled
+    
+    Raises:
+        JobCancelled: if the job was cancelled before the call finished
+    """
+    task = asyncio.ensure_future(coro)
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=settings.job_cancel_poll_seconds)
+        if done:
+            return task.result()
+        if job_id and cancellation.is_cancelled(job_id):
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            raise JobCancelled(job_id)
+
+
+@celery_app.task(name="refresh_entity")
+def refresh_entity(query: str, entity_type: str, watchlist_id: str = None):
+    """Re-enrich a watched entity, writing only what changed since the last run"""
+    try:
+        return asyncio.run(_refresh_entity_async(query, entity_type, watchlist_id))
+    except Exception as e:
+        logger.error(f"Refresh failed for {query}: {e}")
+        return {"success": False, "error": str(e)}
+
+
+async def _refresh_entity_async(query: str, entity_type: str, watchlist_id: str = None):
+    """
+    Run every provider again and diff each result against the digest stored
+    by its last run; only changed results are written to the graph, and the
+    entity is rescored and a WatchEvent recorded only if something changed
+    """
+    db.connect()
+    
+    try:
+        key = entity_key(ENTITY_LABELS[entity_type], query)
+        with db.driver.session() as session:
+            record = session.run(
+                "MATCH (n:Entity {key: $key}) RETURN n.risk_score as risk_score, n as node",
+                key=key
+            ).single()
+        if not record:
+            return {"success": False, "error": "Entity not found"}
+        
+        node = record["node"]
+        changed = []
+        for provider in _build_providers(provider_planner.plan(entity_type), {}):
+            try:
+                result = await _call_provider(None, provider, query, entity_type)
+                if not result.get("success"):
+                    continue
+                
+                # An unchanged result writes nothing, not even its digest
+                digest = _result_digest(result)
+                if digest != node.get(_digest_field(provider.name)):
+                    await _process_provider_result(query, entity_type, result)
+                    _mark_enriched(key, provider.name, digest)
+                    changed.append(provider.name)
+            
+            except Exception as e:
+                logger.error(f"Provider {provider.name} failed: {e}", exc_info=True)
+            finally:
+                await provider.close()
         
+        if not changed:
+            logger.info(f"No changes for watched entity {query}")
+            return {"success": True, "changed": []}
+        
+        await _calculate_risk_score(query, entity_type)
+        
+        with db.driver.session() as session:
+            risk_score = session.run(
+                "MATCH (n:Entity {key: $key}) RETURN n.risk_score as risk_score", key=key
+            ).single()["risk_score"]
+            
+            if watchlist_id:
+                cypher_query = """
+                    MATCH (w:Watchlist {id: $watchlist_id})
+                    CREATE (w)-[:RECORDED]->(:WatchEvent {
+                        id: $event_id,
+                        entity_key: $key,
+                        providers: $providers,
+                        risk_score_before: $risk_score_before,
+                        risk_score_after: $risk_score_after,
+                        detected_at: timestamp()
+                    })
+                    SET w.last_change_at = timestamp()
+                """
+                session.run(
+                    cypher_query,
+                    watchlist_id=watchlist_id,
+                    event_id=str(uuid.uuid4()),
+                    key=key,
+                    providers=changed,
+                    risk_score_before=record["risk_score"],
+                    risk_score_after=risk_score
+                )
+        
+        logger.info(f"Watched entity {query} changed: {', '.join(changed)}")
+        return {"success": True, "changed": changed}
+    
     finally:
         db.close()
 
 
+def _build_providers(provider_names: list, api_keys: dict) -> list:
+    """
+    Providers to run, in order, with API keys from the request or else the
+    key pools, and per-request timeouts from their observed latency
+    
+    A provider that needs a key is dropped if none is available any more.
+    """
+    providers = []
+    for name in provider_names:
+        spec = PROVIDER_REGISTRY.get(name)
+        if not spec:
+            logger.warning(f"Unknown provider {name} in plan, skipping")
+            continue
+        # Pooled keys are counted when a call goes out (see _call_provider),
+        # not here: fresh, reused and completed providers are never called
+        api_key = key_pool.peek(name, api_keys.get(spec["api_key"])) if spec["api_key"] else None
+        if spec["key_required"] and not api_key:
+            continue
+        providers.append(spec["provider"](api_key, timeout=provider_latency.timeout(name)))
+    
+    return providers
+
+
+def _name_servers(name_servers) -> list:
+    """Name server hub values from DNS or WHOIS (a single name or a list)"""
+    if isinstance(name_servers, str):
+        name_servers = [name_servers]
+    return [name_server.rstrip(".").lower() for name_server in name_servers or []]
+
+
+def _checkpoint(job_id: str, provider_name: str):
+    """Record on the job that a provider's results are fully written"""
+    with db.driver.session() as session:
+        cypher_query = """
+            MATCH (j:ScanJob {id: $job_id})
+            WHERE NOT $provider IN coalesce(j.completed_providers, [])
+            SET j.completed_providers = coalesce(j.completed_providers, []) + $provider
+        """
+        session.run(cypher_query, job_id=job_id, provider=provider_name)
+
+
+def _freshness_field(provider_name: str) -> str:
+    """Node property holding when a provider last enriched the entity"""
+    return "enriched_at_" + "".join(c if c.isalnum() else "_" for c in provider_name.lower())
+
+
+def _fresh_providers(key: str, provider_names: list, max_age_hours: float) -> set:
+    """Providers that enriched the entity within the last max_age_hours"""
+    if not max_age_hours:
+        return set()
+    
+    with db.driver.session() as session:
+        record = session.run("MATCH (n:Entity {key: $key}) RETURN n", key=key).single()
+    if not record:
+        return set()
+    
+    cutoff = (time.time() - max_age_hours * 3600) * 1000
+    node = record["n"]
+    return {
+        name for name in provider_names
+        if (node.get(_freshness_field(name)) or 0) >= cutoff
+    }
+
+
+def _digest_field(provider_name: str) -> str:
+    """Node property holding a digest of the provider's last result"""
+    return _freshness_field(provider_name).replace("enriched_at_", "result_digest_", 1)
+
+
+def _result_digest(result: dict) -> str:
+    """
+    Digest of a provider result, ignoring fields that drift on every run
+    and the order of lists (providers build some of them from sets)
+    """
+    volatile = VOLATILE_RESULT_FIELDS.get(result.get("provider"), set())
+    stable = {k: _canonical(v) for k, v in result.items() if k not in volatile}
+    payload = json.dumps(stable, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _canonical(value):
+    """A result value with every list sorted, so equal contents digest the same"""
+    if isinstance(value, dict):
+        return {k: _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        items = [_canonical(item) for item in value]
+        return sorted(items, key=lambda item: json.dumps(item, sort_keys=True, default=str))
+    return value
+
+
+def _mark_enriched(key: str, provider_name: str, digest: str):
+    """Record a successful provider run, and a digest of its result, on the entity"""
+    with db.driver.session() as session:
+        cypher_query = f"""
+            MATCH (n:Entity {{key: $key}})
+            SET n.{_freshness_field(provider_name)} = timestamp(),
+                n.{_digest_field(provider_name)} = $digest
+        """
+        session.run(cypher_query, key=key, digest=digest)
+
+
 async def _process_provider_result(query: str, entity_type: str, result: dict):
     """Process provider result and create graph relationships"""
     if not result.get("success"):
@@ -134,9 +645,10 @@ async def _process_provider_result(query: str, entity_type: str, result: dict):
                     cypher_query = """
                         MERGE (b:Breach {name: $name})
                         SET b.source = 'LeakCheck',
-                            b.last_seen = timestamp()
+                            b.last_seen = timestamp(),
+                            b:Entity, b.key = $key
                     """
-                    session.run(cypher_query, name=source)
+                    session.run(cypher_query, name=source, key=entity_key("Breach", source))
                 
                 db.create_relationship("Email", "address", query, "Breach", "name", source, "EXPOSED_IN", {})
     
@@ -150,11 +662,13 @@ async def _process_provider_result(query: str, entity_type: str, result: dict):
                         MERGE (b:Breach {name: $name})
                         SET b.title = $title, b.domain = $domain, 
                             b.breach_date = $breach_date, b.added_date = $added_date,
-                            b.pwn_count = $pwn_count, b.data_classes = $data_classes
+                            b.pwn_count = $pwn_count, b.data_classes = $data_classes,
+                            b:Entity, b.key = $key
                     """
                     session.run(
                         cypher_query,
                         name=breach_name,
+                        key=entity_key("Breach", breach_name),
                         title=breach.get("Title"),
                         domain=breach.get("Domain"),
                         breach_date=breach.get("BreachDate"),
@@ -171,6 +685,10 @@ async def _process_provider_result(query: str, entity_type: str, result: dict):
         for ip in a_records:
             db.merge_ip_node(ip, {"address": ip})
             db.create_relationship("Domain", "name", query, "IP", "address", ip, "RESOLVES_TO", {})
+        
+        # Hub memberships follow the current records, leaving hubs of old ones
+        db.record_cooccurrence("ip", a_records, "Domain", query)
+        db.record_cooccurrence("nameserver", _name_servers(result["records"].get("NS")), "Domain", query)
     
     # WHOIS - create organization/person nodes
     elif provider == "whois":
@@ -179,10 +697,13 @@ async def _process_provider_result(query: str, entity_type: str, result: dict):
             with db.driver.session() as session:
                 cypher_query = """
                     MERGE (o:Organization {name: $name})
-                    SET o.type = 'registrar'
+                    SET o.type = 'registrar', o:Entity, o.key = $key
                 """
-                session.run(cypher_query, name=registrar)
+                session.run(cypher_query, name=registrar, key=entity_key("Organization", registrar))
             db.create_relationship("Domain", "name", query, "Organization", "name", registrar, "REGISTERED_WITH", {})
+            db.record_cooccurrence("registrar", [registrar], "Domain", query)
+        
+        db.record_cooccurrence("nameserver", _name_servers(result.get("name_servers")), "Domain", query)
     
     # Hunter - create email nodes from domain search
     elif provider == "hunter" and result.get("emails"):
@@ -240,15 +761,25 @@ async def _process_provider_result(query: str, entity_type: str, result: dict):
                 is_hosting=result.get("is_hosting", False)
             )
         
+        if result.get("asn"):
+            db.record_cooccurrence("asn", [result["asn"]], "IP", query)
+        
         # Create organization node for ASN
         org = result.get("org")
         if org:
             with db.driver.session() as session:
                 cypher_query = """
                     MERGE (o:Organization {name: $name})
-                    SET o.type = 'hosting', o.asn = $asn, o.country = $country
+                    SET o.type = 'hosting', o.asn = $asn, o.country = $country,
+                        o:Entity, o.key = $key
                 """
-                session.run(cypher_query, name=org, asn=result.get("asn"), country=result.get("country"))
+                session.run(
+                    cypher_query,
+                    name=org,
+                    asn=result.get("asn"),
+                    country=result.get("country"),
+                    key=entity_key("Organization", org)
+                )
             db.create_relationship("IP", "address", query, "Organization", "name", org, "HOSTED_BY", {})
     
     # Shodan - create service nodes and vulnerability indicators
@@ -411,25 +942,65 @@ async def _calculate_risk_score(query: str, entity_type: str):
             entity = record[0]
             properties = dict(entity)
             
-            # Calculate risk using risk engine
-            risk_result = risk_engine.calculate_risk(entity_type, properties)
+            # Skip rescoring (and the write) when neither the inputs nor the
+            # rules have changed since the stored score
+            rule_set = risk_engine.rule_set()
+            fingerprint = rule_set.fingerprint(entity_type, properties)
+            if (fingerprint == properties.get("risk_fingerprint")
+                    and properties.get("risk_rules_version") == rule_set.version):
+                logger.info(f"Risk inputs unchanged for {query}, keeping stored score")
+                risk_propagator.propagate(session, [entity_key(label, query)], rule_set)
+                return
             
-            # Store risk score in Neo4j
+            # Calculate risk using risk engine; the stored score is the
+            # higher of the entity's own and the one propagated to it
+            risk_result = risk_engine.calculate_risk(entity_type, properties, rule_set)
+            effective = rule_set.combine(
+                risk_result,
+                properties.get("risk_linked_score"),
+                properties.get("risk_linked_reason")
+            )
+            history = risk_history.append(
+                properties.get("risk_history"),
+                effective["score"],
+                effective["level"],
+                risk_result["reason_mask"],
+                linked=effective["score"] > risk_result["score"]
+            )
+            
+            # Store risk score in Neo4j and move the entity between the
+            # risk counters of every case that contains it
             update_query = f"""
                 MATCH (n:{label} {{{id_field}: $entity_value}})
-                SET n.risk_score = $score,
+                SET n.risk_base_score = $base_score,
+                    n.risk_score = $score,
                     n.risk_level = $level,
-                    n.risk_reasons = $reasons
+                    n.risk_reasons = $reasons,
+                    n.risk_rules_version = $rules_version,
+                    n.risk_fingerprint = $fingerprint,
+                    n.risk_history = $history
+                WITH n
+                MATCH (n)<-[:CONTAINS]-(c:Case)
+                SET {risk_update()}
             """
             session.run(
                 update_query,
                 entity_value=query,
-                score=risk_result["score"],
-                level=risk_result["level"],
-                reasons=risk_result["reasons"]
+                base_score=risk_result["score"],
+                score=effective["score"],
+                level=effective["level"],
+                reasons=effective["reasons"],
+                rules_version=risk_result["rules_version"],
+                fingerprint=fingerprint,
+                history=history,
+                old_score=properties.get("risk_score"),
+                old_level=properties.get("risk_level")
             )
             
-            logger.info(f"Risk calculated for {query}: {risk_result['level']} ({risk_result['score']})")
+            logger.info(f"Risk calculated for {query}: {effective['level']} ({effective['score']})")
+            
+            # The job may have linked new neighbours, so always re-settle around the entity
+            risk_propagator.propagate(session, [entity_key(label, query)], rule_set)
             
     except Exception as e:
         logger.error(f"Risk calculation failed for {query}: {e}")
@@ -0,0 +1,67 @@
+from app.celery_app import celery_app
+from celery.exceptions import SoftTimeLimitExceeded
+from app.database import db
+from app.services.garbage_collector import garbage_collector
+from app.services.batch_rescorer import batch_rescorer
+from app.services.scheduler import job_scheduler
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# A full sweep of a large graph outlives the default task limits; each
+# chunk it deletes is committed, so a sweep cut off at the soft limit is
+# simply started again and carries on with the orphans that are left
+@celery_app.task(name="collect_garbage", soft_time_limit=3600, time_limit=3900)
+def collect_garbage(candidate_keys: list = None, dry_run: bool = False):
+    """Reclaim orphaned entities (all of them, or only the given candidates)"""
+    db.connect()
+    try:
+        with db.driver.session() as session:
+            return garbage_collector.collect(session, candidate_keys, dry_run=dry_run)
+    except SoftTimeLimitExceeded:
+        if dry_run:
+            raise
+        task = collect_garbage.delay(candidate_keys)
+        logger.warning(f"Garbage collection hit the time limit, continuing as task {task.id}")
+        return {"resumed_as": task.id}
+    finally:
+        db.close()
+
+
+@celery_app.task(bind=True, name="rescore_entities")
+def rescore_entities(self, entity_types: list = None, stale_only: bool = False, resume: dict = None):
+    """
+    Recompute stored risk scores for every entity of the given types
+    
+    At the soft time limit the task re-enqueues itself from the last chunk
+    written, so whole-graph rescores of any size finish.
+    """
+    cursor = dict(resume or {})
+    
+    def progress(stats):
+        cursor.update(stats["cursor"])
+        self.update_state(state="PROGRESS", meta=stats)
+    
+    db.connect()
+    try:
+        with db.driver.session() as session:
+            return batch_rescorer.rescore(
+                session,
+                entity_types,
+                stale_only=stale_only,
+                progress=progress,
+                resume=resume
+            )
+    except SoftTimeLimitExceeded:
+        task = rescore_entities.delay(entity_types, stale_only=stale_only, resume=cursor or None)
+        logger.warning(f"Rescore hit the time limit at {cursor}, continuing as task {task.id}")
+        return {"resumed_as": task.id, "cursor": cursor}
+    finally:
+        db.close()
+
+
+@celery_app.task(name="dispatch_jobs")
+def dispatch_jobs():
+    """Fill free worker slots from the scheduler, in case a finishing job did not"""
+    return job_scheduler.dispatch()
@@ -0,0 +1,110 @@
+from app.celery_app import celery_app
+from app.database import db
+from app.services.case_stats import case_stats
+from app.services.report_cache import report_cache
+from app.services.report_generator import report_generator
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(bind=True, name="generate_report")
+def generate_report(self, case_id: str, report_id: str):
+    """
+    Render a case report to the on-disk cache
+    
+    The report ID names the case content version it was requested for; if
+    the case has changed since, nothing is rendered under that ID and the
+    task fails, so the next request asks for the current version instead.
+    """
+    db.connect()
+    
+    try:
+        self.update_state(state="PROGRESS", meta={"progress": 10, "stage": "loading"})
+        _, version = report_cache.parse_report_id(report_id)
+        with db.driver.session() as session:
+            report_data = load_case_report_data(session, case_id, version)
+        
+        if not report_data:
+            return {"success": False, "error": "Case not found"}
+        
+        self.update_state(state="PROGRESS", meta={"progress": 40, "stage": "rendering"})
+        path = report_cache.prepare(report_id)
+        report_generator.write_case_report(
+            path,
+            report_data["case"],
+            report_data["entities"],
+            report_data["stats"]
+        )
+        
+        report_cache.prune(case_id, report_id)
+        logger.info(f"Report {report_id} written to {path}")
+        
+        return {"success": True, "report_id": report_id}
+        
+    except Exception as e:
+        logger.error(f"Report generation failed for case {case_id}: {e}")
+        return {"success": False, "error": str(e)}
+        
+    finally:
+        db.close()
+
+
+def load_case_report_data(session, case_id: str, version: int) -> dict:
+    """
+    Case details, entities and statistics needed to render a report of the
+    case at content version `version`
+    
+    Raises:
+        ValueError: if the case is at another version, before or after its
+            entities are read
+    """
+    case_stats.recompute(session, case_id)
+    record = session.run("MATCH (c:Case {id: $case_id}) RETURN c", case_id=case_id).single()
+    if not record:
+        return None
+    
+    case_node = record["c"]
+    _check_version(case_id, case_node.get("content_version") or 0, version)
+    case_data = {
+        "id": case_node["id"],
+        "title": case_node["title"],
+        "description": case_node.get("description"),
+        "status": case_node["status"],
+        "priority": case_node["priority"],
+        "tags": case_node.get("tags", []),
+        "created_at": datetime.fromtimestamp(case_node["created_at"] / 1000).isoformat(),
+        "updated_at": datetime.fromtimestamp(case_node["updated_at"] / 1000).isoformat(),
+        "entity_count": case_node.get("stat_entities") or 0,
+        "job_count": case_node.get("stat_jobs") or 0
+    }
+    
+    entities_query = """
+        MATCH (c:Case {id: $case_id})-[:CONTAINS]->(e)
+        RETURN e, [l IN labels(e) WHERE l <> 'Entity'][0] as entity_type
+    """
+    entities = []
+    for entity_record in session.run(entities_query, case_id=case_id):
+        entity_node = entity_record["e"]
+        entities.append({
+            "id": entity_node.element_id,
+            "type": entity_record["entity_type"],
+            "properties": dict(entity_node)
+        })
+    
+    # The case may have changed while its entities were read
+    record = session.run(
+        "MATCH (c:Case {id: $case_id}) RETURN coalesce(c.content_version, 0) as version", case_id=case_id
+    ).single()
+    _check_version(case_id, record["version"] if record else None, version)
+    
+    return {"case": case_data, "entities": entities, "stats": case_stats.summary(case_node)}
+
+
+def _check_version(case_id: str, current: int, requested: int):
+    if current != requested:
+        raise ValueError(
+            f"Case {case_id} changed since its report was requested "
+            f"(version {requested}, now {current})"
+        )
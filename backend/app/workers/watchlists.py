@@ -0,0 +1,71 @@
+from app.celery_app import celery_app
+from app.database import db
+from app.config import settings
+from app.workers.enrichment import refresh_entity
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# Claim the members that are due, oldest first, and move each one a whole
+# number of cadences ahead so its staggered slot is kept even after downtime
+DUE_QUERY = """
+    MATCH (w:Watchlist {enabled: true})-[r:WATCHES]->(e:Entity)
+    WHERE r.next_refresh_at <= $now
+    WITH w, r, e
+    ORDER BY r.next_refresh_at
+    LIMIT $limit
+    WITH w, r, e, toInteger(w.cadence_hours * 3600000) as cadence
+    SET r.last_refreshed_at = $now,
+        r.next_refresh_at = r.next_refresh_at
+            + (($now - r.next_refresh_at) / cadence + 1) * cadence
+    RETURN w.id as watchlist_id, e.key as key
+"""
+
+PRUNE_QUERY = """
+    MATCH (:Watchlist)-[:RECORDED]->(ev:WatchEvent)
+    WHERE ev.detected_at < $cutoff
+    WITH ev LIMIT 10000
+    DETACH DELETE ev
+    RETURN count(*) as pruned
+"""
+
+
+@celery_app.task(name="dispatch_watchlists")
+def dispatch_watchlists():
+    """
+    Enqueue refreshes for watched entities that are due
+
+    Runs every `watchlist_tick_seconds` from celery beat. At most
+    `watchlist_max_refreshes_per_tick` members are claimed per tick and
+    their refreshes are spread evenly across the tick, so provider calls
+    arrive at a steady rate instead of in bursts.
+    """
+    db.connect()
+    try:
+        now = int(time.time() * 1000)
+        with db.driver.session() as session:
+            due = session.run(
+                DUE_QUERY,
+                now=now,
+                limit=settings.watchlist_max_refreshes_per_tick
+            ).data()
+            pruned = session.run(
+                PRUNE_QUERY,
+                cutoff=now - settings.watchlist_event_retention_days * 86400000
+            ).single()["pruned"]
+
+        spacing = settings.watchlist_tick_seconds / max(len(due), 1)
+        for i, member in enumerate(due):
+            entity_type, value = member["key"].split(":", 1)
+            refresh_entity.apply_async(
+                args=[value, entity_type, member["watchlist_id"]],
+                countdown=round(i * spacing, 1)
+            )
+
+        if due or pruned:
+            logger.info(f"Dispatched {len(due)} watchlist refresh(es), pruned {pruned} event(s)")
+        return {"dispatched": len(due), "pruned": pruned}
+    finally:
+        db.close()
@@ -0,0 +1,26 @@
+"""
+Build infrastructure co-occurrence hubs from relationships created before hubs existed
+Run after migrate_entity_keys.py: python backfill_cooccurrence.py
+Name servers are not stored in the graph, so that pass resolves each domain's NS records again
+"""
+from app.database import db
+
+
+def main():
+    print("=" * 60)
+    print("Co-occurrence Hub Backfill")
+    print("=" * 60)
+
+    db.connect()
+    try:
+        updated = db.backfill_cooccurrence()
+        for kind, count in updated.items():
+            print(f"✅ {kind}: {count} membership(s) recorded")
+    finally:
+        db.close()
+
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
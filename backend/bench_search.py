@@ -0,0 +1,81 @@
+"""
+Benchmark /api/search latency as the graph grows
+Requires a running Neo4j instance (see docker-compose.yml)
+"""
+import statistics
+import time
+from app.database import db
+from app.services.search import entity_search
+
+GRAPH_SIZES = [1_000, 10_000, 50_000, 100_000]
+QUERIES = ["bench-4711", "bench-12", "example"]
+RUNS_PER_QUERY = 20
+
+
+def seed(session, start: int, end: int):
+    """Create synthetic Domain nodes flagged for cleanup"""
+    session.run(
+        """
+        UNWIND range($start, $end - 1) AS i
+        CREATE (:Domain {name: 'bench-' + toString(i) + '.example.com', bench: true})
+        """,
+        start=start,
+        end=end
+    )
+
+
+def measure(session, q: str, mode: str) -> float:
+    """Median latency in milliseconds for one query"""
+    timings = []
+    for _ in range(RUNS_PER_QUERY):
+        started = time.perf_counter()
+        entity_search.search(session, q, mode=mode, limit=20)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def cleanup(session):
+    session.run(
+        """
+        MATCH (d:Domain {bench: true})
+        CALL { WITH d DETACH DELETE d } IN TRANSACTIONS OF 10000 ROWS
+        """
+    )
+
+
+def main():
+    print("=" * 60)
+    print("Entity Search Benchmark")
+    print("=" * 60)
+
+    db.connect()
+    try:
+        with db.driver.session() as session:
+            # Wait for the full-text index to come online before timing
+            session.run("CALL db.awaitIndexes(300)")
+
+            seeded = 0
+            for size in GRAPH_SIZES:
+                # Seed in batches to keep transactions small
+                while seeded < size:
+                    batch_end = min(seeded + 10_000, size)
+                    seed(session, seeded, batch_end)
+                    seeded = batch_end
+                session.run("CALL db.awaitIndexes(300)")
+
+                print(f"\n📊 {size:,} bench nodes")
+                for q in QUERIES:
+                    for mode in ("fulltext", "prefix"):
+                        print(f"   {mode:<8} {q!r:<14} {measure(session, q, mode):7.2f} ms")
+
+            cleanup(session)
+    finally:
+        db.close()
+
+    print("\n" + "=" * 60)
+    print("✅ Benchmark completed!")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
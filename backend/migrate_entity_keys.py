@@ -0,0 +1,26 @@
+"""
+Backfill canonical entity keys for data created before the Entity key constraint
+Run once after upgrading: python migrate_entity_keys.py
+"""
+from app.database import db
+
+
+def main():
+    print("=" * 60)
+    print("Entity Key Backfill")
+    print("=" * 60)
+
+    # connect() also creates the entity_key_unique constraint
+    db.connect()
+    try:
+        updated = db.backfill_entity_keys()
+        for label, count in updated.items():
+            print(f"✅ {label}: {count} node(s) keyed")
+    finally:
+        db.close()
+
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,18 @@
 #!/bin/bash
 
-# Start Celery worker in background
-celery -A app.celery_app worker --loglevel=info --concurrency=1 &
+# Start the lookup worker in background; its concurrency follows
+# LOOKUP_WORKER_SLOTS, one process per scheduler slot
+celery -A app.celery_app worker -Q lookups -n lookups@%h --loglevel=info &
+
+# Start the background worker for provider retries, watchlist refreshes,
+# reports and maintenance, so these never occupy a lookup slot
+celery -A app.celery_app worker -Q background -n background@%h \
+    --concurrency=${BACKGROUND_WORKER_CONCURRENCY:-2} --loglevel=info &
+
+# Start Celery beat in background; it ticks the job scheduler and triggers
+# watchlist refreshes.
+# Run it in one container only when scaling out
+celery -A app.celery_app beat --loglevel=info --schedule=/tmp/celerybeat-schedule &
 
 # Start FastAPI server
-uvicorn app.main:app --host 0.0.0.0 --port 8000
+uvicorn app.main:app --host 0.0.0.0 --port ${PORT:-8000}
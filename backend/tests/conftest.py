@@ -0,0 +1,271 @@
+"""
+Shared test doubles
+"""
+from app.services.admission import TOKEN_BUCKET_SCRIPT
+from app.services.inflight import RELEASE_SCRIPT, REFRESH_SCRIPT
+from contextlib import contextmanager
+import fnmatch
+import math
+import pytest
+
+
+class FakeRedis:
+    """
+    In-memory stand-in for the subset of redis-py the services use
+
+    Values are stored as strings, like a client with decode_responses=True.
+    Expiry follows `now`, which tests move forward by hand.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.now = 1_000_000.0
+
+    # ---- Keys ----
+
+    def _live(self, key):
+        if key in self.expires and self.expires[key] <= self.now:
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def exists(self, *keys):
+        return sum(1 for key in keys if self._live(key))
+
+    def delete(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._live(key):
+                removed += 1
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return removed
+
+    def expire(self, key, seconds):
+        if not self._live(key):
+            return False
+        self.expires[key] = self.now + seconds
+        return True
+
+    def ttl(self, key):
+        if not self._live(key):
+            return -2
+        if key not in self.expires:
+            return -1
+        return int(self.expires[key] - self.now)
+
+    def keys(self, pattern="*"):
+        return [key for key in list(self.data) if self._live(key) and fnmatch.fnmatch(key, pattern)]
+
+    # ---- Strings ----
+
+    def get(self, key):
+        return self.data.get(key) if self._live(key) else None
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and self._live(key):
+            return None
+        self.data[key] = str(value)
+        self.expires.pop(key, None)
+        if ex is not None:
+            self.expires[key] = self.now + ex
+        return True
+
+    def incr(self, key, amount=1):
+        value = int(self.get(key) or 0) + amount
+        self.data[key] = str(value)
+        return value
+
+    def decr(self, key, amount=1):
+        return self.incr(key, -amount)
+
+    # ---- Hashes ----
+
+    def _hash(self, key):
+        if not self._live(key):
+            self.data[key] = {}
+        return self.data[key]
+
+    def hget(self, name, field):
+        return self._hash(name).get(field)
+
+    def hset(self, name, key=None, value=None, mapping=None):
+        fields = dict(mapping or {})
+        if key is not None:
+            fields[key] = value
+        self._hash(name).update({field: str(value) for field, value in fields.items()})
+        return len(fields)
+
+    def hmget(self, name, fields):
+        return [self._hash(name).get(field) for field in fields]
+
+    def hgetall(self, name):
+        return dict(self._hash(name))
+
+    def hincrby(self, name, field, amount=1):
+        value = int(self._hash(name).get(field) or 0) + amount
+        self._hash(name)[field] = str(value)
+        return value
+
+    def hdel(self, name, *fields):
+        return sum(1 for field in fields if self._hash(name).pop(field, None) is not None)
+
+    # ---- Lists ----
+
+    def _list(self, key):
+        if not self._live(key):
+            self.data[key] = []
+        return self.data[key]
+
+    def rpush(self, key, *values):
+        self._list(key).extend(str(value) for value in values)
+        return len(self._list(key))
+
+    def lpop(self, key):
+        items = self._list(key)
+        return items.pop(0) if items else None
+
+    def lrange(self, key, start, end):
+        items = self._list(key)
+        return items[start:] if end == -1 else items[start:end + 1]
+
+    def llen(self, key):
+        return len(self._list(key))
+
+    def lrem(self, key, count, value):
+        items = self._list(key)
+        before = len(items)
+        items[:] = [item for item in items if item != str(value)]
+        return before - len(items)
+
+    # ---- Sets ----
+
+    def _set(self, key):
+        if not self._live(key):
+            self.data[key] = set()
+        return self.data[key]
+
+    def sadd(self, key, *members):
+        before = len(self._set(key))
+        self._set(key).update(str(member) for member in members)
+        return len(self._set(key)) - before
+
+    def srem(self, key, *members):
+        before = len(self._set(key))
+        self._set(key).difference_update(str(member) for member in members)
+        return before - len(self._set(key))
+
+    def smembers(self, key):
+        return set(self._set(key))
+
+    def sismember(self, key, member):
+        return str(member) in self._set(key)
+
+    # ---- Sorted sets ----
+
+    def _zset(self, key):
+        if not self._live(key):
+            self.data[key] = {}
+        return self.data[key]
+
+    def zadd(self, key, mapping, xx=False):
+        zset = self._zset(key)
+        added = 0
+        for member, score in mapping.items():
+            if xx and member not in zset:
+                continue
+            added += member not in zset
+            zset[member] = float(score)
+        return added
+
+    def zrem(self, key, *members):
+        return sum(1 for member in members if self._zset(key).pop(member, None) is not None)
+
+    def zcard(self, key):
+        return len(self._zset(key))
+
+    def zscore(self, key, member):
+        return self._zset(key).get(member)
+
+    def zrangebyscore(self, key, low, high):
+        low, high = float(low), float(high)
+        zset = self._zset(key)
+        return [member for member, score in sorted(zset.items(), key=lambda item: item[1])
+                if low <= score <= high]
+
+    def zremrangebyscore(self, key, low, high):
+        doomed = self.zrangebyscore(key, low, high)
+        return self.zrem(key, *doomed) if doomed else 0
+
+    # ---- Coordination ----
+
+    @contextmanager
+    def lock(self, name, timeout=None, blocking_timeout=None):
+        yield
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def register_script(self, script):
+        """The services' Lua scripts, as Python"""
+        implementation = {
+            RELEASE_SCRIPT: self._release_script,
+            REFRESH_SCRIPT: self._refresh_script,
+            TOKEN_BUCKET_SCRIPT: self._token_bucket_script,
+        }[script]
+        return lambda keys=(), args=(): implementation(list(keys), list(args))
+
+    def _release_script(self, keys, args):
+        return self.delete(keys[0]) if self.get(keys[0]) == str(args[0]) else 0
+
+    def _refresh_script(self, keys, args):
+        return int(self.expire(keys[0], int(args[1]))) if self.get(keys[0]) == str(args[0]) else 0
+
+    def _token_bucket_script(self, keys, args):
+        rate, burst, now = float(args[0]), float(args[1]), float(args[2])
+        state = self.hmget(keys[0], ["tokens", "ts"])
+        tokens = float(state[0]) if state[0] is not None else burst
+        ts = float(state[1]) if state[1] is not None else now
+        tokens = min(burst, tokens + max(0, now - ts) * rate)
+        admitted, wait = 0, 0
+        if tokens >= 1:
+            tokens -= 1
+            admitted = 1
+        else:
+            wait = (1 - tokens) / rate
+        self.hset(keys[0], mapping={"tokens": tokens, "ts": now})
+        self.expire(keys[0], math.ceil(burst / rate) + 1)
+        return [admitted, str(wait)]
+
+
+class FakePipeline:
+    """Queues calls and runs them on execute(), returning their replies"""
+
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+
+        def queue(*args, **kwargs):
+            self.calls.append((method, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        replies = [method(*args, **kwargs) for method, args, kwargs in self.calls]
+        self.calls = []
+        return replies
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def fake_redis():
+    return FakeRedis()
@@ -0,0 +1,76 @@
+"""
+Token buckets and queue-depth backpressure on lookup submission
+"""
+from app.celery_app import LOOKUP_QUEUE
+from app.config import settings
+from app.services import admission as admission_module
+from app.services.admission import AdmissionController
+from types import SimpleNamespace
+import pytest
+import redis
+
+
+@pytest.fixture
+def controller(fake_redis, monkeypatch):
+    clock = SimpleNamespace(now=1_000_000.0)
+    pending = SimpleNamespace(count=0)
+    monkeypatch.setattr(admission_module.time, "time", lambda: clock.now)
+    monkeypatch.setattr(admission_module, "job_scheduler", SimpleNamespace(pending_count=lambda: pending.count))
+    monkeypatch.setattr(settings, "lookup_rate_per_minute", 60)
+    monkeypatch.setattr(settings, "lookup_burst", 3)
+    monkeypatch.setattr(settings, "lookup_max_queue_depth", 10)
+    monkeypatch.setattr(settings, "lookup_worker_slots", 2)
+    monkeypatch.setattr(settings, "lookup_default_duration_seconds", 30)
+    return AdmissionController(fake_redis), clock, pending
+
+
+def test_burst_then_refill_at_the_rate(controller):
+    admission, clock, _ = controller
+
+    assert [admission.admit("client-a")["admitted"] for _ in range(3)] == [True, True, True]
+    rejected = admission.admit("client-a")
+    assert (rejected["admitted"], rejected["reason"], rejected["retry_after"]) == (False, "rate_limited", 1)
+    # Buckets are per client
+    assert admission.admit("client-b")["admitted"]
+
+    clock.now += 1
+    assert admission.admit("client-a")["admitted"]
+    assert not admission.admit("client-a")["admitted"]
+
+
+def test_full_queue_rejects_without_spending_tokens(controller, fake_redis):
+    admission, _, pending = controller
+    pending.count = 4
+    for _ in range(6):
+        fake_redis.rpush(LOOKUP_QUEUE, "task")
+
+    decision = admission.admit("client-a")
+
+    assert (decision["admitted"], decision["reason"], decision["queue_depth"]) == (False, "queue_full", 10)
+    # One job over the limit, two slots, 30s per job
+    assert decision["retry_after"] == 15
+
+    pending.count = 0
+    assert [admission.admit("client-a")["admitted"] for _ in range(3)] == [True, True, True]
+
+
+def test_wait_estimate_follows_observed_durations(controller, fake_redis):
+    admission, _, _ = controller
+    for _ in range(4):
+        fake_redis.rpush(LOOKUP_QUEUE, "task")
+    assert admission.admit("client-a")["estimated_wait_seconds"] == 60.0
+
+    admission.record_duration(10)
+    admission.record_duration(20)
+
+    assert admission.admit("client-a")["estimated_wait_seconds"] == 24.0
+
+
+def test_redis_outage_admits(controller, monkeypatch):
+    admission, _, _ = controller
+
+    def unavailable(*args, **kwargs):
+        raise redis.ConnectionError("down")
+    monkeypatch.setattr(admission.client, "llen", unavailable)
+
+    assert admission.admit("client-a")["admitted"]
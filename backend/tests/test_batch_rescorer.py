@@ -0,0 +1,135 @@
+"""
+Rescoring the graph in vectorized chunks
+"""
+from app.services import batch_rescorer as rescorer_module
+from app.services.batch_rescorer import BatchRescorer
+from app.services.risk_rules import RuleSet
+from pathlib import Path
+import json
+import pytest
+
+
+RULES = json.loads((Path(__file__).parent.parent / "app" / "risk_rules.json").read_text())
+RULE_SET = RuleSet(RULES)
+
+DOMAINS = [
+    {},
+    {"domain_age_days": 3, "vt_malicious": 2, "vt_reputation": 10,
+     "otx_threat_score": 55, "otx_pulse_count": 1, "malicious_score": 9},
+    {"domain_age_days": 45, "vt_suspicious": 1, "otx_threat_score": 12, "otx_pulse_count": 4},
+    {"domain_age_days": 4000, "vt_reputation": 80},
+    {"domain_age_days": 10, "vt_malicious": 30},
+]
+
+
+class Result(list):
+    def data(self):
+        return list(self)
+
+
+class GraphSession:
+    """Serves the rescorer's key-ordered fetches from stored nodes and applies its writes"""
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.fetches = 0
+        self.written = []
+
+    def run(self, query, **params):
+        if "UNWIND $rows" in query:
+            self.written.append(params["rows"])
+            for row in params["rows"]:
+                self.nodes[row["key"]].update(
+                    risk_score=row["score"], risk_base_score=row["base_score"], risk_level=row["level"],
+                    risk_reasons=row["reasons"], risk_rules_version=row["rules_version"],
+                    risk_fingerprint=row["fingerprint"], risk_history=row["history"]
+                )
+            return Result()
+
+        self.fetches += 1
+        keys = sorted(key for key in self.nodes
+                      if key.startswith(params["prefix"]) and key > params["after_key"])
+        return Result({
+            "key": key,
+            "props": self.nodes[key],
+            "old_score": self.nodes[key].get("risk_score"),
+            "old_level": self.nodes[key].get("risk_level"),
+            "old_base_score": self.nodes[key].get("risk_base_score", self.nodes[key].get("risk_score")),
+            "linked_score": None,
+            "linked_reason": None,
+            "old_version": self.nodes[key].get("risk_rules_version"),
+            "old_fingerprint": self.nodes[key].get("risk_fingerprint"),
+            "history": self.nodes[key].get("risk_history")
+        } for key in keys[:params["limit"]])
+
+
+@pytest.fixture
+def propagated(monkeypatch):
+    keys = []
+    monkeypatch.setattr(rescorer_module.risk_engine, "rule_set", lambda: RULE_SET)
+    monkeypatch.setattr(rescorer_module.risk_propagator, "propagate",
+                        lambda session, changed, rule_set: keys.extend(changed))
+    return keys
+
+
+def _graph():
+    return GraphSession({f"domain:d{i}.example": dict(props) for i, props in enumerate(DOMAINS)})
+
+
+def test_rescore_writes_the_same_risk_as_scoring_one_at_a_time(propagated):
+    session = _graph()
+
+    stats = BatchRescorer().rescore(session, entity_types=["domain"], batch_size=2)
+
+    assert (stats["scanned"], stats["updated"]) == (5, 5)
+    # Three chunks of at most two, then the empty read that ends the type
+    assert [len(rows) for rows in session.written] == [2, 2, 1]
+    assert session.fetches == 4
+    for i, props in enumerate(DOMAINS):
+        node = session.nodes[f"domain:d{i}.example"]
+        scalar = RULE_SET.evaluate("domain", props)
+        assert node["risk_score"] == scalar["score"]
+        assert node["risk_level"] == scalar["level"]
+        assert node["risk_reasons"] == scalar["reasons"]
+        assert node["risk_rules_version"] == RULE_SET.version
+    assert sorted(propagated) == sorted(session.nodes)
+
+
+def test_resume_continues_after_the_cursor(propagated):
+    session = _graph()
+
+    stats = BatchRescorer().rescore(session, entity_types=["domain"], batch_size=2,
+                                    resume={"entity_type": "domain", "after_key": "domain:d2.example"})
+
+    assert stats["scanned"] == 2
+    assert [row["key"] for rows in session.written for row in rows] == ["domain:d3.example", "domain:d4.example"]
+
+
+def test_unknown_entity_type_is_rejected(propagated):
+    with pytest.raises(ValueError):
+        BatchRescorer().rescore(_graph(), entity_types=["planet"])
+
+
+def test_second_pass_rescores_only_changed_inputs(propagated):
+    session = _graph()
+    BatchRescorer().rescore(session, entity_types=["domain"])
+    session.written.clear()
+
+    session.nodes["domain:d3.example"]["vt_malicious"] = 12
+    session.nodes["domain:d1.example"]["registrar"] = "Example Registrar"
+    stats = BatchRescorer().rescore(session, entity_types=["domain"])
+
+    # Only the entity whose risk inputs changed is rescored; other properties do not count
+    assert (stats["scanned"], stats["updated"]) == (5, 1)
+    assert [row["key"] for rows in session.written for row in rows] == ["domain:d3.example"]
+
+
+def test_new_rule_version_rescores_unchanged_inputs(propagated, monkeypatch):
+    session = _graph()
+    BatchRescorer().rescore(session, entity_types=["domain"])
+
+    bumped = RuleSet({**RULES, "version": "bumped"})
+    monkeypatch.setattr(rescorer_module.risk_engine, "rule_set", lambda: bumped)
+    stats = BatchRescorer().rescore(session, entity_types=["domain"])
+
+    assert stats["updated"] == 5
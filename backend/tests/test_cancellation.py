@@ -0,0 +1,105 @@
+"""
+Cooperative cancellation of enrichment jobs
+"""
+from app.services.cancellation import CancellationRegistry
+from app.workers import enrichment
+from types import SimpleNamespace
+import pytest
+
+
+class Record(dict):
+    def single(self):
+        return self
+
+
+class Result:
+    def __init__(self, record=None):
+        self.record = record
+
+    def single(self):
+        return self.record
+
+
+class Database:
+    """ScanJob nodes by ID, updated by the start and cancel queries the worker runs"""
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.driver = self
+
+    def connect(self):
+        pass
+
+    def close(self):
+        pass
+
+    def session(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, job_id=None, **params):
+        job = self.jobs.get(job_id)
+        if "MERGE (j:ScanJob" in query:
+            job = self.jobs.setdefault(job_id, {})
+        if job is None:
+            return Result()
+        if "j.status = 'running'" in query:
+            if job.get("status") == "cancelled" and "<> 'cancelled'" in query:
+                return Result()
+            job.update(status="running", attempts=job.get("attempts", 0) + 1)
+            return Result(Record(attempts=job["attempts"], completed=[]))
+        if "j.status = 'cancelled'" in query and job.get("status") in ("pending", "running"):
+            job["status"] = "cancelled"
+        return Result()
+
+
+@pytest.fixture
+def worker(fake_redis, monkeypatch):
+    """Run enrich_entity against in-memory jobs; returns (jobs, cancellation registry, run)"""
+    registry = CancellationRegistry(fake_redis)
+    released = []
+    monkeypatch.setattr(enrichment, "cancellation", registry)
+    monkeypatch.setattr(enrichment, "job_scheduler", SimpleNamespace(
+        renew=lambda job_id, tenant: None, finish=lambda job_id, tenant: None
+    ))
+    monkeypatch.setattr(enrichment, "inflight_index", SimpleNamespace(
+        release=lambda entity_type, query, job_id: released.append(job_id)
+    ))
+
+    def run(jobs):
+        monkeypatch.setattr(enrichment, "db", Database(jobs))
+        return enrichment.enrich_entity.run("job-1", "example.com", "domain", {}, 0, "tenant-a", [])
+    return registry, run, released
+
+
+def test_job_cancelled_after_the_check_is_not_restarted(worker):
+    _, run, released = worker
+    # The API marked the job cancelled, but its Redis flag was not visible yet
+    jobs = {"job-1": {"status": "cancelled"}}
+
+    assert run(jobs) == {"success": False, "cancelled": True}
+    assert jobs["job-1"]["status"] == "cancelled"
+    assert released == ["job-1"]
+
+
+def test_deleted_job_is_not_recreated(worker):
+    _, run, _ = worker
+    jobs = {}
+
+    assert run(jobs) == {"success": False, "cancelled": True}
+    assert jobs == {}
+
+
+def test_worker_records_the_cancellation_itself(worker):
+    registry, run, _ = worker
+    # Flag set, but the API's status write lost the race with the worker's start
+    registry.request("job-1")
+    jobs = {"job-1": {"status": "running"}}
+
+    assert run(jobs) == {"success": False, "cancelled": True}
+    assert jobs["job-1"]["status"] == "cancelled"
@@ -0,0 +1,49 @@
+"""
+Incrementally maintained case counters
+"""
+from app.services.case_stats import case_stats, membership_update, risk_update, version_bump
+
+
+def test_summary_reads_the_counters():
+    case = {
+        "stat_entities": 5, "stat_emails": 1, "stat_domains": 3, "stat_ips": 1,
+        "stat_risk_high": 1, "stat_risk_medium": 2, "stat_risk_low": 1,
+        "stat_risk_sum": 170, "stat_risk_scored": 4
+    }
+
+    summary = case_stats.summary(case)
+
+    assert summary["total_entities"] == 5
+    assert summary["entity_breakdown"] == {"emails": 1, "domains": 3, "ips": 1}
+    assert summary["risk_breakdown"] == {"high": 1, "medium": 2, "low": 1}
+    assert summary["average_risk_score"] == 42.5
+
+
+def test_uncounted_case_summarises_as_empty():
+    summary = case_stats.summary({})
+
+    assert summary["total_entities"] == 0
+    assert summary["average_risk_score"] == 0
+
+
+def test_membership_update_moves_every_counter_by_the_sign():
+    added = membership_update(1, case="c", entity="e")
+    removed = membership_update(-1, case="c", entity="e")
+
+    assert "c.stat_entities = coalesce(c.stat_entities, 0) + 1" in added
+    assert "c.stat_domains = coalesce(c.stat_domains, 0) + CASE WHEN e:Domain THEN -1 ELSE 0 END" in removed
+    assert "+ CASE WHEN e.risk_level = 'HIGH' THEN 1 ELSE 0 END" in added
+    assert "+ -1 * coalesce(e.risk_score, 0)" in removed
+    assert version_bump("c") in added
+
+
+def test_risk_update_bumps_the_version_only_on_change():
+    assignments = risk_update(case="c", source="row.")
+
+    assert assignments.startswith(
+        "c.content_version = coalesce(c.content_version, 0) + CASE WHEN "
+        "coalesce(row.score, -1) <> coalesce(row.old_score, -1) "
+        "OR coalesce(row.level, '') <> coalesce(row.old_level, '') THEN 1 ELSE 0 END"
+    )
+    assert "+ coalesce(row.score, 0) - coalesce(row.old_score, 0)" in assignments
+    assert "- CASE WHEN row.old_level = 'LOW' THEN 1 ELSE 0 END" in assignments
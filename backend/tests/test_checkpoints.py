@@ -0,0 +1,123 @@
+"""
+Resuming enrichment jobs from per-provider checkpoints
+"""
+from app.config import settings
+from app.workers import enrichment
+from types import SimpleNamespace
+import asyncio
+import pytest
+
+
+class Record(dict):
+    pass
+
+
+class Result:
+    def __init__(self, record=None):
+        self.record = record
+
+    def single(self):
+        return self.record
+
+
+class Database:
+    """One ScanJob node, updated by the start, give-up and checkpoint queries"""
+
+    def __init__(self, job):
+        self.job = job
+        self.driver = self
+
+    def connect(self):
+        pass
+
+    def close(self):
+        pass
+
+    def session(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, job_id=None, **params):
+        job = self.job
+        if "j.status = 'running'" in query:
+            job.update(status="running", attempts=job.get("attempts", 0) + 1)
+            return Result(Record(attempts=job["attempts"], completed=job.get("completed_providers", [])))
+        if "j.status = 'failed'" in query:
+            job.update(status="failed", errors=job.get("errors", []) + [params["error"]])
+        elif "completed_providers" in query and params["provider"] not in job.get("completed_providers", []):
+            job["completed_providers"] = job.get("completed_providers", []) + [params["provider"]]
+        return Result()
+
+
+class Provider:
+    def __init__(self, name):
+        self.name = name
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    """Providers succeed unless named in `failing`; returns (called names, failing names)"""
+    called, failing = [], set()
+
+    async def call_provider(job_id, provider, query, entity_type):
+        called.append(provider.name)
+        return {"success": provider.name not in failing, "provider": provider.name}
+
+    async def process(query, entity_type, result):
+        pass
+
+    monkeypatch.setattr(enrichment, "_call_provider", call_provider)
+    monkeypatch.setattr(enrichment, "_process_provider_result", process)
+    monkeypatch.setattr(enrichment, "_mark_enriched", lambda key, name, digest: None)
+    monkeypatch.setattr(enrichment, "inflight_index", SimpleNamespace(refresh=lambda *args: None))
+    monkeypatch.setattr(enrichment, "cancellation", SimpleNamespace(check=lambda job_id: None))
+    return called, failing
+
+
+def _run(completed=frozenset()):
+    providers = [Provider("whois"), Provider("dns"), Provider("virustotal")]
+    return asyncio.run(enrichment._run_providers("job-1", "example.com", "domain", providers, completed=completed))
+
+
+def test_successful_providers_are_checkpointed(worker, monkeypatch):
+    called, failing = worker
+    failing.add("virustotal")
+    job = {}
+    monkeypatch.setattr(enrichment, "db", Database(job))
+
+    _run()
+
+    assert called == ["whois", "dns", "virustotal"]
+    assert job["completed_providers"] == ["whois", "dns"]
+
+
+def test_resumed_attempt_runs_only_the_rest(worker, monkeypatch):
+    called, _ = worker
+    job = {"completed_providers": ["whois", "dns"]}
+    monkeypatch.setattr(enrichment, "db", Database(job))
+
+    _run(completed=set(job["completed_providers"]))
+
+    assert called == ["virustotal"]
+    assert job["completed_providers"] == ["whois", "dns", "virustotal"]
+
+
+def test_job_that_keeps_dying_is_given_up_on(worker, monkeypatch):
+    called, _ = worker
+    monkeypatch.setattr(settings, "enrichment_max_attempts", 3)
+    job = {"attempts": 3, "completed_providers": ["whois"]}
+    monkeypatch.setattr(enrichment, "db", Database(job))
+
+    result = asyncio.run(enrichment._enrich_entity_async("job-1", "example.com", "domain", {}, 0, ["whois", "dns"]))
+
+    assert result == {"success": False, "error": "Gave up after 3 attempts"}
+    assert job["status"] == "failed"
+    assert called == []
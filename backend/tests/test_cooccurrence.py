@@ -0,0 +1,107 @@
+"""
+Co-occurrence hub memberships following an entity's current infrastructure
+"""
+from app.config import settings
+from app.database import Neo4jDatabase
+from app.workers import enrichment
+import asyncio
+import pytest
+
+
+class HubGraph:
+    """
+    InfraHub nodes and MEMBER_OF edges, updated the way the membership
+    statement does: leave hubs of the kind not in $values, join $hubs
+    """
+
+    def __init__(self):
+        self.hubs = {}          # hub key -> {"kind", "value", "member_count", "top_members"}
+        self.members = set()    # (member key, hub key)
+        self.statements = 0
+
+    def session(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, member_key, kind, values, hubs, top_k):
+        assert "DELETE old" in query and "MERGE (m)-[r:MEMBER_OF]->(h)" in query
+        self.statements += 1
+        for member, hub_key in list(self.members):
+            hub = self.hubs[hub_key]
+            if member == member_key and hub["kind"] == kind and hub["value"] not in values:
+                hub["member_count"] -= 1
+                hub["top_members"] = [k for k in hub["top_members"] if k != member_key]
+                self.members.discard((member, hub_key))
+        for row in hubs:
+            hub = self.hubs.setdefault(row["key"], {"kind": kind, "value": row["value"],
+                                                    "member_count": 0, "top_members": []})
+            if (member_key, row["key"]) not in self.members:
+                self.members.add((member_key, row["key"]))
+                hub["member_count"] += 1
+            hub["top_members"] = ([member_key] + [k for k in hub["top_members"] if k != member_key])[:top_k]
+
+    def hubs_of(self, member_key):
+        return sorted(hub_key for member, hub_key in self.members if member == member_key)
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    monkeypatch.setattr(settings, "cooccurrence_top_k", 5)
+    graph = HubGraph()
+    db = Neo4jDatabase()
+    db.driver = graph
+    db.merge_ip_node = lambda *args: None
+    db.create_relationship = lambda *args: None
+    monkeypatch.setattr(enrichment, "db", db)
+    return graph
+
+
+def _dns(query, a_records, ns_records):
+    result = {"success": True, "provider": "dns", "records": {"A": a_records, "NS": ns_records}}
+    asyncio.run(enrichment._process_provider_result(query, "domain", result))
+
+
+def test_changed_records_move_the_domain_between_hubs(graph):
+    _dns("a.example", ["192.0.2.1"], ["ns1.old.example."])
+    _dns("b.example", ["192.0.2.1"], ["ns1.old.example."])
+
+    _dns("a.example", ["198.51.100.7"], ["NS1.new.example."])
+
+    assert graph.hubs_of("domain:a.example") == ["ip:198.51.100.7", "nameserver:ns1.new.example"]
+    assert graph.hubs["ip:192.0.2.1"]["member_count"] == 1
+    assert graph.hubs["ip:192.0.2.1"]["top_members"] == ["domain:b.example"]
+    assert graph.hubs["nameserver:ns1.old.example"]["member_count"] == 1
+    assert graph.hubs["ip:198.51.100.7"]["member_count"] == 1
+
+
+def test_unchanged_records_keep_counts(graph):
+    _dns("a.example", ["192.0.2.1", "192.0.2.2"], ["ns1.example"])
+    _dns("a.example", ["192.0.2.2", "192.0.2.1"], ["ns1.example"])
+
+    assert graph.hubs["ip:192.0.2.1"]["member_count"] == 1
+    assert graph.hubs["ip:192.0.2.2"]["member_count"] == 1
+
+
+def test_failed_lookup_leaves_memberships_alone(graph):
+    _dns("a.example", ["192.0.2.1"], ["ns1.example"])
+    statements = graph.statements
+
+    # The DNS provider reports lookups that errored as empty record lists
+    _dns("a.example", [], [])
+
+    assert graph.statements == statements
+    assert graph.hubs_of("domain:a.example") == ["ip:192.0.2.1", "nameserver:ns1.example"]
+
+
+def test_changed_asn_moves_the_ip(graph):
+    db = enrichment.db
+    db.record_cooccurrence("asn", [64500], "IP", "192.0.2.1")
+    db.record_cooccurrence("asn", [64501], "IP", "192.0.2.1")
+
+    assert graph.hubs_of("ip:192.0.2.1") == ["asn:64501"]
+    assert graph.hubs["asn:64500"]["member_count"] == 0
@@ -0,0 +1,66 @@
+"""
+Resolving entity references through canonical keys
+"""
+from app.database import Neo4jDatabase, entity_key
+
+
+class Session:
+    def __init__(self):
+        self.runs = []
+
+    def run(self, query, **params):
+        self.runs.append((query, params))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def test_canonical_keys_are_lowercase_label_and_value():
+    assert entity_key("Domain", "example.com") == "domain:example.com"
+    assert entity_key("IP", "192.0.2.1") == "ip:192.0.2.1"
+
+
+def test_bare_value_with_a_type_resolves_to_one_key():
+    clause, params = Neo4jDatabase().entity_match("e", "example.com", "domain")
+    assert clause == "MATCH (e:Entity) WHERE e.key IN $entity_keys"
+    assert params == {"entity_keys": ["domain:example.com"]}
+
+
+def test_bare_value_without_a_type_tries_every_searchable_label():
+    _, params = Neo4jDatabase().entity_match("e", "Acme Corp")
+    assert params["entity_keys"] == [
+        "email:Acme Corp", "domain:Acme Corp", "ip:Acme Corp", "breach:Acme Corp", "organization:Acme Corp"
+    ]
+
+
+def test_canonical_key_is_used_as_is():
+    _, params = Neo4jDatabase().entity_match("e", "ip:192.0.2.1")
+    assert params == {"entity_keys": ["ip:192.0.2.1"]}
+
+    # A key of another type is treated as a bare value of the requested type
+    _, params = Neo4jDatabase().entity_match("e", "ip:192.0.2.1", "domain")
+    assert params == {"entity_keys": ["domain:ip:192.0.2.1"]}
+
+
+def test_element_ids_match_by_id():
+    element_id = "4:0f2b6c8e-1d3a-4b5c-9e7f-0123456789ab:42"
+    clause, params = Neo4jDatabase().entity_match("n", element_id)
+    assert clause == "MATCH (n:Entity) WHERE elementId(n) = $entity_ref"
+    assert params == {"entity_ref": element_id}
+
+
+def test_relationships_between_entities_match_on_the_key():
+    db = Neo4jDatabase()
+    session = Session()
+    db.driver = type("Driver", (), {"session": lambda self: session})()
+
+    db.create_relationship("Domain", "name", "example.com", "Organization", "name", "Acme", "REGISTERED_WITH")
+
+    query, params = session.runs[0]
+    assert "MATCH (a:Entity {key: $from_value})" in query
+    assert "MATCH (b:Entity {key: $to_value})" in query
+    assert params["from_value"] == "domain:example.com"
+    assert params["to_value"] == "organization:Acme"
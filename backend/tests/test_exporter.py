@@ -0,0 +1,99 @@
+"""
+Streaming case and job exports
+"""
+from app.services.exporter import Exporter
+import csv
+import io
+import json
+
+
+class Node(dict):
+    def __init__(self, label, **properties):
+        super().__init__(**properties)
+        self.labels = {"Entity", label}
+
+
+DOMAIN = Node("Domain", key="domain:example.com", name="example.com", risk_score=40, risk_level="MEDIUM",
+              tags=["phishing", "new"])
+IP = Node("IP", key="ip:192.0.2.1", address="192.0.2.1")
+ORG = Node("Organization", key="organization:Acme", name="Acme")
+
+
+class ExportSession:
+    """Streams entity and relationship records, counting how many were pulled"""
+
+    def __init__(self, entities, relationships):
+        self.entities = entities
+        self.relationships = relationships
+        self.pulled = 0
+
+    def run(self, query, **params):
+        if "rel_type" in query:
+            rows = [{"a": a, "rel_type": rel_type, "b": b} for a, rel_type, b in self.relationships]
+        else:
+            rows = [{"e": node} for node in self.entities]
+        for row in rows:
+            self.pulled += 1
+            yield row
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def _driver(session, sizes=None):
+    def open_session(self, fetch_size=None):
+        if sizes is not None:
+            sizes.append(fetch_size)
+        return session
+    return type("Driver", (), {"session": open_session})()
+
+
+def _export(fmt, entities=(DOMAIN, IP, ORG), relationships=((DOMAIN, "RESOLVES_TO", IP),)):
+    session = ExportSession(list(entities), list(relationships))
+    return "".join(Exporter().stream(_driver(session), "case", "case-1", fmt))
+
+
+def test_ndjson_has_one_line_per_entity_and_relationship():
+    lines = [json.loads(line) for line in _export("ndjson").splitlines()]
+
+    assert [line["type"] for line in lines] == ["entity", "entity", "entity", "relationship"]
+    assert lines[0]["label"] == "Domain" and lines[0]["key"] == "domain:example.com"
+    assert lines[3] == {"type": "relationship", "relationship": "RESOLVES_TO",
+                        "source": "domain:example.com", "target": "ip:192.0.2.1"}
+
+
+def test_csv_is_a_flat_entity_list():
+    rows = list(csv.reader(io.StringIO(_export("csv"))))
+
+    assert rows[0][:3] == ["type", "value", "key"]
+    assert rows[1] == ["Domain", "example.com", "domain:example.com", "40", "MEDIUM", "", "", "phishing;new"]
+    assert len(rows) == 4
+
+
+def test_stix_bundle_uses_deterministic_ids():
+    first = json.loads(_export("stix"))
+    second = json.loads(_export("stix"))
+
+    objects = {o["type"]: o for o in first["objects"]}
+    assert first["type"] == "bundle"
+    assert set(objects) == {"domain-name", "ipv4-addr", "identity", "relationship"}
+    assert objects["domain-name"]["x_osint_risk_score"] == 40
+    assert objects["relationship"]["relationship_type"] == "resolves-to"
+    assert objects["relationship"]["source_ref"] == objects["domain-name"]["id"]
+    assert objects["relationship"]["target_ref"] == objects["ipv4-addr"]["id"]
+    assert [o["id"] for o in first["objects"]] == [o["id"] for o in second["objects"]]
+
+
+def test_records_are_pulled_as_the_client_reads():
+    session = ExportSession([Node("Domain", key=f"domain:d{i}.example", name=f"d{i}.example")
+                             for i in range(5000)], [])
+    sizes = []
+
+    chunks = Exporter().stream(_driver(session, sizes), "job", "job-1", "ndjson")
+    next(chunks)
+
+    assert sizes == [Exporter.BATCH_SIZE]
+    assert session.pulled == 1
@@ -0,0 +1,101 @@
+"""
+Reusing provider data that is still fresh
+"""
+from app.workers import enrichment
+from types import SimpleNamespace
+import asyncio
+import time
+import pytest
+
+
+HOUR_MS = 3600 * 1000
+
+
+class Result:
+    def __init__(self, record=None):
+        self.record = record
+
+    def single(self):
+        return self.record
+
+
+class Database:
+    """One entity node, read by the freshness check"""
+
+    def __init__(self, node):
+        self.node = node
+        self.driver = self
+
+    def session(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, key=None, **params):
+        return Result({"n": self.node} if self.node is not None and key == "domain:example.com" else None)
+
+
+class Provider:
+    def __init__(self, name):
+        self.name = name
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Run providers without network or graph writes; returns the names called"""
+    called = []
+
+    async def call_provider(job_id, provider, query, entity_type):
+        called.append(provider.name)
+        return {"success": True, "provider": provider.name}
+
+    async def process(query, entity_type, result):
+        pass
+
+    monkeypatch.setattr(enrichment, "_call_provider", call_provider)
+    monkeypatch.setattr(enrichment, "_process_provider_result", process)
+    monkeypatch.setattr(enrichment, "_mark_enriched", lambda key, name, digest: None)
+    monkeypatch.setattr(enrichment, "_checkpoint", lambda job_id, name: None)
+    monkeypatch.setattr(enrichment, "inflight_index", SimpleNamespace(refresh=lambda *args: None))
+    monkeypatch.setattr(enrichment, "cancellation", SimpleNamespace(check=lambda job_id: None))
+    return called
+
+
+def test_providers_within_the_max_age_are_fresh(monkeypatch):
+    now_ms = time.time() * 1000
+    monkeypatch.setattr(enrichment, "db", Database({
+        "enriched_at_whois": now_ms - 2 * HOUR_MS,
+        "enriched_at_virustotal": now_ms - 30 * HOUR_MS,
+    }))
+
+    fresh = enrichment._fresh_providers("domain:example.com", ["whois", "virustotal", "dns"], 24)
+
+    assert fresh == {"whois"}
+
+
+def test_nothing_is_fresh_without_a_max_age_or_a_node(monkeypatch):
+    monkeypatch.setattr(enrichment, "db", Database({"enriched_at_whois": time.time() * 1000}))
+    assert enrichment._fresh_providers("domain:example.com", ["whois"], 0) == set()
+
+    monkeypatch.setattr(enrichment, "db", Database(None))
+    assert enrichment._fresh_providers("domain:example.com", ["whois"], 24) == set()
+
+
+def test_fresh_providers_are_skipped_but_closed(calls):
+    providers = [Provider("whois"), Provider("dns"), Provider("virustotal")]
+
+    results = asyncio.run(enrichment._run_providers(
+        "job-1", "example.com", "domain", providers, fresh={"whois", "virustotal"}
+    ))
+
+    assert calls == ["dns"]
+    assert [result["provider"] for result in results] == ["dns"]
+    assert all(provider.closed for provider in providers)
@@ -0,0 +1,80 @@
+"""
+Chunked deletes and orphan collection
+"""
+from app.services.garbage_collector import GarbageCollector
+
+
+class Result:
+    def __init__(self, record):
+        self.record = record
+
+    def single(self):
+        return self.record
+
+
+class RecordingSession:
+    """Records each query and answers it with the next canned record"""
+
+    def __init__(self, *records):
+        self.records = list(records)
+        self.runs = []
+
+    def run(self, query, **params):
+        self.runs.append((query, params))
+        return Result(self.records.pop(0) if self.records else None)
+
+
+def test_relationships_are_deleted_in_chunks_before_the_node():
+    session = RecordingSession(None, None, {"deleted": 1})
+
+    deleted = GarbageCollector().delete_node(session, "MATCH (n:Case {id: $case_id})", {"case_id": "c1"},
+                                             batch_size=500)
+
+    assert deleted == 1
+    (outgoing, chunk_params), (incoming, _), (final, _) = session.runs
+    for chunked in (outgoing, incoming):
+        assert "IN TRANSACTIONS OF $batch_size ROWS" in chunked and "DELETE r" in chunked
+    assert chunk_params == {"batch_size": 500, "case_id": "c1"}
+    assert "DETACH DELETE n" in final
+
+
+def test_self_loops_are_matched_by_one_direction_only():
+    session = RecordingSession(None, None, {"deleted": 1})
+
+    GarbageCollector().delete_node(session, "MATCH (n:Case {id: $case_id})", {"case_id": "c1"})
+
+    patterns = [query.split("MATCH (n)", 1)[1].split()[0] for query, _ in session.runs[:2]]
+    assert patterns == ["-[r]->()", "<-[r]-()"]
+
+
+def test_dry_run_only_counts():
+    session = RecordingSession({"orphans": 3, "sample": ["domain:a", "domain:b", "domain:c"]})
+
+    stats = GarbageCollector().collect(session, dry_run=True)
+
+    assert len(session.runs) == 1
+    assert "MATCH (e:Entity)" in session.runs[0][0]
+    assert (stats["orphans"], stats["deleted"], stats["sample"]) == (3, 0, ["domain:a", "domain:b", "domain:c"])
+
+
+def test_candidates_are_checked_and_deleted_in_chunks():
+    session = RecordingSession({"orphans": 2, "sample": ["domain:a", "ip:192.0.2.1"]},
+                               {"deleted": 2}, {"deleted": 1})
+
+    stats = GarbageCollector().collect(session, candidate_keys=["domain:a", "ip:192.0.2.1"], batch_size=100)
+
+    count, delete, hubs = session.runs
+    assert all("UNWIND $keys" in query for query, _ in (count, delete))
+    assert delete[1] == {"keys": ["domain:a", "ip:192.0.2.1"], "batch_size": 100}
+    assert "IN TRANSACTIONS OF $batch_size ROWS" in delete[0]
+    assert "h.member_count <= 0" in hubs[0]
+    assert (stats["deleted"], stats["hubs_deleted"]) == (2, 1)
+
+
+def test_nothing_to_collect_runs_no_deletes():
+    session = RecordingSession({"orphans": 0, "sample": []})
+
+    stats = GarbageCollector().collect(session, candidate_keys=[])
+
+    assert len(session.runs) == 1
+    assert stats["deleted"] == 0
@@ -0,0 +1,74 @@
+"""
+In-flight lookup claims
+"""
+from app.config import settings
+from app.services import scheduler
+from app.services.inflight import InflightIndex
+from app.services.scheduler import JobScheduler
+import pytest
+
+
+@pytest.fixture
+def index(fake_redis, monkeypatch):
+    monkeypatch.setattr(settings, "lookup_dedup_ttl_seconds", 600)
+    return InflightIndex(fake_redis)
+
+
+def test_second_lookup_finds_the_holder(index):
+    assert index.claim("domain", "Example.com", "job-1") is None
+    assert index.claim("domain", "example.com ", "job-2") == "job-1"
+
+
+def test_release_only_drops_the_jobs_own_claim(index):
+    index.claim("domain", "example.com", "job-1")
+    index.release("domain", "example.com", "job-2")
+    assert index.claim("domain", "example.com", "job-3") == "job-1"
+
+    index.release("domain", "example.com", "job-1")
+    assert index.claim("domain", "example.com", "job-3") is None
+
+
+def test_refresh_keeps_a_long_job_deduplicated(index, fake_redis):
+    index.claim("domain", "example.com", "job-1")
+    for _ in range(5):
+        fake_redis.now += 500
+        index.refresh("domain", "example.com", "job-1")
+    assert index.claim("domain", "example.com", "job-2") == "job-1"
+
+    # Without a refresh the claim still lapses, e.g. after a worker died
+    fake_redis.now += 601
+    assert index.claim("domain", "example.com", "job-2") is None
+
+
+def test_refresh_covers_the_wait_for_a_retry(index, fake_redis):
+    index.claim("domain", "example.com", "job-1")
+    index.refresh("domain", "example.com", "job-1", wait_seconds=1200)
+
+    fake_redis.now += 1500
+    assert index.claim("domain", "example.com", "job-2") == "job-1"
+
+
+def test_refresh_does_not_extend_another_jobs_claim(index, fake_redis):
+    index.claim("domain", "example.com", "job-1")
+    fake_redis.now += 500
+    index.refresh("domain", "example.com", "job-2")
+
+    fake_redis.now += 101
+    assert index.claim("domain", "example.com", "job-2") is None
+
+
+def test_dispatch_renews_a_claim_that_waited_in_the_queue(index, fake_redis, monkeypatch):
+    monkeypatch.setattr(scheduler, "inflight_index", index)
+    monkeypatch.setattr(JobScheduler, "_send", lambda self, job, tenant: None)
+    monkeypatch.setattr(settings, "lookup_worker_slots", 1)
+    jobs = JobScheduler(fake_redis)
+
+    jobs.submit({"job_id": "job-0", "query": "other.example", "entity_type": "domain"}, "tenant-a")
+    index.claim("domain", "example.com", "job-1")
+    jobs.submit({"job_id": "job-1", "query": "example.com", "entity_type": "domain"}, "tenant-b")
+
+    fake_redis.now += 500
+    jobs.finish("job-0", "tenant-a")
+
+    fake_redis.now += 500
+    assert index.claim("domain", "example.com", "job-2") == "job-1"
@@ -0,0 +1,81 @@
+"""
+Keyset pagination of the job listing
+"""
+from app import main
+from app.models import JobStatus
+from fastapi import HTTPException
+import asyncio
+import pytest
+
+
+class JobSession:
+    """Evaluates the listing's filter, order and limit over in-memory jobs"""
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.queries = []
+
+    def run(self, query, **params):
+        self.queries.append((query, params))
+        rows = [
+            job for job in self.jobs
+            if job["created_at"] < params["before_ts"]
+            and (params["status"] is None or job["status"] == params["status"])
+            and (params["after_id"] is None or job["created_at"] < params["after_ts"]
+                 or (job["created_at"] == params["after_ts"] and job["id"] < params["after_id"]))
+        ]
+        rows.sort(key=lambda job: (job["created_at"], job["id"]), reverse=True)
+        return [{"j": job} for job in rows[:params.get("limit")]]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def session(monkeypatch):
+    # Several jobs share a timestamp, so the id has to break the tie
+    jobs = [
+        {"id": f"job-{i:02d}", "query": f"q{i}.example", "entity_type": "domain",
+         "status": "completed" if i % 3 else "failed", "created_at": 1_700_000_000_000 + (i // 2) * 1000}
+        for i in range(9)
+    ]
+    session = JobSession(jobs)
+    driver = type("Driver", (), {"session": lambda self, **kwargs: session})()
+    monkeypatch.setattr(main.db, "driver", driver)
+    return session
+
+
+def _walk(**filters):
+    ids, pages, cursor = [], 0, None
+    while True:
+        page = asyncio.run(main.list_jobs(limit=4, cursor=cursor, **filters))
+        ids += [job["id"] for job in page["jobs"]]
+        pages += 1
+        cursor = page["next_cursor"]
+        if not cursor:
+            return ids, pages
+
+
+def test_cursors_walk_every_job_once_newest_first(session):
+    ids, pages = _walk()
+
+    assert ids == [f"job-{i:02d}" for i in reversed(range(9))]
+    assert pages == 3
+    # One extra row is read to know whether another page follows, never an offset
+    assert all(params["limit"] == 5 and "SKIP" not in query for query, params in session.queries)
+
+
+def test_filters_apply_across_pages(session):
+    ids, _ = _walk(status=JobStatus.FAILED)
+
+    assert ids == ["job-06", "job-03", "job-00"]
+
+
+def test_invalid_cursor_is_rejected(session):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(main.list_jobs(cursor="not-a-cursor"))
+
+    assert error.value.status_code == 400
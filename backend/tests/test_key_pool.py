@@ -0,0 +1,108 @@
+"""
+API key pool quota accounting
+"""
+from app.config import settings
+from app.services.key_pool import KeyPool
+from app.workers import enrichment
+import asyncio
+import pytest
+
+
+@pytest.fixture
+def pool(fake_redis, monkeypatch):
+    monkeypatch.setattr(settings, "shodan_api_key", None)
+    monkeypatch.setattr(settings, "provider_api_keys", {"shodan": ["key-a", "key-b"]})
+    monkeypatch.setattr(settings, "provider_key_daily_quota", {"shodan": 2})
+    return KeyPool(fake_redis)
+
+
+def _used(pool):
+    return {entry["key"][-1]: entry["used_today"] for entry in pool.stats()["shodan"]}
+
+
+class Provider:
+    name = "shodan"
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self.request_latencies = []
+
+    async def enrich(self, query, entity_type):
+        return {"success": True, "provider": self.name, "data": {}}
+
+
+def test_acquire_spreads_calls_and_stops_at_the_quota(pool):
+    keys = [pool.acquire("shodan") for _ in range(4)]
+
+    assert sorted(keys) == ["key-a", "key-a", "key-b", "key-b"]
+    assert pool.acquire("shodan") is None
+    assert _used(pool) == {"a": 2, "b": 2}
+
+
+def test_request_key_is_used_as_is_and_not_counted(pool):
+    for _ in range(3):
+        assert pool.acquire("shodan", "own-key") == "own-key"
+    assert _used(pool) == {"a": 0, "b": 0}
+
+
+def test_cooling_key_with_quota_beats_an_exhausted_one(pool):
+    pool.acquire("shodan", exclude=["key-b"])
+    pool.acquire("shodan", exclude=["key-b"])
+    pool.cool_down("shodan", "key-b", 60)
+
+    assert pool.acquire("shodan") == "key-b"
+
+
+def test_rotating_past_cooling_keys_uses_no_quota(pool):
+    provider = Provider("key-a")
+    pool.cool_down("shodan", "key-b", 60)
+
+    for _ in range(5):
+        provider.api_key = "key-a"
+        assert not pool.rotate(provider, {"retry_after": 60})
+
+    # Idle rotations never reached the daily cap
+    assert _used(pool) == {"a": 0, "b": 0}
+    assert provider.api_key == "key-a"
+
+
+def test_rotation_counts_the_replacement_it_hands_out(pool):
+    provider = Provider("key-a")
+
+    assert pool.rotate(provider, {"retry_after": 60})
+
+    assert provider.api_key == "key-b"
+    assert _used(pool) == {"a": 0, "b": 1}
+
+
+def test_peek_does_not_use_quota(pool):
+    assert pool.peek("shodan") in ("key-a", "key-b")
+    assert _used(pool) == {"a": 0, "b": 0}
+
+
+def test_only_providers_that_are_called_use_quota(pool, monkeypatch):
+    monkeypatch.setattr(enrichment, "key_pool", pool)
+    monkeypatch.setattr(enrichment, "_timed_call", lambda job_id, provider, query, entity_type:
+                        provider.enrich(query, entity_type))
+
+    # Built providers that end up skipped (fresh, reused, completed) cost nothing
+    skipped = Provider(pool.peek("shodan"))
+    called = Provider(pool.peek("shodan"))
+    assert _used(pool) == {"a": 0, "b": 0}
+
+    result = asyncio.run(enrichment._call_provider(None, called, "192.0.2.1", "ip"))
+    assert result["success"]
+    assert sum(_used(pool).values()) == 1
+    assert skipped.api_key in ("key-a", "key-b")
+
+
+def test_exhausted_pool_skips_a_provider_that_needs_a_key(pool, monkeypatch):
+    monkeypatch.setattr(enrichment, "key_pool", pool)
+    for _ in range(4):
+        pool.acquire("shodan")
+
+    result = asyncio.run(enrichment._call_provider(None, Provider("key-a"), "192.0.2.1", "ip"))
+
+    assert result["error_class"] == "quota_exhausted"
+    assert not result["retryable"]
+    assert _used(pool) == {"a": 2, "b": 2}
@@ -0,0 +1,120 @@
+"""
+Paging big co-occurrence hubs from the key index
+"""
+from app.config import settings
+from app.services.pagination import decode_cursor, encode_cursor
+from app.services.pivot_engine import PivotEngine
+from neo4j.exceptions import Neo4jError
+import pytest
+
+
+ENTITY_MATCH = "MATCH (e:Entity {key: $key})"
+
+
+class Node(dict):
+    def __init__(self, key):
+        super().__init__(key=key, name=key.split(":", 1)[1])
+        self.element_id = "id-" + key
+        self.labels = {"Entity", "Domain"}
+
+
+class Result:
+    def __init__(self, record):
+        self.record = record
+
+    def single(self):
+        return self.record
+
+
+class HubSession:
+    """One entity in one big hub, whose other members are scattered through the key range"""
+
+    def __init__(self, keys, members, origin, max_budget=None):
+        self.keys = sorted(keys)
+        self.members = set(members)
+        self.origin = origin
+        self.max_budget = max_budget
+        self.budgets = []
+
+    def run(self, query, **params):
+        text = getattr(query, "text", query)
+        if "OPTIONAL MATCH" in text:
+            hub = {"kind": "nameserver", "value": "ns1.example", "member_count": len(self.members) + 1,
+                   "top_members": []}
+            return Result({"key": self.origin, "hubs": [hub]})
+
+        budget = params["budget"]
+        self.budgets.append(budget)
+        if self.max_budget and budget > self.max_budget:
+            raise Neo4jError.hydrate(message="timed out", code="Neo.ClientError.Transaction.TransactionTimedOut")
+        scanned = [key for key in self.keys
+                   if key.startswith(params["prefix"]) and key > params["after_key"]][:budget]
+        members = [Node(key) for key in scanned if key in self.members and key != self.origin]
+        return Result({
+            "members": members[:params["limit"]],
+            "scanned": len(scanned),
+            "last_key": scanned[-1] if scanned else None
+        })
+
+
+@pytest.fixture(autouse=True)
+def budgets(monkeypatch):
+    monkeypatch.setattr(settings, "pivot_hub_scan_min_members", 1)
+    monkeypatch.setattr(settings, "pivot_row_budget", 250)
+
+
+def _walk(session, limit=2):
+    """Follow cursors to the end; returns (member keys, pages)"""
+    found, pages, cursor = [], 0, None
+    while True:
+        result = PivotEngine().pivot(session, ENTITY_MATCH, {"key": session.origin}, "domain",
+                                     "same_nameserver", limit=limit, cursor=cursor)
+        found += [entity["properties"]["key"] for entity in result["entities"]]
+        pages += 1
+        cursor = result["next_cursor"]
+        if not cursor:
+            return found, pages
+
+
+def test_sparse_hub_is_paged_within_the_scan_budget():
+    keys = [f"domain:k{i:04d}.example" for i in range(1000)]
+    members = [keys[5], keys[400], keys[405], keys[900]]
+    session = HubSession(keys, members, origin=keys[0])
+
+    found, pages = _walk(session)
+
+    assert found == members
+    # Each request read at most the budget, instead of the whole key range
+    assert pages == 5
+    assert set(session.budgets) == {250}
+
+
+def test_short_page_says_where_the_scan_stopped():
+    keys = [f"domain:k{i:04d}.example" for i in range(1000)]
+    session = HubSession(keys, [keys[900]], origin=keys[0])
+
+    result = PivotEngine().pivot(session, ENTITY_MATCH, {"key": keys[0]}, "domain", "same_nameserver", limit=2)
+
+    assert result["entities"] == []
+    assert result["truncated"]
+    assert decode_cursor(result["next_cursor"])["k"] == keys[249]
+
+
+def test_timed_out_scan_resumes_with_a_smaller_budget():
+    keys = [f"domain:k{i:04d}.example" for i in range(300)]
+    members = [keys[10], keys[20], keys[290]]
+    session = HubSession(keys, members, origin=keys[0], max_budget=100)
+
+    found, _ = _walk(session)
+
+    assert found == members
+    assert session.budgets == [250, 125, 62, 62, 62, 62, 62]
+
+
+@pytest.mark.parametrize("position", [{}, {"x": "token", "o": 2}, {"k": 42}, {"k": "domain:a", "b": "250"}])
+def test_malformed_hub_cursor_is_rejected(position):
+    session = HubSession(["domain:a.example"], [], origin="domain:a.example")
+
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        PivotEngine().pivot(session, ENTITY_MATCH, {"key": session.origin}, "domain", "same_nameserver",
+                            cursor=encode_cursor(position))
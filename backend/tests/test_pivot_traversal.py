@@ -0,0 +1,110 @@
+"""
+Multi-hop traversal pivots, paged through a cached expansion
+"""
+from app.config import settings
+from app.services import pivot_engine as pivot_module
+from app.services.pivot_engine import PivotEngine
+import pytest
+
+
+ENTITY_MATCH = "MATCH (e:Entity) WHERE e.key IN $entity_keys"
+
+
+class Result(list):
+    def data(self):
+        return list(self)
+
+    def single(self):
+        return self[0] if self else None
+
+
+class GraphSession:
+    """Answers the engine's start, expand and node queries from keys and edges"""
+
+    def __init__(self, edges):
+        self.edges = edges
+        self.expansions = 0
+
+    def run(self, query, **params):
+        text = getattr(query, "text", query)
+        if "LIMIT 1" in text:
+            keys = [key for key in params["entity_keys"] if self._known(key)]
+            return Result({"id": key} for key in keys[:1])
+        if "$frontier" in text:
+            self.expansions += 1
+            rows = {}
+            for source in params["frontier"]:
+                for a, relationship, b in self.edges:
+                    if source in (a, b):
+                        other = b if a == source else a
+                        rows[other] = min(rows.get(other, relationship), relationship)
+            ordered = sorted(
+                ({"id": key, "label": key.split(":")[0].title(), "rel_type": relationship, "sort_key": key}
+                 for key, relationship in rows.items()),
+                key=lambda row: row["sort_key"]
+            )
+            return Result(ordered[:params["row_limit"]])
+        return Result({"id": key, "n": {"key": key}} for key in params["ids"])
+
+    def _known(self, key):
+        return any(key in (a, b) for a, _, b in self.edges)
+
+
+EDGES = [
+    ("domain:start.example", "RESOLVES_TO", "ip:192.0.2.1"),
+    ("domain:c.example", "RESOLVES_TO", "ip:192.0.2.1"),
+    ("domain:a.example", "RESOLVES_TO", "ip:192.0.2.1"),
+    ("domain:b.example", "RESOLVES_TO", "ip:192.0.2.1"),
+    ("domain:a.example", "HAS_EMAIL", "email:x@a.example"),
+]
+
+
+@pytest.fixture(autouse=True)
+def cache(fake_redis, monkeypatch):
+    monkeypatch.setattr(pivot_module, "redis_client", fake_redis)
+    monkeypatch.setattr(settings, "pivot_row_budget", 5000)
+    monkeypatch.setattr(settings, "pivot_time_budget_ms", 5000)
+
+
+def _pivot(session, cursor=None, limit=2, depth=2, pivot_type="related_domains"):
+    return PivotEngine().pivot(session, ENTITY_MATCH, {"entity_keys": ["domain:start.example"]},
+                               "domain", pivot_type, depth=depth, limit=limit, cursor=cursor)
+
+
+def test_later_pages_come_from_the_cached_expansion():
+    session = GraphSession(EDGES)
+
+    first = _pivot(session)
+    second = _pivot(session, cursor=first["next_cursor"])
+
+    assert [e["id"] for e in first["entities"]] == ["domain:a.example", "domain:b.example"]
+    assert [e["id"] for e in second["entities"]] == ["domain:c.example"]
+    assert second["next_cursor"] is None
+    assert all(e["hops"] == 2 for e in first["entities"] + second["entities"])
+    # Two levels for the first page, nothing for the second
+    assert session.expansions == 2
+
+
+def test_nearest_matches_come_first():
+    session = GraphSession(EDGES)
+
+    result = _pivot(session, limit=10, depth=3, pivot_type="related_emails")
+
+    assert [(e["id"], e["hops"]) for e in result["entities"]] == [("email:x@a.example", 3)]
+
+
+def test_row_budget_truncates_the_expansion(monkeypatch):
+    monkeypatch.setattr(settings, "pivot_row_budget", 2)
+
+    result = _pivot(GraphSession(EDGES), limit=10)
+
+    assert result["truncated"]
+    assert [e["id"] for e in result["entities"]] == ["domain:a.example"]
+
+
+def test_cursor_of_another_pivot_is_rejected():
+    session = GraphSession(EDGES)
+    cursor = _pivot(session)["next_cursor"]
+
+    with pytest.raises(ValueError):
+        _pivot(session, cursor=cursor, depth=3)
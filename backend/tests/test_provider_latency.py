@@ -0,0 +1,63 @@
+"""
+Provider timeouts derived from observed request latency
+"""
+from app.config import settings
+from app.services.provider_latency import ProviderLatency, _bucket
+import pytest
+
+
+@pytest.fixture
+def latency(fake_redis, monkeypatch):
+    monkeypatch.setattr(settings, "provider_timeouts", {})
+    monkeypatch.setattr(settings, "provider_timeout_percentile", 0.95)
+    monkeypatch.setattr(settings, "provider_timeout_headroom", 1.5)
+    monkeypatch.setattr(settings, "provider_timeout_min_seconds", 2)
+    monkeypatch.setattr(settings, "provider_timeout_max_seconds", 30)
+    monkeypatch.setattr(settings, "provider_timeout_default_seconds", 30)
+    monkeypatch.setattr(settings, "provider_timeout_min_samples", 20)
+    return ProviderLatency(fake_redis)
+
+
+def test_requests_land_in_their_bucket_and_timeouts_one_up():
+    assert _bucket(0.3) == "0.5"
+    assert _bucket(0.3, timed_out=True) == "1"
+    assert _bucket(90, timed_out=True) == "inf"
+    assert _bucket(200) == "inf"
+
+
+def test_default_timeout_until_enough_samples(latency):
+    for _ in range(19):
+        latency.observe("whois", 0.8)
+    assert latency.timeout("whois") == 30
+
+    latency.observe("whois", 0.8)
+    # p95 in the 1s bucket, with headroom, but never under the minimum
+    assert latency.timeout("whois") == 2
+
+
+def test_timeout_follows_the_slow_tail(latency):
+    for _ in range(90):
+        latency.observe("virustotal", 0.4)
+    for _ in range(10):
+        latency.observe("virustotal", 4.0)
+
+    # p95 falls in the 5s bucket
+    assert latency.timeout("virustotal") == 7.5
+
+
+def test_frequent_timeouts_push_the_timeout_out(latency):
+    for _ in range(50):
+        latency.observe("shodan", 7.5, timed_out=True)
+
+    assert latency.timeout("shodan") == 19.5
+    shodan = next(entry for entry in latency.stats() if entry["provider"] == "shodan")
+    assert (shodan["samples"], shodan["timeouts"], shodan["timeout_rate"]) == (50, 50, 1.0)
+    assert shodan["timeout_source"] == "adaptive"
+
+
+def test_configured_timeout_wins(latency, monkeypatch):
+    monkeypatch.setattr(settings, "provider_timeouts", {"whois": 12})
+    for _ in range(50):
+        latency.observe("whois", 0.1)
+
+    assert latency.timeout("whois") == 12
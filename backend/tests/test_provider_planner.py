@@ -0,0 +1,64 @@
+"""
+Planning providers within a lookup's cost and latency budget
+"""
+from app.config import settings
+from app.services import provider_planner as planner_module
+from app.services.provider_planner import ProviderPlanner
+from types import SimpleNamespace
+import pytest
+
+
+def _spec(cost, latency, capabilities=(), depends_on=(), key=None):
+    return {"entity_types": ["domain"], "capabilities": list(capabilities), "cost": cost, "latency": latency,
+            "key_required": bool(key), "api_key": key, "depends_on": list(depends_on), "provider": None}
+
+
+REGISTRY = {
+    "dns": _spec(0, 0.5, ["dns"]),
+    "whois": _spec(0, 2.0, ["registration"]),
+    "crtsh": _spec(0, 4.0, ["subdomains"], depends_on=["dns"]),
+    "virustotal": _spec(5, 1.5, ["reputation"], key="virustotal"),
+    "otx": _spec(1, 3.0, ["reputation"], key="otx"),
+}
+
+
+@pytest.fixture
+def planner(fake_redis, monkeypatch):
+    monkeypatch.setattr(planner_module, "PROVIDER_REGISTRY", REGISTRY)
+    monkeypatch.setattr(planner_module, "key_pool", SimpleNamespace(
+        keys=lambda name: ["pooled"] if name == "otx" else []
+    ))
+    monkeypatch.setattr(settings, "provider_profiles", {
+        "quick": {"max_cost": 1, "max_latency_seconds": 3},
+        "deep": {}
+    })
+    return ProviderPlanner(fake_redis)
+
+
+def test_cheapest_and_fastest_first_with_dependencies(planner):
+    plan = planner.plan("domain", api_keys={"virustotal": "own-key"})
+
+    assert plan == ["dns", "whois", "crtsh", "otx", "virustotal"]
+
+
+def test_providers_without_a_key_are_left_out(planner):
+    assert "virustotal" not in planner.plan("domain")
+
+
+def test_profile_budget_skips_what_does_not_fit(planner):
+    # whois fits the latency budget; crtsh and otx would exceed it
+    assert planner.plan("domain", profile="quick") == ["dns", "whois"]
+    assert planner.plan("domain", profile="quick", max_latency_seconds=10) == ["dns", "whois", "crtsh", "otx"]
+
+
+def test_dependents_of_skipped_providers_are_dropped(planner):
+    assert planner.plan("domain", sources=["subdomains"]) == []
+    assert planner.plan("domain", sources=["dns", "subdomains"]) == ["dns", "crtsh"]
+
+
+def test_observed_latency_reorders_the_plan(planner):
+    for _ in range(20):
+        planner.record_latency("whois", 0.1)
+
+    assert planner.latencies(["whois"])["whois"] < 0.5
+    assert planner.plan("domain", sources=["dns", "registration"]) == ["whois", "dns"]
@@ -0,0 +1,101 @@
+"""
+Deferred retries of transient provider failures
+"""
+from app.config import settings
+from app.workers import enrichment
+from types import SimpleNamespace
+import json
+import pytest
+
+
+class Database:
+    """Records the retry history written to the job"""
+
+    def __init__(self):
+        self.driver = self
+        self.writes = []
+
+    def session(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, **params):
+        self.writes.append(params)
+
+
+@pytest.fixture
+def scheduled(monkeypatch):
+    """Returns (retry_providers calls, the job's database writes)"""
+    monkeypatch.setattr(settings, "provider_retry_base_seconds", 10)
+    monkeypatch.setattr(settings, "provider_retry_max_seconds", 300)
+    monkeypatch.setattr(settings, "provider_max_retries", 2)
+    calls = []
+    database = Database()
+    monkeypatch.setattr(enrichment, "db", database)
+    monkeypatch.setattr(enrichment, "inflight_index", SimpleNamespace(refresh=lambda *args: None))
+    monkeypatch.setattr(enrichment.retry_providers, "apply_async",
+                        lambda args, countdown: calls.append((args, countdown)))
+    return calls, database
+
+
+def _failure(provider, **fields):
+    return {"success": False, "provider": provider, "retryable": True, **fields}
+
+
+def test_delay_backs_off_but_honours_retry_after(monkeypatch):
+    monkeypatch.setattr(settings, "provider_retry_base_seconds", 10)
+    monkeypatch.setattr(settings, "provider_retry_max_seconds", 300)
+
+    for attempt, backoff in [(1, 10), (3, 40), (10, 300)]:
+        delays = [enrichment._retry_delay(attempt) for _ in range(50)]
+        assert all(backoff / 2 <= delay <= backoff for delay in delays)
+
+    assert enrichment._retry_delay(1, retry_after=120) == 120
+
+
+def test_transient_failures_are_retried_together(scheduled):
+    calls, database = scheduled
+    results = [
+        _failure("virustotal", status_code=429, retry_after=60),
+        _failure("shodan", error_class="timeout"),
+        {"success": True, "provider": "whois"},
+        {"success": False, "provider": "dns"},
+    ]
+
+    assert enrichment._defer_retries("job-1", "example.com", "domain", {}, results, {})
+
+    (args, countdown), = calls
+    assert args[3] == ["shodan", "virustotal"]
+    assert args[5] == {"virustotal": 1, "shodan": 1}
+    # The retry waits for the slowest provider's Retry-After
+    assert countdown == 60
+    history = [json.loads(entry) for entry in database.writes[0]["history"]]
+    assert [(entry["provider"], entry["attempt"]) for entry in history] == [("virustotal", 1), ("shodan", 1)]
+
+
+def test_providers_are_given_up_on(scheduled):
+    calls, database = scheduled
+    results = [
+        _failure("virustotal", retry_after=86400),
+        _failure("shodan"),
+    ]
+
+    assert not enrichment._defer_retries("job-1", "example.com", "domain", {}, results, {"shodan": 2})
+
+    assert calls == []
+    history = [json.loads(entry) for entry in database.writes[0]["history"]]
+    assert all(entry["gave_up"] for entry in history)
+    assert database.writes[0]["countdown"] is None
+
+
+def test_nothing_to_retry_writes_nothing(scheduled):
+    calls, database = scheduled
+
+    assert not enrichment._defer_retries("job-1", "example.com", "domain", {},
+                                         [{"success": True, "provider": "whois"}], {})
+    assert calls == [] and database.writes == []
@@ -0,0 +1,94 @@
+"""
+Case reports cached on disk by content version
+"""
+from app.services.report_cache import ReportCache
+from app.workers.reports import load_case_report_data
+import pytest
+
+
+class Case(dict):
+    element_id = "id-case-1"
+
+
+class Result(list):
+    def single(self):
+        return self[0] if self else None
+
+
+class CaseSession:
+    """One case, whose content version can move while its entities are read"""
+
+    def __init__(self, version, version_after_entities=None):
+        self.case = Case(id="case-1", title="Case", status="open", priority="high",
+                         created_at=0, updated_at=0, content_version=version)
+        self.version_after_entities = version_after_entities
+
+    def run(self, query, **params):
+        if "rebuilt" in query:
+            return Result([{"rebuilt": 0}])
+        if "CONTAINS" in query:
+            if self.version_after_entities is not None:
+                self.case["content_version"] = self.version_after_entities
+            return Result()
+        if "as version" in query:
+            return Result([{"version": self.case["content_version"]}])
+        return Result([{"c": self.case}])
+
+
+def test_report_ids_round_trip_through_the_case_version():
+    cache = ReportCache("/unused")
+
+    report_id = cache.report_id("case-with-dashes", 7)
+
+    assert report_id == "case-with-dashes-v7"
+    assert cache.parse_report_id(report_id) == ("case-with-dashes", 7)
+
+
+@pytest.mark.parametrize("report_id", ["case", "-v3", "case-vx", "case-v"])
+def test_malformed_report_ids_are_rejected(report_id):
+    with pytest.raises(ValueError):
+        ReportCache("/unused").parse_report_id(report_id)
+
+
+def _write(cache, *report_ids):
+    for report_id in report_ids:
+        with open(cache.prepare(report_id), "wb") as f:
+            f.write(b"%PDF")
+
+
+def test_new_version_prunes_only_that_cases_older_reports(tmp_path):
+    cache = ReportCache(str(tmp_path / "reports"))
+    _write(cache, "case-1-v1", "case-1-v2", "case-10-v1", "case-1-v2-v1")
+
+    cache.prune("case-1", "case-1-v2")
+
+    assert not cache.exists("case-1-v1")
+    assert cache.exists("case-1-v2")
+    assert cache.exists("case-10-v1")
+    assert cache.exists("case-1-v2-v1")
+
+
+def test_slow_old_report_leaves_newer_ones_cached(tmp_path):
+    cache = ReportCache(str(tmp_path / "reports"))
+    _write(cache, "case-1-v3", "case-1-v5", "case-1-v4")
+
+    cache.prune("case-1", "case-1-v4")
+
+    assert not cache.exists("case-1-v3")
+    assert cache.exists("case-1-v4")
+    assert cache.exists("case-1-v5")
+
+
+def test_report_data_is_loaded_for_the_requested_version():
+    data = load_case_report_data(CaseSession(version=4), "case-1", 4)
+
+    assert data["case"]["id"] == "case-1"
+
+
+@pytest.mark.parametrize("session", [
+    CaseSession(version=5),
+    CaseSession(version=4, version_after_entities=5),
+])
+def test_case_changed_since_the_request_is_not_rendered(session):
+    with pytest.raises(ValueError):
+        load_case_report_data(session, "case-1", 4)
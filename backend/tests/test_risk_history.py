@@ -0,0 +1,46 @@
+"""
+Packed, compacted per-entity risk history
+"""
+from app.config import settings
+from app.services.risk_history import HISTORY_EPOCH, pack, unpack, risk_history
+
+
+NOW = HISTORY_EPOCH + 400 * 86400
+DAY = 86400
+
+
+def test_points_round_trip_at_minute_resolution():
+    point = unpack(pack(NOW + 59, 87.4, "HIGH", 0b101, linked=True))
+
+    assert point == {"timestamp": NOW, "reason_mask": 0b101, "linked": True, "level": "HIGH", "score": 87}
+    # Points stay exact as JSON numbers
+    assert pack(NOW, 100, "HIGH", 2 ** 15 - 1, True) < 2 ** 53
+
+
+def test_unchanged_risk_adds_no_point():
+    history = risk_history.append(None, 40, "MEDIUM", 1, False, now=NOW)
+    history = risk_history.append(history, 40, "MEDIUM", 1, False, now=NOW + DAY)
+    assert len(history) == 1
+
+    history = risk_history.append(history, 40, "MEDIUM", 1, True, now=NOW + 2 * DAY)
+    assert [point["linked"] for point in risk_history.decode(history)] == [False, True]
+    assert risk_history.last_mask(history) == 1
+
+
+def test_old_points_are_downsampled_to_their_peak(monkeypatch):
+    monkeypatch.setattr(settings, "risk_history_max_points", 8)
+    history = []
+    # Six points a day apart a month ago, then recent changes
+    for day in range(6):
+        history = risk_history.append(history, 10 + (day * 7) % 30, "LOW", 0, False,
+                                      now=NOW - (30 - day / 6) * DAY)
+    for hour in range(3):
+        history = risk_history.append(history, 50 + hour, "MEDIUM", 0, False, now=NOW - (3 - hour) * 3600)
+
+    points = risk_history.decode(history)
+
+    assert len(points) <= 8
+    # The month-old points share a daily bucket and keep only the highest score
+    assert [p["score"] for p in points if p["timestamp"] < NOW - 7 * DAY] == [38]
+    assert [p["score"] for p in points if p["timestamp"] > NOW - DAY] == [50, 51, 52]
+    assert [p["timestamp"] for p in points] == sorted(p["timestamp"] for p in points)
@@ -0,0 +1,140 @@
+"""
+Risk propagation over a small in-memory graph
+"""
+from app.services.risk_propagation import RiskPropagator, WRITE_QUERY
+from app.services.risk_rules import RuleSet
+
+
+RULE_SET = RuleSet({
+    "version": "test",
+    "propagation": {"decay": 0.5, "relationships": {"RESOLVES_TO": 1.0}}
+})
+
+
+class Result(list):
+    def data(self):
+        return list(self)
+
+
+class GraphSession:
+    """Answers the propagator's three queries from a dict of nodes and a list of edges"""
+
+    def __init__(self, nodes, edges):
+        self.nodes = nodes
+        self.edges = edges
+
+    def run(self, query, **params):
+        if query == WRITE_QUERY:
+            for row in params["rows"]:
+                node = self.nodes[row["key"]]
+                node["risk_base_score"] = node.get("risk_base_score", row["base_score"])
+                for field in ("linked_score", "linked_reason", "linked_path"):
+                    node["risk_" + field] = row[field]
+                for field in ("score", "level", "reasons", "history"):
+                    node["risk_" + field] = row[field]
+            return Result()
+        if "strongest_base" in query:
+            return Result(self._evaluate(key, params) for key in params["keys"])
+        return Result(
+            {"key": key}
+            for key in dict.fromkeys(u for seed in params["keys"] for u, _ in self._linked(seed))
+        )
+
+    def _linked(self, key):
+        for a, relationship, b in self.edges:
+            if key in (a, b):
+                yield (b if a == key else a), relationship
+
+    def _evaluate(self, key, params):
+        v = self.nodes[key]
+        neighbours = sorted(
+            (
+                {
+                    "key": u,
+                    "label": u.split(":")[0].title(),
+                    "relationship": relationship,
+                    "weight": params["weights"][relationship],
+                    "score": self.nodes[u]["risk_score"],
+                    "base_score": self.nodes[u].get("risk_base_score", self.nodes[u]["risk_score"]),
+                    "path": self.nodes[u].get("risk_linked_path")
+                }
+                for u, relationship in self._linked(key)
+            ),
+            key=lambda n: -n["score"] * n["weight"]
+        )
+        return {
+            "key": key,
+            "base_score": v.get("risk_base_score", v["risk_score"]),
+            "old_score": v["risk_score"],
+            "old_level": v["risk_level"],
+            "reasons": v.get("risk_reasons", []),
+            "old_linked_score": v.get("risk_linked_score"),
+            "old_linked_reason": v.get("risk_linked_reason"),
+            "old_linked_path": v.get("risk_linked_path"),
+            "history": v.get("risk_history"),
+            "candidates": neighbours[:params["candidates"]],
+            "strongest_base": max(neighbours, key=lambda n: n["base_score"] * n["weight"], default=None)
+        }
+
+
+def _node(score):
+    return {"risk_base_score": score, "risk_score": score, "risk_level": RULE_SET.level(score)}
+
+
+def _drop_base(node, score):
+    """What rescoring an entity does: new own score, combined with its stored linked score"""
+    linked = node.get("risk_linked_score")
+    node["risk_base_score"] = score
+    node["risk_score"] = max(score, linked) if linked is not None else score
+    node["risk_level"] = RULE_SET.level(node["risk_score"])
+
+
+def test_risk_spreads_along_a_chain_with_its_path():
+    nodes = {"domain:a.example": _node(90), "ip:192.0.2.1": _node(0), "domain:b.example": _node(0)}
+    edges = [("domain:a.example", "RESOLVES_TO", "ip:192.0.2.1"),
+             ("domain:b.example", "RESOLVES_TO", "ip:192.0.2.1")]
+
+    RiskPropagator().propagate(GraphSession(nodes, edges), ["domain:a.example"], RULE_SET)
+
+    assert nodes["ip:192.0.2.1"]["risk_score"] == 45
+    assert nodes["ip:192.0.2.1"]["risk_linked_path"] == ["domain:a.example"]
+    assert nodes["domain:b.example"]["risk_score"] == 22
+    assert nodes["domain:b.example"]["risk_linked_path"] == ["domain:a.example", "ip:192.0.2.1"]
+    # Nothing came back to the origin
+    assert nodes["domain:a.example"]["risk_score"] == 90
+    assert nodes["domain:a.example"].get("risk_linked_score") is None
+
+
+def test_two_node_cycle_forgets_risk_once_the_origin_drops():
+    nodes = {"domain:a.example": _node(90), "ip:192.0.2.1": _node(0)}
+    edges = [("domain:a.example", "RESOLVES_TO", "ip:192.0.2.1")]
+    session = GraphSession(nodes, edges)
+    propagator = RiskPropagator()
+
+    propagator.propagate(session, ["domain:a.example"], RULE_SET)
+    assert nodes["ip:192.0.2.1"]["risk_score"] == 45
+
+    _drop_base(nodes["domain:a.example"], 0)
+    propagator.propagate(session, ["domain:a.example"], RULE_SET)
+
+    for key in nodes:
+        assert nodes[key]["risk_score"] == 0
+        assert nodes[key]["risk_level"] == "LOW"
+        assert nodes[key].get("risk_linked_score") is None
+
+
+def test_neighbour_risk_from_elsewhere_still_counts_in_a_cycle():
+    nodes = {"domain:a.example": _node(90), "ip:192.0.2.1": _node(0), "domain:b.example": _node(80)}
+    edges = [("domain:a.example", "RESOLVES_TO", "ip:192.0.2.1"),
+             ("domain:b.example", "RESOLVES_TO", "ip:192.0.2.1")]
+    session = GraphSession(nodes, edges)
+    propagator = RiskPropagator()
+    propagator.propagate(session, ["domain:a.example", "domain:b.example"], RULE_SET)
+
+    _drop_base(nodes["domain:a.example"], 0)
+    propagator.propagate(session, ["domain:a.example"], RULE_SET)
+
+    assert nodes["ip:192.0.2.1"]["risk_score"] == 40
+    assert nodes["ip:192.0.2.1"]["risk_linked_path"] == ["domain:b.example"]
+    assert nodes["domain:a.example"]["risk_score"] == 20
+    assert nodes["domain:a.example"]["risk_linked_path"] == ["domain:b.example", "ip:192.0.2.1"]
@@ -0,0 +1,98 @@
+"""
+Risk rule evaluation, one entity at a time and in batches, and rule file reloads
+"""
+from app.config import settings
+from app.services.risk_rules import RuleSet, RiskRules
+from pathlib import Path
+import json
+import os
+import pytest
+
+
+RULE_SET = RuleSet(json.loads((Path(__file__).parent.parent / "app" / "risk_rules.json").read_text()))
+
+ROWS = {
+    "email": [
+        {},
+        {"breach_count": 1, "score": 20, "status": "risky"},
+        {"breach_count": 7, "score": 45, "status": "invalid"},
+        {"breach_count": 0, "score": 90, "status": "valid"}
+    ],
+    "domain": [
+        {},
+        {"domain_age_days": 3, "vt_malicious": 2, "vt_reputation": 10,
+         "otx_threat_score": 55, "otx_pulse_count": 1, "malicious_score": 9},
+        {"domain_age_days": 45, "vt_suspicious": 1, "otx_threat_score": 12, "otx_pulse_count": 4},
+        {"domain_age_days": 4000, "vt_reputation": 80}
+    ],
+    "ip": [
+        {},
+        {"is_proxy": True, "is_hosting": False, "vulnerabilities": ["CVE-1"], "open_ports": list(range(12))},
+        {"is_hosting": True, "vt_malicious": 9, "vt_suspicious": 3, "otx_threat_score": 70,
+         "vulnerabilities": ["CVE-1", "CVE-2", "CVE-3", "CVE-4"], "open_ports": [22, 80]}
+    ]
+}
+
+
+def test_batch_matches_one_at_a_time():
+    for entity_type, rows in ROWS.items():
+        batch = RULE_SET.evaluate_batch(entity_type, rows)
+        for i, row in enumerate(rows):
+            scalar = RULE_SET.evaluate(entity_type, row)
+            assert batch["scores"][i] == scalar["score"], (entity_type, row)
+            assert batch["levels"][i] == scalar["level"], (entity_type, row)
+            assert batch["reasons"][i] == scalar["reasons"], (entity_type, row)
+            assert batch["reason_masks"][i] == scalar["reason_mask"], (entity_type, row)
+
+
+def test_batch_of_nothing():
+    batch = RULE_SET.evaluate_batch("ip", [])
+    assert len(batch["scores"]) == 0
+    assert batch["reasons"] == []
+
+
+def _write_rules(path, version, points, mtime):
+    path.write_text(json.dumps({
+        "version": version,
+        "entities": {"ip": [{"id": "proxy", "property": "is_proxy", "kind": "flag",
+                             "points": points, "reason": "IP is a proxy/VPN"}]}
+    }))
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def rules(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "risk_rules_reload_seconds", 0)
+    path = tmp_path / "risk_rules.json"
+    _write_rules(path, "v1", 25, 1000)
+    return path, RiskRules(str(path))
+
+
+def test_bumped_rule_file_is_reloaded(rules):
+    path, loader = rules
+    assert loader.current().version == "v1"
+
+    _write_rules(path, "v2", 40, 2000)
+    assert loader.current().version == "v2"
+    assert loader.current().evaluate("ip", {"is_proxy": True})["score"] == 40
+
+
+def test_rule_change_without_a_new_version_is_refused(rules):
+    path, loader = rules
+    loader.current()
+
+    _write_rules(path, "v1", 40, 2000)
+    assert loader.current().evaluate("ip", {"is_proxy": True})["score"] == 25
+
+    # Bumping the version afterwards applies it
+    _write_rules(path, "v2", 40, 3000)
+    assert loader.current().evaluate("ip", {"is_proxy": True})["score"] == 40
+
+
+def test_broken_rule_file_keeps_the_previous_rules(rules):
+    path, loader = rules
+    loader.current()
+
+    path.write_text("{not json")
+    os.utime(path, (2000, 2000))
+    assert loader.current().version == "v1"
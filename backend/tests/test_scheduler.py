@@ -0,0 +1,82 @@
+"""
+Fair-share job scheduling across tenants
+"""
+from app.celery_app import celery_app, LOOKUP_QUEUE, BACKGROUND_QUEUE
+from app.config import settings
+from app.services.scheduler import JobScheduler
+from app.services import scheduler
+from types import SimpleNamespace
+import pytest
+
+
+@pytest.fixture
+def jobs(fake_redis, monkeypatch):
+    """A scheduler with two slots, recording the jobs it sends to the workers"""
+    monkeypatch.setattr(settings, "lookup_worker_slots", 2)
+    monkeypatch.setattr(settings, "tenant_max_concurrency", 2)
+    monkeypatch.setattr(settings, "tenant_weights", {})
+    monkeypatch.setattr(scheduler, "inflight_index", SimpleNamespace(refresh=lambda *args: None))
+    sent = []
+    monkeypatch.setattr(JobScheduler, "_send", lambda self, job, tenant: sent.append(job["job_id"]))
+    instance = JobScheduler(fake_redis)
+    instance.sent = sent
+    return instance
+
+
+def _submit(jobs, job_id, tenant, lane="interactive"):
+    return jobs.submit({"job_id": job_id, "query": job_id, "entity_type": "domain"}, tenant, lane)
+
+
+def test_a_busy_tenant_does_not_starve_a_quiet_one(jobs):
+    for i in range(5):
+        _submit(jobs, f"a{i}", "tenant-a")
+    _submit(jobs, "b0", "tenant-b")
+
+    assert jobs.sent == ["a0", "a1"]
+    jobs.finish("a0", "tenant-a")
+    assert jobs.sent[-1] == "b0"
+    assert jobs.pending_count() == 3
+
+
+def test_interactive_jobs_go_before_bulk(jobs):
+    _submit(jobs, "a0", "tenant-a")
+    _submit(jobs, "a1", "tenant-a")
+    _submit(jobs, "bulk", "tenant-b", lane="bulk")
+    _submit(jobs, "live", "tenant-c")
+
+    jobs.finish("a0", "tenant-a")
+    assert jobs.sent[-1] == "live"
+
+
+def test_cancelled_pending_job_is_never_sent(jobs):
+    _submit(jobs, "a0", "tenant-a")
+    _submit(jobs, "a1", "tenant-a")
+    _submit(jobs, "a2", "tenant-a")
+
+    assert jobs.cancel("a2", "tenant-a", "interactive")
+    jobs.finish("a0", "tenant-a")
+    assert "a2" not in jobs.sent
+    assert jobs.pending_count() == 0
+
+
+def test_renewed_slot_outlives_the_task_time_limit(jobs, monkeypatch):
+    _submit(jobs, "a0", "tenant-a")
+    _submit(jobs, "a1", "tenant-a")
+    _submit(jobs, "a2", "tenant-a")
+
+    clock = {"now": scheduler.time.time() + celery_app.conf.task_time_limit + 120}
+    monkeypatch.setattr(scheduler.time, "time", lambda: clock["now"])
+    jobs.renew("a0", "tenant-a")
+    jobs.dispatch()
+
+    # a1's lease lapsed (its worker is presumed lost), a0 is still running
+    assert jobs.sent == ["a0", "a1", "a2"]
+    assert jobs.stats()["running"] == 2
+
+
+def test_only_lookups_use_the_lookup_queue():
+    router = celery_app.amqp.router
+    assert router.route({}, "enrich_entity")["queue"].name == LOOKUP_QUEUE
+    for task in ("retry_providers", "refresh_entity", "generate_report", "collect_garbage",
+                 "rescore_entities", "dispatch_jobs", "dispatch_watchlists"):
+        assert router.route({}, task)["queue"].name == BACKGROUND_QUEUE, task
@@ -0,0 +1,57 @@
+"""
+Entity search against the full-text indexes
+"""
+from app.services.search import EntitySearch
+
+
+class Node(dict):
+    def __init__(self, name, label="Domain"):
+        super().__init__(name=name)
+        self.element_id = "id-" + name
+        self.labels = {"Entity", label}
+
+
+class IndexSession:
+    """Answers queryNodes from ranked hits per index, honouring its skip and limit options"""
+
+    def __init__(self, hits):
+        self.hits = hits
+        self.calls = []
+
+    def run(self, query, **params):
+        index = query.split("queryNodes('", 1)[1].split("'", 1)[0]
+        self.calls.append((index, query, params))
+        ranked = self.hits[index][params["offset"]:params["offset"] + params["limit"]]
+        return [{"node": node, "score": score} for node, score in ranked]
+
+
+def test_build_query_escapes_and_prefixes():
+    search = EntitySearch()
+    assert search.build_query("mail example.com") == "mail AND example.com"
+    assert search.build_query("a:b (x", mode="prefix") == "a\\:b AND \\(x*"
+    assert search.build_query("   ") is None
+
+
+def test_pages_are_read_from_the_index_not_filtered_after_it():
+    hits = [(Node(f"d{i}.example"), 10.0 - i) for i in range(7)]
+    session = IndexSession({"entity_search_domain": hits})
+
+    page = EntitySearch().search(session, "example", label="Domain", limit=3, offset=3)
+
+    index, query, params = session.calls[0]
+    assert index == "entity_search_domain"
+    assert "{skip: $offset, limit: $limit}" in query
+    assert "SKIP" not in query and "labels(node)" not in query
+    assert (params["offset"], params["limit"]) == (3, 4)
+    assert [r["properties"]["name"] for r in page["results"]] == ["d3.example", "d4.example", "d5.example"]
+    assert page["next_offset"] == 6
+
+
+def test_unfiltered_search_uses_the_shared_index():
+    session = IndexSession({"entity_search": [(Node("a@example.com", "Email"), 1.0)]})
+
+    page = EntitySearch().search(session, "example")
+
+    assert session.calls[0][0] == "entity_search"
+    assert page["results"][0]["type"] == "Email"
+    assert page["next_offset"] is None
@@ -0,0 +1,132 @@
+"""
+Change-only watchlist refreshes
+"""
+from app.workers import enrichment
+import asyncio
+import pytest
+
+
+class Record(dict):
+    def single(self):
+        return self
+
+
+class Database:
+    """Just enough of the Neo4j wrapper for a refresh: one stored entity, and a log of queries"""
+
+    def __init__(self, node):
+        self.node = node
+        self.queries = []
+        self.driver = self
+
+    def connect(self):
+        pass
+
+    def close(self):
+        pass
+
+    def session(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, **params):
+        self.queries.append(query)
+        return Record(risk_score=self.node.get("risk_score"), node=self.node)
+
+
+class Provider:
+    api_key = None
+
+    def __init__(self, name, result):
+        self.name = name
+        self.result = result
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def refresh(monkeypatch):
+    """Refresh an entity whose providers return the given results, recording what gets written"""
+    written = {"processed": [], "marked": [], "rescored": 0}
+
+    async def process(query, entity_type, result):
+        written["processed"].append(result["provider"])
+
+    async def rescore(query, entity_type):
+        written["rescored"] += 1
+
+    async def call(job_id, provider, query, entity_type):
+        return provider.result
+
+    def run(node, results):
+        database = Database(node)
+        monkeypatch.setattr(enrichment, "db", database)
+        monkeypatch.setattr(enrichment.provider_planner, "plan", lambda entity_type: list(results))
+        monkeypatch.setattr(enrichment, "_build_providers", lambda names, api_keys: [
+            Provider(name, results[name]) for name in names
+        ])
+        monkeypatch.setattr(enrichment, "_call_provider", call)
+        monkeypatch.setattr(enrichment, "_process_provider_result", process)
+        monkeypatch.setattr(enrichment, "_calculate_risk_score", rescore)
+        monkeypatch.setattr(enrichment, "_mark_enriched", lambda key, name, digest: written["marked"].append(name))
+        outcome = asyncio.run(enrichment._refresh_entity_async("example.com", "domain", "watchlist-1"))
+        return outcome, written, database
+    return run
+
+
+def _urlscan(scan_id, technologies):
+    return {
+        "success": True, "provider": "urlscan", "domain": "example.com",
+        "scan_id": scan_id, "report_url": f"https://urlscan.io/result/{scan_id}/",
+        "screenshot_url": f"https://urlscan.io/screenshots/{scan_id}.png",
+        "malicious_score": 0, "technologies": technologies
+    }
+
+
+def _virustotal(malicious, analysed_at):
+    return {
+        "success": True, "provider": "virustotal", "query": "example.com",
+        "malicious_count": malicious, "harmless_count": 70 - malicious, "total_engines": 90,
+        "last_analysis_date": analysed_at
+    }
+
+
+def _stored(**results):
+    return {
+        "risk_score": 10,
+        **{enrichment._digest_field(name): enrichment._result_digest(result) for name, result in results.items()}
+    }
+
+
+def test_a_new_scan_of_the_same_page_is_not_a_change(refresh):
+    node = _stored(urlscan=_urlscan("scan-1", ["nginx", "React"]),
+                   virustotal=_virustotal(0, 1700000000))
+
+    outcome, written, database = refresh(node, {
+        "urlscan": _urlscan("scan-2", ["React", "nginx"]),
+        "virustotal": _virustotal(0, 1700086400)
+    })
+
+    assert outcome == {"success": True, "changed": []}
+    assert written == {"processed": [], "marked": [], "rescored": 0}
+    assert not any("WatchEvent" in query for query in database.queries)
+
+
+def test_changed_detections_are_written_and_recorded(refresh):
+    node = _stored(urlscan=_urlscan("scan-1", ["nginx"]),
+                   virustotal=_virustotal(0, 1700000000))
+
+    outcome, written, database = refresh(node, {
+        "urlscan": _urlscan("scan-2", ["nginx"]),
+        "virustotal": _virustotal(3, 1700086400)
+    })
+
+    assert outcome == {"success": True, "changed": ["virustotal"]}
+    assert written == {"processed": ["virustotal"], "marked": ["virustotal"], "rescored": 1}
+    assert any("WatchEvent" in query for query in database.queries)
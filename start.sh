@@ -36,8 +36,12 @@ fi
 echo "🔧 Starting Celery worker..."
 cd backend
 source venv/bin/activate
-celery -A app.celery_app worker --loglevel=info &
+celery -A app.celery_app worker -Q lookups -n lookups@%h --loglevel=info &
 CELERY_PID=$!
+celery -A app.celery_app worker -Q background -n background@%h --concurrency=2 --loglevel=info &
+BACKGROUND_PID=$!
+celery -A app.celery_app beat --loglevel=info &
+BEAT_PID=$!
 cd ..
 
 # Start FastAPI backend
@@ -74,5 +78,5 @@ echo ""
 echo "Press Ctrl+C to stop all services"
 
 # Wait for Ctrl+C
-trap "echo ''; echo '🛑 Stopping services...'; kill $CELERY_PID $BACKEND_PID $FRONTEND_PID; docker-compose down; echo '✅ All services stopped'; exit" INT
+trap "echo ''; echo '🛑 Stopping services...'; kill $CELERY_PID $BACKGROUND_PID $BEAT_PID $BACKEND_PID $FRONTEND_PID; docker-compose down; echo '✅ All services stopped'; exit" INT
 wait